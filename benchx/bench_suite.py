@@ -0,0 +1,258 @@
+"""
+端到端性能基准: 数据加载、拉取分页解析、指标、回测、K线图渲染
+
+离线运行, 数据来自 data/ 下的 okx_ETH-USDT_* 以及按倍数放大的合成数据. 结果写为 JSON,
+并与保存的基线比较, 耗时超过基线 (1 + tolerance) 倍的用例标记为回退
+
+    python -m benchx.bench_suite --scale 1 10 --repeat 5
+    python -m benchx.bench_suite --save-baseline
+    python -m benchx.bench_suite --fail-on-regression
+
+基线与机器相关, 不随仓库提交: 先在同一台机器上用相同的 --scale 运行 --save-baseline 生成 benchx/baseline.json.
+没有基线时打印警告并跳过比较, --fail-on-regression 下返回2
+"""
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from dexx import kline_store
+from dexx.synthetic_kline import SyntheticMarket
+from fintech import indicators, backtest
+
+BENCH_DIR = Path(__file__).resolve().parent
+BASELINE_PATH = BENCH_DIR / 'baseline.json'
+RESULT_PATH = BENCH_DIR / 'results' / 'latest.json'
+SOURCES = [('okx', 'ETH-USDT', '5m'), ('okx', 'ETH-USDT', '1h')]
+
+
+class SkipCase(Exception):
+    """
+    用例依赖的可选库不可用
+    """
+
+
+class BenchCase:
+    """
+    单个基准用例, setup 不计时, run 重复执行取统计值
+    """
+
+    def __init__(self, name: str, run: Callable[[], object], rows: int = 0, setup: Optional[Callable] = None):
+        self.name = name
+        self.run = run
+        self.rows = rows
+        self.setup = setup
+
+
+def _time_case(case: BenchCase, repeat: int, warmup: int = 1) -> Dict[str, object]:
+    if case.setup is not None:
+        case.setup()
+    for _ in range(warmup):
+        case.run()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        case.run()
+        times.append(time.perf_counter() - start)
+    best = min(times)
+    return {'name': case.name, 'status': 'ok', 'rows': case.rows, 'repeat': repeat,
+            'min': best, 'median': statistics.median(times), 'max': max(times),
+            'rows_per_sec': case.rows / best if case.rows and best > 0 else None}
+
+
+def synthetic_klines(n: int, seed: int = 7, start_ts: int = 1735689600000, timeframe: str = '5m') -> np.ndarray:
+    """
+    生成 n 根合成K线(N×6, 列同 kline_store.ARRAY_COLUMNS), 用于放大数据规模
+    """
+    market = SyntheticMarket(1, timeframe=timeframe, jump_intensity=20.0, vol_of_vol=0.5, seed=seed)
+    return market.klines(n, start_ts)[market.symbols[0]]
+
+
+class FakeExchange:
+    """
+    模拟 ccxt 交易所, fetch_ohlcv 从内存数组按页返回, 用于度量拉取循环本身的开销
+    """
+    rateLimit = 0.001
+
+    def __init__(self, klines: np.ndarray):
+        self._rows = klines.tolist()
+        self._ts = klines[:, 0]
+
+    def parse8601(self, text: str) -> int:
+        return int(pd.Timestamp(text).value // 10 ** 6)
+
+    def milliseconds(self) -> int:
+        return int(self._ts[-1]) + 1
+
+    def iso8601(self, ms: int) -> str:
+        return pd.Timestamp(ms, unit='ms').strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    def fetch_ohlcv(self, symbol, timeframe, since, limit):
+        i = int(np.searchsorted(self._ts, since))
+        return [list(row) for row in self._rows[i:i + limit]]
+
+
+def _import_fetcher():
+    # 传入模拟交易所对象时拉取函数不会导入 ccxt
+    from dexx.okx_kline_fetcher import fetch_okx_kline_data
+
+    def fetch(*args, **kwargs):
+        # 屏蔽拉取进度输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            return fetch_okx_kline_data(*args, **kwargs)
+
+    return fetch
+
+
+def _render_chart(df: pd.DataFrame, output: str):
+    try:
+        from fintech.xchart.chart_kline import make_kline_v2
+    except ImportError as e:
+        raise SkipCase(f"pyecharts 不可用: {e}")
+    make_kline_v2(df=df, output=output)
+
+
+def build_cases(scales: List[int], tmp_dir: Path) -> List[BenchCase]:
+    cases = []
+    for exchange, symbol, timeframe in SOURCES:
+        path = kline_store.kline_path(exchange, symbol, timeframe)
+        rows = len(kline_store.load_kline_array_from(path))
+        tag = f"{symbol}_{timeframe}"
+        if path.suffix == '.csv':
+            # 已归档的分区没有CSV可解析
+            cases.append(BenchCase(f"load.csv.{tag}", lambda p=path: kline_store.read_kline_csv(p), rows))
+        cases.append(BenchCase(f"load.npy_mmap.{tag}",
+                               lambda p=path: np.asarray(kline_store.load_kline_array_from(p)).sum(), rows))
+
+    real = np.asarray(kline_store.load_kline_array('okx', 'ETH-USDT', '5m'))
+    for scale in scales:
+        n = len(real) * scale
+        data = real if scale == 1 else synthetic_klines(n)
+        tag = f"x{scale}"
+        close, high, low = data[:, 4], data[:, 2], data[:, 3]
+
+        csv_path = tmp_dir / f"bench_{tag}.csv"
+        kline_store.write_kline(data, 'bench', f'SYN{scale}-USDT', '5m', data_dir=tmp_dir).rename(csv_path)
+        cases.append(BenchCase(f"load.csv.synthetic_{tag}", lambda p=csv_path: kline_store.read_kline_csv(p), n))
+        cases.append(BenchCase(f"load.npy_mmap.synthetic_{tag}",
+                               lambda p=csv_path: np.asarray(kline_store.load_kline_array_from(p)).sum(), n,
+                               setup=lambda p=csv_path: kline_store.load_kline_array_from(p)))
+
+        fetch = _import_fetcher()
+        exchange = FakeExchange(data)
+        start_date = pd.Timestamp(int(data[0, 0]), unit='ms').strftime('%Y-%m-%d')
+        cases.append(BenchCase(f"fetch.parse_pages.{tag}",
+                               lambda ex=exchange, d=start_date: fetch("ETH-USDT", "5m", d, limit=1000,
+                                                                       save_csv=False, exchange=ex,
+                                                                       endpoint_name="bench.fetch_ohlcv"), n))
+
+        cases.append(BenchCase(f"indicator.sma20.{tag}", lambda c=close: indicators.sma(c, 20), n))
+        cases.append(BenchCase(f"indicator.ema20.{tag}", lambda c=close: indicators.ema(c, 20), n))
+        cases.append(BenchCase(f"indicator.rsi14.{tag}", lambda c=close: indicators.rsi(c, 14), n))
+        cases.append(BenchCase(f"indicator.atr14.{tag}", lambda h=high, l=low, c=close: indicators.atr(h, l, c, 14), n))
+        cases.append(BenchCase(f"indicator.bollinger20.{tag}", lambda c=close: indicators.bollinger(c, 20), n))
+
+        cases.append(BenchCase(f"backtest.sma_cross.{tag}", lambda c=close: backtest.sma_cross_backtest(c, 10, 30), n))
+
+        if scale == scales[0]:
+            frame = pd.DataFrame(data, columns=kline_store.ARRAY_COLUMNS)
+            cases.append(BenchCase(f"chart.make_kline_v2.{tag}",
+                                   lambda f=frame: _render_chart(f, str(tmp_dir / 'chart.html')), n))
+    return cases
+
+
+def run_suite(scales: List[int], repeat: int, pattern: Optional[str] = None) -> Dict[str, object]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in build_cases(scales, Path(tmp)):
+            if pattern and pattern not in case.name:
+                continue
+            try:
+                result = _time_case(case, repeat)
+            except SkipCase as e:
+                result = {'name': case.name, 'status': 'skipped', 'reason': str(e)}
+            results.append(result)
+            if result['status'] == 'ok':
+                print(f"{case.name:<45} {result['min'] * 1000:>10.2f}ms  (median {result['median'] * 1000:.2f}ms)")
+            else:
+                print(f"{case.name:<45} {'skipped':>12}  {result['reason']}")
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'processor': platform.processor(), 'cpu_count': os.cpu_count(),
+                    'numpy': np.__version__, 'pandas': pd.__version__},
+        'scales': scales,
+        'results': results,
+    }
+
+
+def compare(report: Dict[str, object], baseline: Dict[str, object], tolerance: float) -> List[Dict[str, object]]:
+    """
+    与基线比较各用例最小耗时, 返回回退的用例
+    """
+    base = {r['name']: r for r in baseline.get('results', []) if r.get('status') == 'ok'}
+    regressions = []
+    for r in report['results']:
+        if r.get('status') != 'ok' or r['name'] not in base:
+            continue
+        ratio = r['min'] / base[r['name']]['min']
+        r['baseline_min'] = base[r['name']]['min']
+        r['ratio'] = ratio
+        if ratio > 1 + tolerance:
+            regressions.append(r)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="cexlee 性能基准")
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 10], help="数据放大倍数, 1 为原始数据")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('-k', dest='pattern', default=None, help="只运行名称包含该字符串的用例")
+    parser.add_argument('--output', default=str(RESULT_PATH))
+    parser.add_argument('--baseline', default=str(BASELINE_PATH))
+    parser.add_argument('--save-baseline', action='store_true', help="把本次结果保存为基线")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="允许的耗时增长比例")
+    parser.add_argument('--fail-on-regression', action='store_true')
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.scale, args.repeat, args.pattern)
+
+    regressions = []
+    baseline_path = Path(args.baseline)
+    missing_baseline = not args.save_baseline and not baseline_path.exists()
+    if missing_baseline:
+        print(f"未找到基线 {baseline_path}, 未做回退比较; 请先用相同的 --scale 运行 --save-baseline", file=sys.stderr)
+    elif not args.save_baseline:
+        regressions = compare(report, json.loads(baseline_path.read_text(encoding='utf-8')), args.tolerance)
+        for r in regressions:
+            print(f"回退: {r['name']} {r['baseline_min'] * 1000:.2f}ms -> {r['min'] * 1000:.2f}ms ({r['ratio']:.2f}x)")
+        print(f"与基线比较完成, 回退用例: {len(regressions)}")
+    report['regressions'] = [r['name'] for r in regressions]
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+    print(f"结果已保存到: {output}")
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+        print(f"基线已保存到: {baseline_path}")
+    if missing_baseline and args.fail_on_regression:
+        return 2
+    return 1 if regressions and args.fail_on_regression else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import contextlib
+import io
+import json
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+from benchx import bench_suite
+
+
+class TestBenchSuite(TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmp = Path(self._tmp.name)
+        self.output = self.tmp / 'latest.json'
+        self.baseline = self.tmp / 'baseline.json'
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def _main(self, *extra) -> int:
+        argv = ['--scale', '1', '--repeat', '1', '-k', 'indicator.sma20', '--output', str(self.output),
+                '--baseline', str(self.baseline)] + list(extra)
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            return bench_suite.main(argv)
+
+    def test_missing_baseline_fails_loudly(self):
+        self.assertEqual(self._main('--fail-on-regression'), 2)
+        report = json.loads(self.output.read_text(encoding='utf-8'))
+        self.assertEqual([r['name'] for r in report['results']], ['indicator.sma20.x1'])
+
+    def test_compare_with_saved_baseline(self):
+        self.assertEqual(self._main('--save-baseline'), 0)
+        self.assertTrue(self.baseline.exists())
+        # 把基线耗时改小, 本次运行必然被判定为回退
+        baseline = json.loads(self.baseline.read_text(encoding='utf-8'))
+        for r in baseline['results']:
+            r['min'] /= 100
+        self.baseline.write_text(json.dumps(baseline), encoding='utf-8')
+        self.assertEqual(self._main('--fail-on-regression'), 1)
+        report = json.loads(self.output.read_text(encoding='utf-8'))
+        self.assertEqual(report['regressions'], ['indicator.sma20.x1'])
+        self.assertGreater(report['results'][0]['ratio'], 1.25)
@@ -0,0 +1,412 @@
+"""
+实时风控与盈亏引擎, 多个策略共用一个实例
+
+状态按 (策略, 资产) 存在数组中: 持仓、持仓均价, 以及按策略的已实现盈亏/手续费; 每个资产一个标记价格
+成交和行情都只做增量更新:
+    - on_fill: 只改一个 (策略, 资产) 格子, 再按差值修正该策略的总敞口、保证金、未实现盈亏和资产净持仓
+    - on_tick: 价格变动 dp 对持有该资产的所有策略做一次向量化修正, O(策略数)
+    - 每 recompute_every 次行情全量重算一次聚合值, 消除浮点累积误差
+下单前 check_order 只读取几个标量, 单次微秒级; 只减少持仓的订单总是放行, 以便触发限额后仍能平仓
+
+单线程使用(同一个事件循环或交易线程), 不加锁
+"""
+from typing import Dict, Iterable, List, Optional, Union
+
+import numpy as np
+
+from kitx.MetricsUtil import MetricsUtil
+
+_rejects = MetricsUtil.counter("risk_order_rejects_total", "风控拒单次数, reason 为触发的限额")
+_pnl = MetricsUtil.gauge("risk_strategy_pnl", "策略总盈亏(已实现 + 未实现 - 手续费)")
+_gross = MetricsUtil.gauge("risk_strategy_gross", "策略总敞口(名义价值)")
+
+INF = float('inf')
+
+
+class RiskLimitError(Exception):
+    """
+    订单违反风控限额
+    """
+
+    def __init__(self, reason: str, strategy: str, asset: str, qty: float):
+        super().__init__(f"{strategy} {asset} {qty:+g}: {reason}")
+        self.reason = reason
+        self.strategy = strategy
+        self.asset = asset
+        self.qty = qty
+
+
+class RiskEngine:
+    """
+    持仓、盈亏、敞口与保证金, 以及下单前的限额检查
+
+    限额(未设置即不限制):
+        - 策略 × 资产: 最大持仓数量(绝对值)
+        - 策略: 最大总敞口、最大保证金占用、最大亏损(达到后只允许减仓)
+        - 资产: 所有策略合计的最大净敞口
+        - 全局: 所有策略合计的最大总敞口
+    """
+
+    def __init__(self, assets: Iterable[str] = (), strategies: Iterable[str] = (),
+                 margin_rate: Union[float, Dict[str, float]] = 1.0, max_total_gross: float = INF,
+                 recompute_every: int = 10000):
+        """
+        Args:
+            assets/strategies: 预先登记的资产与策略, 之后首次出现的名称会自动登记
+            margin_rate: 保证金率(名义价值的比例), 现货为1, 10倍杠杆为0.1; 可按资产传入字典
+            max_total_gross: 全局最大总敞口
+            recompute_every: 每多少次行情更新全量重算一次聚合值
+        """
+        self.default_margin_rate = margin_rate if not isinstance(margin_rate, dict) else 1.0
+        self._margin_rates = margin_rate if isinstance(margin_rate, dict) else {}
+        self.max_total_gross = max_total_gross
+        self.recompute_every = recompute_every
+        self.assets: List[str] = []
+        self.strategies: List[str] = []
+        self._asset_id: Dict[str, int] = {}
+        self._strategy_id: Dict[str, int] = {}
+        self._ticks = 0
+
+        s, a = 8, 8
+        # 策略 × 资产
+        self.qty = np.zeros((s, a))
+        self.avg_cost = np.zeros((s, a))
+        self.max_position = np.full((s, a), INF)
+        # 资产
+        self.mark = np.full(a, np.nan)
+        self.margin_rate = np.ones(a)
+        self.net_qty = np.zeros(a)
+        # 所有策略持仓绝对值之和, 行情变动时用于修正全局总敞口
+        self.abs_qty = np.zeros(a)
+        self.max_net_exposure = np.full(a, INF)
+        # 策略
+        self.realized = np.zeros(s)
+        self.fees = np.zeros(s)
+        self.unrealized = np.zeros(s)
+        self.gross = np.zeros(s)
+        self.margin = np.zeros(s)
+        self.max_gross = np.full(s, INF)
+        self.max_margin = np.full(s, INF)
+        self.max_loss = np.full(s, INF)
+        # 数值形式的 max_position, 对之后登记的资产同样生效
+        self.default_max_position = np.full(s, INF)
+        self.total_gross = 0.0
+
+        for asset in assets:
+            self.asset_id(asset)
+        for strategy in strategies:
+            self.strategy_id(strategy)
+
+    # ---------- 登记 ----------
+
+    def _grow(self, strategies: int, assets: int):
+        s, a = self.qty.shape
+        if strategies > s:
+            n = max(strategies, 2 * s)
+            for name, fill in (('realized', 0.0), ('fees', 0.0), ('unrealized', 0.0), ('gross', 0.0),
+                               ('margin', 0.0), ('max_gross', INF), ('max_margin', INF), ('max_loss', INF),
+                               ('default_max_position', INF)):
+                old = getattr(self, name)
+                setattr(self, name, np.concatenate([old, np.full(n - s, fill)]))
+            for name, fill in (('qty', 0.0), ('avg_cost', 0.0), ('max_position', INF)):
+                old = getattr(self, name)
+                setattr(self, name, np.concatenate([old, np.full((n - s, old.shape[1]), fill)]))
+        if assets > a:
+            n = max(assets, 2 * a)
+            for name, fill in (('mark', np.nan), ('margin_rate', 1.0), ('net_qty', 0.0), ('abs_qty', 0.0),
+                               ('max_net_exposure', INF)):
+                old = getattr(self, name)
+                setattr(self, name, np.concatenate([old, np.full(n - a, fill)]))
+            for name, fill in (('qty', 0.0), ('avg_cost', 0.0), ('max_position', INF)):
+                old = getattr(self, name)
+                setattr(self, name, np.concatenate([old, np.full((old.shape[0], n - a), fill)], axis=1))
+
+    def asset_id(self, asset: str) -> int:
+        i = self._asset_id.get(asset)
+        if i is None:
+            i = len(self.assets)
+            self._grow(0, i + 1)
+            self._asset_id[asset] = i
+            self.assets.append(asset)
+            self.margin_rate[i] = self._margin_rates.get(asset, self.default_margin_rate)
+            self.max_position[:, i] = self.default_max_position
+        return i
+
+    def strategy_id(self, strategy: str) -> int:
+        i = self._strategy_id.get(strategy)
+        if i is None:
+            i = len(self.strategies)
+            self._grow(i + 1, 0)
+            self._strategy_id[strategy] = i
+            self.strategies.append(strategy)
+        return i
+
+    def set_strategy_limits(self, strategy: str, max_gross: Optional[float] = None,
+                            max_margin: Optional[float] = None, max_loss: Optional[float] = None,
+                            max_position: Union[None, float, Dict[str, float]] = None):
+        """
+        设置策略限额, max_position 为数值时对所有资产(包括之后登记的)生效, 为字典时按资产设置
+        """
+        s = self.strategy_id(strategy)
+        if max_gross is not None:
+            self.max_gross[s] = max_gross
+        if max_margin is not None:
+            self.max_margin[s] = max_margin
+        if max_loss is not None:
+            self.max_loss[s] = max_loss
+        if isinstance(max_position, dict):
+            for asset, limit in max_position.items():
+                self.max_position[s, self.asset_id(asset)] = limit
+        elif max_position is not None:
+            self.default_max_position[s] = max_position
+            self.max_position[s, :len(self.assets)] = max_position
+
+    def set_asset_limit(self, asset: str, max_net_exposure: float, margin_rate: Optional[float] = None):
+        """
+        设置资产在所有策略合计上的最大净敞口(名义价值绝对值)
+        """
+        a = self.asset_id(asset)
+        self.max_net_exposure[a] = max_net_exposure
+        if margin_rate is not None:
+            self.margin_rate[a] = margin_rate
+            self.recompute()
+
+    # ---------- 增量更新 ----------
+
+    def on_fill(self, strategy: str, asset: str, qty: float, price: float, fee: float = 0.0):
+        """
+        成交回报
+
+        Args:
+            qty: 带符号数量, 买为正卖为负
+            price: 成交价
+            fee: 手续费(计价货币), 计入已实现盈亏
+        """
+        if qty == 0:
+            raise ValueError(f"成交数量为0: {strategy} {asset}")
+        s = self._strategy_id.get(strategy)
+        if s is None:
+            s = self.strategy_id(strategy)
+        a = self._asset_id.get(asset)
+        if a is None:
+            a = self.asset_id(asset)
+        mark = self.mark[a]
+        if mark != mark:
+            # 尚无行情时以成交价作为标记价格
+            mark = self.mark[a] = price
+
+        q = self.qty[s, a]
+        c = self.avg_cost[s, a]
+        new_q = q + qty
+        if q == 0 or (q > 0) == (qty > 0):
+            new_c = (q * c + qty * price) / new_q
+        else:
+            closed = min(abs(qty), abs(q))
+            self.realized[s] += closed * (price - c) * (1.0 if q > 0 else -1.0)
+            if abs(new_q) < 1e-12:
+                new_q, new_c = 0.0, 0.0
+            elif (new_q > 0) == (q > 0):
+                new_c = c
+            else:
+                # 反手: 剩余部分按成交价开仓
+                new_c = price
+        self.qty[s, a] = new_q
+        self.avg_cost[s, a] = new_c
+        self.realized[s] -= fee
+        self.fees[s] += fee
+
+        d_abs = (abs(new_q) - abs(q)) * mark
+        self.gross[s] += d_abs
+        self.total_gross += d_abs
+        self.margin[s] += d_abs * self.margin_rate[a]
+        self.unrealized[s] += new_q * (mark - new_c) - q * (mark - c)
+        self.net_qty[a] += new_q - q
+        self.abs_qty[a] += abs(new_q) - abs(q)
+
+    def on_tick(self, asset: str, price: float):
+        """
+        行情更新, 按价格变动修正所有持有该资产的策略
+        """
+        a = self._asset_id.get(asset)
+        if a is None:
+            a = self.asset_id(asset)
+        old = self.mark[a]
+        self.mark[a] = price
+        if old != old:
+            return
+        dp = price - old
+        if dp == 0:
+            return
+        # 未登记的策略行持仓为0, 直接在整列上计算
+        col = self.qty[:, a]
+        self.unrealized += col * dp
+        d_abs = np.abs(col)
+        d_abs *= dp
+        self.gross += d_abs
+        d_abs *= self.margin_rate[a]
+        self.margin += d_abs
+        self.total_gross += self.abs_qty[a] * dp
+        self._ticks += 1
+        if self._ticks >= self.recompute_every:
+            self.recompute()
+
+    def on_ticks(self, prices: Dict[str, float]):
+        """
+        批量行情更新, 一次矩阵向量乘修正所有策略
+        """
+        idx = np.array([self.asset_id(asset) for asset in prices], dtype=np.int64)
+        new = np.array(list(prices.values()), dtype=np.float64)
+        old = self.mark[idx]
+        self.mark[idx] = new
+        dp = np.where(np.isnan(old), 0.0, new - old)
+        n = len(self.strategies)
+        qty = self.qty[:n, idx]
+        self.unrealized[:n] += qty @ dp
+        abs_qty = np.abs(qty)
+        self.gross[:n] += abs_qty @ dp
+        self.margin[:n] += abs_qty @ (dp * self.margin_rate[idx])
+        self.total_gross += float(self.abs_qty[idx] @ dp)
+        self._ticks += len(idx)
+        if self._ticks >= self.recompute_every:
+            self.recompute()
+
+    def recompute(self):
+        """
+        由持仓和标记价格全量重算聚合值
+        """
+        n, m = len(self.strategies), len(self.assets)
+        qty, cost = self.qty[:n, :m], self.avg_cost[:n, :m]
+        mark = np.where(np.isnan(self.mark[:m]), 0.0, self.mark[:m])
+        notional = np.abs(qty) * mark
+        self.unrealized[:n] = (qty * (mark - cost)).sum(axis=1)
+        self.gross[:n] = notional.sum(axis=1)
+        self.margin[:n] = notional @ self.margin_rate[:m]
+        self.net_qty[:m] = qty.sum(axis=0)
+        self.abs_qty[:m] = np.abs(qty).sum(axis=0)
+        self.total_gross = float(self.gross[:n].sum())
+        self._ticks = 0
+
+    # ---------- 下单前检查 ----------
+
+    def check_order(self, strategy: str, asset: str, qty: float, price: Optional[float] = None) -> Optional[str]:
+        """
+        检查订单成交后是否违反限额
+
+        Args:
+            qty: 带符号数量
+            price: 订单价格, 默认按标记价格估算名义价值
+
+        Returns:
+            None 表示通过, 否则为触发的限额名称
+        """
+        s = self._strategy_id.get(strategy)
+        if s is None:
+            s = self.strategy_id(strategy)
+        a = self._asset_id.get(asset)
+        if a is None:
+            a = self.asset_id(asset)
+        q = self.qty[s, a]
+        new_q = q + qty
+        d_abs_qty = abs(new_q) - abs(q)
+        if d_abs_qty <= 0 and (new_q == 0 or (new_q > 0) == (q > 0)):
+            # 只减仓不反手, 总是放行
+            return None
+        if abs(new_q) > self.max_position[s, a]:
+            return 'max_position'
+        if self.realized[s] + self.unrealized[s] < -self.max_loss[s]:
+            return 'max_loss'
+        px = self.mark[a] if price is None else price
+        if px != px:
+            return 'no_price'
+        d_notional = d_abs_qty * px
+        if self.gross[s] + d_notional > self.max_gross[s]:
+            return 'max_gross'
+        if self.margin[s] + d_notional * self.margin_rate[a] > self.max_margin[s]:
+            return 'max_margin'
+        if self.total_gross + d_notional > self.max_total_gross:
+            return 'max_total_gross'
+        if abs(self.net_qty[a] + qty) * px > self.max_net_exposure[a] and \
+                abs(self.net_qty[a] + qty) > abs(self.net_qty[a]):
+            return 'max_net_exposure'
+        return None
+
+    def enforce(self, strategy: str, asset: str, qty: float, price: Optional[float] = None):
+        """
+        检查订单, 违反限额时抛出 RiskLimitError
+        """
+        reason = self.check_order(strategy, asset, qty, price)
+        if reason is not None:
+            _rejects.inc(reason=reason)
+            raise RiskLimitError(reason, strategy, asset, qty)
+
+    # ---------- 查询 ----------
+
+    def pnl(self, strategy: str) -> float:
+        """
+        策略总盈亏, 已扣除手续费
+        """
+        s = self._strategy_id[strategy]
+        return float(self.realized[s] + self.unrealized[s])
+
+    def position(self, strategy: str, asset: str) -> float:
+        return float(self.qty[self._strategy_id[strategy], self._asset_id[asset]])
+
+    def exposure_by_asset(self) -> Dict[str, float]:
+        """
+        各资产所有策略合计的净敞口(名义价值, 带符号)
+        """
+        m = len(self.assets)
+        return dict(zip(self.assets, (self.net_qty[:m] * self.mark[:m]).tolist()))
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """
+        各策略的盈亏、敞口与保证金
+        """
+        out = {}
+        for s, name in enumerate(self.strategies):
+            out[name] = {'realized': float(self.realized[s]), 'unrealized': float(self.unrealized[s]),
+                         'fees': float(self.fees[s]), 'pnl': float(self.realized[s] + self.unrealized[s]),
+                         'gross': float(self.gross[s]), 'margin': float(self.margin[s])}
+        return out
+
+    def publish_metrics(self):
+        """
+        把各策略盈亏和敞口写入 Prometheus 指标, 由定时任务调用, 不在下单路径上
+        """
+        for name, row in self.summary().items():
+            _pnl.set(row['pnl'], strategy=name)
+            _gross.set(row['gross'], strategy=name)
+
+
+if __name__ == '__main__':
+    import time
+
+    rng = np.random.default_rng(0)
+    assets = [f"SYN{i}-USDT" for i in range(50)]
+    strategies = [f"strat{i}" for i in range(300)]
+    engine = RiskEngine(assets, strategies, margin_rate=0.1, max_total_gross=1e9)
+    for name in strategies:
+        engine.set_strategy_limits(name, max_gross=1e6, max_loss=5e4, max_position=100)
+    engine.on_ticks(dict(zip(assets, rng.uniform(10, 1000, len(assets)))))
+
+    n = 100_000
+    picks = rng.integers(0, [len(strategies), len(assets)], (n, 2))
+    sizes = rng.normal(0, 5, n)
+    start = time.perf_counter()
+    rejected = 0
+    for (s, a), q in zip(picks.tolist(), sizes.tolist()):
+        if engine.check_order(strategies[s], assets[a], q) is not None:
+            rejected += 1
+    check_us = (time.perf_counter() - start) / n * 1e6
+
+    start = time.perf_counter()
+    for (s, a), q in zip(picks.tolist(), sizes.tolist()):
+        engine.on_fill(strategies[s], assets[a], q, 100.0, fee=0.01)
+    fill_us = (time.perf_counter() - start) / n * 1e6
+
+    start = time.perf_counter()
+    for i in range(n):
+        engine.on_tick(assets[i % len(assets)], 100.0 * (1 + 0.001 * np.sin(i)))
+    tick_us = (time.perf_counter() - start) / n * 1e6
+    print(f"check_order {check_us:.2f}us, on_fill {fill_us:.2f}us, on_tick({len(strategies)}个策略) {tick_us:.2f}us, "
+          f"拒单 {rejected}")
@@ -0,0 +1,98 @@
+from unittest import TestCase
+
+import numpy as np
+
+from botx.risk_engine import RiskEngine, RiskLimitError
+
+
+class TestRiskEngine(TestCase):
+
+    def test_average_cost_and_realized(self):
+        engine = RiskEngine()
+        engine.on_fill('s', 'ETH', 2, 100.0)
+        engine.on_fill('s', 'ETH', 2, 110.0)
+        self.assertAlmostEqual(engine.avg_cost[0, 0], 105.0)
+        engine.on_fill('s', 'ETH', -3, 120.0, fee=1.0)
+        self.assertAlmostEqual(engine.realized[0], 3 * 15.0 - 1.0)
+        self.assertAlmostEqual(engine.avg_cost[0, 0], 105.0)
+        # 反手: 剩余空头按成交价开仓
+        engine.on_fill('s', 'ETH', -3, 90.0)
+        self.assertAlmostEqual(engine.position('s', 'ETH'), -2.0)
+        self.assertAlmostEqual(engine.avg_cost[0, 0], 90.0)
+        self.assertAlmostEqual(engine.realized[0], 44.0 - 15.0)
+        engine.on_tick('ETH', 80.0)
+        self.assertAlmostEqual(engine.unrealized[0], 20.0)
+        self.assertAlmostEqual(engine.pnl('s'), 49.0)
+        self.assertAlmostEqual(engine.exposure_by_asset()['ETH'], -160.0)
+
+    def test_incremental_matches_recompute(self):
+        rng = np.random.default_rng(0)
+        assets = [f"A{i}" for i in range(12)]
+        strategies = [f"s{i}" for i in range(20)]
+        engine = RiskEngine(margin_rate={'A0': 0.1, 'A1': 0.2}, recompute_every=10 ** 9)
+        for i in range(5000):
+            asset = assets[rng.integers(len(assets))]
+            if rng.random() < 0.5:
+                engine.on_fill(strategies[rng.integers(len(strategies))], asset, float(rng.normal(0, 3)),
+                               float(rng.uniform(50, 150)), fee=0.01)
+            else:
+                engine.on_tick(asset, float(rng.uniform(50, 150)))
+        engine.on_ticks({a: float(rng.uniform(50, 150)) for a in assets[:6]})
+        state = [engine.unrealized.copy(), engine.gross.copy(), engine.margin.copy(), engine.total_gross,
+                 engine.net_qty.copy(), engine.abs_qty.copy()]
+        engine.recompute()
+        for got, want in zip(state, [engine.unrealized, engine.gross, engine.margin, engine.total_gross,
+                                     engine.net_qty, engine.abs_qty]):
+            np.testing.assert_allclose(got, want, rtol=1e-9, atol=1e-6)
+        self.assertEqual(len(engine.strategies), 20)
+
+    def test_limits(self):
+        engine = RiskEngine(['BTC', 'ETH'], margin_rate=0.1, max_total_gross=10_000)
+        engine.on_ticks({'BTC': 1000.0, 'ETH': 100.0})
+        engine.set_strategy_limits('a', max_gross=5000, max_margin=300, max_position={'BTC': 4})
+        engine.set_asset_limit('ETH', max_net_exposure=2000)
+
+        self.assertEqual(engine.check_order('a', 'BTC', 5), 'max_position')
+        self.assertIsNone(engine.check_order('a', 'BTC', 3))
+        self.assertEqual(engine.check_order('a', 'BTC', 4), 'max_margin')
+        engine.on_fill('a', 'BTC', 3, 1000.0)
+        self.assertEqual(engine.check_order('a', 'ETH', 21), 'max_gross')
+        self.assertEqual(engine.check_order('b', 'ETH', 21), 'max_net_exposure')
+        self.assertEqual(engine.check_order('b', 'BTC', 8), 'max_total_gross')
+        with self.assertRaises(RiskLimitError) as ctx:
+            engine.enforce('a', 'BTC', 2)
+        self.assertEqual(ctx.exception.reason, 'max_position')
+        # 减仓总是放行, 反手超限仍会拒绝
+        self.assertIsNone(engine.check_order('a', 'BTC', -3))
+        self.assertEqual(engine.check_order('a', 'BTC', -8), 'max_position')
+
+    def test_max_loss_blocks_new_risk(self):
+        engine = RiskEngine()
+        engine.set_strategy_limits('a', max_loss=50)
+        engine.on_fill('a', 'SOL', 10, 20.0)
+        engine.on_tick('SOL', 14.0)
+        self.assertEqual(engine.check_order('a', 'SOL', 1), 'max_loss')
+        self.assertEqual(engine.check_order('b', 'BTC', 1), 'no_price')
+        self.assertIsNone(engine.check_order('a', 'SOL', -10))
+        engine.on_fill('a', 'SOL', -10, 14.0)
+        self.assertAlmostEqual(engine.summary()['a']['realized'], -60.0)
+        self.assertAlmostEqual(engine.gross[0], 0.0)
+
+    def test_zero_fill_rejected(self):
+        engine = RiskEngine()
+        engine.set_strategy_limits('a', max_loss=50)
+        with self.assertRaises(ValueError):
+            engine.on_fill('a', 'SOL', 0.0, 20.0)
+        engine.on_fill('a', 'SOL', 10, 20.0)
+        engine.on_tick('SOL', 14.0)
+        self.assertAlmostEqual(engine.pnl('a'), -60.0)
+        self.assertEqual(engine.check_order('a', 'SOL', 1), 'max_loss')
+
+    def test_default_position_limit_applies_to_later_assets(self):
+        engine = RiskEngine(['B0'])
+        engine.set_strategy_limits('a', max_position=5)
+        for i in range(1, 20):
+            engine.on_tick(f"B{i}", 10.0)
+        self.assertEqual(engine.check_order('a', 'B3', 6), 'max_position')
+        self.assertEqual(engine.check_order('a', 'B19', 6), 'max_position')
+        self.assertIsNone(engine.check_order('b', 'B19', 6))
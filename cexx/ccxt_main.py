@@ -1,10 +1,16 @@
-import ccxt
-import ccxt.async_support as ccxt_async
+from typing import List
 
 
+def list_exchanges(async_support: bool = False) -> List[str]:
+    """
+    列出 ccxt 支持的交易所, 只导入需要的那一个模块(ccxt.async_support 导入耗时与 ccxt 相当)
+    """
+    if async_support:
+        import ccxt.async_support as ccxt_async
+        return ccxt_async.exchanges
+    import ccxt
+    return ccxt.exchanges
 
-print(ccxt.exchanges)
-print(ccxt_async.exchanges)
 
 if __name__ == '__main__':
-    print("ccxt")
\ No newline at end of file
+    print(list_exchanges())
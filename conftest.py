@@ -0,0 +1,9 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# 测试与演示产生的日志写入临时目录, 不污染仓库的 logs/; 须在导入任何模块(创建logger)之前设置
+if 'LOG_DIR' not in os.environ:
+    os.environ['LOG_DIR'] = tempfile.mkdtemp(prefix='cexlee-logs-')
+    atexit.register(shutil.rmtree, os.environ['LOG_DIR'], True)
@@ -1,10 +1,11 @@
-import ccxt
 import pandas as pd
 import time
-import os
 from datetime import datetime, timedelta
+from dexx import kline_store
+from kitx.RetryUtil import RetryUtil, CircuitOpenError, is_retryable_error
 
-def fetch_binance_kline_data(symbol: str, timeframe: str, start_date: str, end_date: str = None, limit: int = 1000, save_csv: bool = True) -> pd.DataFrame:
+def fetch_binance_kline_data(symbol: str, timeframe: str, start_date: str, end_date: str = None, limit: int = 1000, save_csv: bool = True, exchange=None,
+                             endpoint_name: str = "binance.fetch_ohlcv") -> pd.DataFrame:
     """
     从币安交易所获取K线历史数据
 
@@ -15,17 +16,22 @@ def fetch_binance_kline_data(symbol: str, timeframe: str, start_date: str, end_d
         end_date (str, optional): 结束日期，格式 "YYYY-MM-DD". 默认是当前日期
         limit (int, optional): 每次请求的数据条数，最大为1000
         save_csv (bool, optional): 是否保存为CSV文件
+        exchange (optional): 已创建的交易所对象, 默认新建 ccxt.binance(测试/压测时可传入模拟对象)
+        endpoint_name (str, optional): RetryUtil 接口名称, 同名调用共享限速/熔断状态(压测应使用独立名称)
 
     返回:
         pd.DataFrame: 包含K线数据的DataFrame
     """
     # 初始化币安交易所对象
-    exchange = ccxt.binance({
-        'enableRateLimit': True,  # 启用速率限制
-        'options': {
-            'defaultType': 'spot',  # 默认交易类型为现货
-        }
-    })
+    if exchange is None:
+        # ccxt 导入较慢, 只在真正连接交易所时加载
+        import ccxt
+        exchange = ccxt.binance({
+            'enableRateLimit': False,  # 速率由 RetryUtil 的自适应令牌桶控制
+            'options': {
+                'defaultType': 'spot',  # 默认交易类型为现货
+            }
+        })
 
     # 转换日期格式
     start_timestamp = exchange.parse8601(f"{start_date}T00:00:00Z")
@@ -35,6 +41,9 @@ def fetch_binance_kline_data(symbol: str, timeframe: str, start_date: str, end_d
     else:
         end_timestamp = exchange.milliseconds()  # 当前时间
 
+    # 限速/重试/熔断, 初始速率取交易所声明的 rateLimit
+    endpoint = RetryUtil.endpoint(endpoint_name, rate=1000 / exchange.rateLimit)
+
     # 存储所有K线数据
     all_ohlcv = []
 
@@ -43,7 +52,7 @@ def fetch_binance_kline_data(symbol: str, timeframe: str, start_date: str, end_d
     while current_timestamp < end_timestamp:
         try:
             # 获取K线数据
-            ohlcv = exchange.fetch_ohlcv(symbol, timeframe, current_timestamp, limit)
+            ohlcv = endpoint.call(exchange.fetch_ohlcv, symbol, timeframe, current_timestamp, limit)
 
             if not ohlcv:
                 break
@@ -54,17 +63,20 @@ def fetch_binance_kline_data(symbol: str, timeframe: str, start_date: str, end_d
             # 存储数据
             all_ohlcv.extend(ohlcv)
 
-            # 避免触发API速率限制
-            time.sleep(exchange.rateLimit / 1000)
-
             # 打印进度
             progress = min(current_timestamp, end_timestamp) / end_timestamp * 100
             print(f"\r进度: {progress:.2f}%", end="")
 
+        except CircuitOpenError as e:
+            # 交易所不可用, 等待熔断器半开后再探测
+            print(f"\n{e}")
+            time.sleep(e.retry_in)
+
         except Exception as e:
             print(f"\n错误: {e}")
-            print(f"暂停10秒后继续...")
-            time.sleep(10)
+            # 不可重试的错误直接抛出, 不保存文件名声称覆盖完整区间的不完整数据; 网络类错误累计到熔断器
+            if not is_retryable_error(e):
+                raise
 
     print("\n数据获取完成!")
 
@@ -83,12 +95,12 @@ def fetch_binance_kline_data(symbol: str, timeframe: str, start_date: str, end_d
 
     # 保存为CSV
     if save_csv:
-        # 创建数据文件夹（如果不存在）
-        if not os.path.exists('data'):
-            os.makedirs('data')
+        # 保存到项目根目录的 data/, 与当前工作目录无关
+        kline_store.DATA_DIR.mkdir(parents=True, exist_ok=True)
 
         # 生成文件名
-        filename = f"data/binance_{symbol.replace('/', '-')}_{timeframe}_{start_date.replace('-', '')}_{datetime.now().strftime('%Y%m%d')}.csv"
+        filename = kline_store.DATA_DIR / kline_store.kline_filename(
+            "binance", symbol, timeframe, start_date, datetime.now().strftime('%Y%m%d'))
 
         # 保存数据
         df.to_csv(filename, index=False)
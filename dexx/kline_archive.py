@@ -0,0 +1,374 @@
+"""
+冷数据压缩归档
+
+CSV 每行重复保存 ISO datetime 字符串, 多年多交易对的历史占用大量磁盘. 归档文件(.cxa)按列存储:
+    - 时间戳: 差分编码
+    - 价格/数量: 按列的小数位数缩放为整数后差分; 无法在精度内缩放为整数的列(量级过大或非有限值)保存原始 float64
+    - 差分值 zigzag 编码后按字节转置, 再按块做 zstd 压缩
+每块独立压缩, 文件尾的块索引记录每块的时间范围, 按时间读取时只解压重叠的块
+
+文件布局: MAGIC | block 0 | block 1 | ... | footer(JSON) | footer长度(uint64) | MAGIC
+
+K线(N×6)和盘口快照(时间戳 + 各档买卖价量)都按列归档; kline_store 在 data/archive/ 下找到 .cxa 时
+会透明读取, 也可以用 archive_cold 把结束日期早于阈值的K线文件迁移到归档
+
+    python -m dexx.kline_archive archive --older-than 90
+    python -m dexx.kline_archive ls
+"""
+import argparse
+import json
+import os
+import struct
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+import zstandard
+
+from dexx import kline_store
+from kitx.LogUtil import LogUtil
+
+logger = LogUtil.get_logger2("KlineArchive")
+
+MAGIC = b'CXA1'
+ARCHIVE_SUFFIX = kline_store.ARCHIVE_SUFFIX
+ARCHIVE_DIRNAME = kline_store.ARCHIVE_DIRNAME
+DEFAULT_BLOCK_ROWS = 65536
+# 自动选择小数位数的上限, 超过时按该精度量化(有损)
+MAX_DECIMALS = 8
+# 量化误差上限(绝对值), 选择小数位数与归档校验使用同一标准
+TOLERANCE = 10.0 ** -MAX_DECIMALS
+# 小数位数为 RAW 的列不缩放, 直接保存 float64 位模式
+RAW = -1
+# open_reader 缓存的读取器数量, 重复的范围读取(如K线查询服务)复用已解压的块
+READER_CACHE_SIZE = 16
+# 缩放后的整数必须能被 float64 精确表示
+_MAX_SCALED = 2.0 ** 53
+_FOOTER = struct.Struct('<Q')
+
+
+def _decimals(col: np.ndarray, max_decimals: int = MAX_DECIMALS) -> int:
+    """
+    在 TOLERANCE 内表示该列的最小小数位数; 缩放后超出 2^53 或含非有限值时返回 RAW
+    """
+    if not len(col):
+        return 0
+    if not np.all(np.isfinite(col)):
+        return RAW
+    peak = float(np.max(np.abs(col)))
+    for d in range(max_decimals + 1):
+        scale = 10.0 ** d
+        if peak * scale >= _MAX_SCALED:
+            break
+        if np.all(np.abs(np.round(col * scale) / scale - col) <= TOLERANCE):
+            return d
+    return RAW
+
+
+def _encode_column(values: np.ndarray, decimals: int) -> bytes:
+    if decimals == RAW:
+        # 原始位模式同样按字节转置, 指数所在的高位字节变化小, 仍可压缩
+        return np.ascontiguousarray(values, dtype='<f8').view(np.uint8).reshape(-1, 8).T.tobytes()
+    ints = np.round(values * 10.0 ** decimals).astype(np.int64)
+    delta = np.diff(ints, prepend=np.int64(0))
+    # zigzag: 小的正负差分都变成小的非负整数, 高位字节为0
+    zz = (delta << 1) ^ (delta >> 63)
+    # 字节转置, 同一字节位连续存放, 压缩率明显提高
+    return zz.view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def _decode_column(raw: bytes, rows: int, decimals: int) -> np.ndarray:
+    transposed = np.frombuffer(raw, dtype=np.uint8).reshape(8, rows).T.copy()
+    if decimals == RAW:
+        return transposed.view('<f8').ravel().astype(np.float64)
+    zz = transposed.view(np.uint64).ravel()
+    delta = (zz >> np.uint64(1)).astype(np.int64) ^ -(zz & np.uint64(1)).astype(np.int64)
+    ints = np.cumsum(delta)
+    return ints / 10.0 ** decimals if decimals else ints.astype(np.float64)
+
+
+def write_archive(path: Union[str, Path], data: np.ndarray, columns: Sequence[str],
+                  decimals: Optional[Sequence[int]] = None, block_rows: int = DEFAULT_BLOCK_ROWS,
+                  level: int = 9, meta: Optional[Dict] = None) -> Path:
+    """
+    写入归档文件, 第一列为毫秒时间戳(升序)
+
+    Args:
+        data: N×C 数组
+        columns: 列名
+        decimals: 每列的小数位数, 默认按数据自动选择; RAW 表示不缩放
+        block_rows: 每块行数
+        level: zstd 压缩级别
+        meta: 附加信息, 保存在文件尾
+    """
+    data = np.asarray(data, dtype=np.float64)
+    if data.ndim != 2 or data.shape[1] != len(columns):
+        raise ValueError(f"数据形状 {data.shape} 与列数 {len(columns)} 不符")
+    if decimals is None:
+        decimals = [0] + [_decimals(data[:, c]) for c in range(1, data.shape[1])]
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    compressor = zstandard.ZstdCompressor(level=level)
+    blocks = []
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        for lo in range(0, len(data), block_rows):
+            block = data[lo:lo + block_rows]
+            raw = b''.join(_encode_column(block[:, c], d) for c, d in enumerate(decimals))
+            payload = compressor.compress(raw)
+            blocks.append({'offset': f.tell(), 'length': len(payload), 'rows': len(block),
+                           't0': int(block[0, 0]), 't1': int(block[-1, 0])})
+            f.write(payload)
+        footer = json.dumps({'columns': list(columns), 'decimals': list(map(int, decimals)),
+                             'rows': len(data), 'blocks': blocks, 'meta': meta or {}}).encode()
+        f.write(footer)
+        f.write(_FOOTER.pack(len(footer)))
+        f.write(MAGIC)
+    os.replace(tmp, path)
+    return path
+
+
+class ArchiveReader:
+    """
+    归档文件读取, 按时间范围只解压重叠的块; 最近解压的块保存在小的LRU缓存中
+    """
+
+    def __init__(self, path: Union[str, Path], cache_blocks: int = 8):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            f.seek(-len(MAGIC) - _FOOTER.size, os.SEEK_END)
+            (length,) = _FOOTER.unpack(f.read(_FOOTER.size))
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"不是归档文件: {self.path}")
+            f.seek(-len(MAGIC) - _FOOTER.size - length, os.SEEK_END)
+            footer = json.loads(f.read(length))
+        self.columns: List[str] = footer['columns']
+        self.decimals: List[int] = footer['decimals']
+        self.rows: int = footer['rows']
+        self.blocks: List[Dict] = footer['blocks']
+        self.meta: Dict = footer['meta']
+        self._t0 = np.array([b['t0'] for b in self.blocks], dtype=np.int64)
+        self._t1 = np.array([b['t1'] for b in self.blocks], dtype=np.int64)
+        self._cache: OrderedDict = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._lock = threading.Lock()
+
+    def read_block(self, i: int) -> np.ndarray:
+        """
+        解压第 i 块, 返回 rows×C 数组(只读)
+        """
+        with self._lock:
+            cached = self._cache.get(i)
+            if cached is not None:
+                self._cache.move_to_end(i)
+                return cached
+        block = self.blocks[i]
+        with open(self.path, 'rb') as f:
+            f.seek(block['offset'])
+            payload = f.read(block['length'])
+        raw = zstandard.ZstdDecompressor().decompress(payload)
+        rows = block['rows']
+        size = rows * 8
+        arr = np.empty((rows, len(self.columns)))
+        for c, d in enumerate(self.decimals):
+            arr[:, c] = _decode_column(raw[c * size:(c + 1) * size], rows, d)
+        arr.flags.writeable = False
+        with self._lock:
+            self._cache[i] = arr
+            while len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        return arr
+
+    def read_range(self, start: Optional[int] = None, end: Optional[int] = None,
+                   columns: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        读取毫秒时间戳 [start, end) 内的行
+        """
+        lo = int(np.searchsorted(self._t1, start, side='left')) if start is not None else 0
+        hi = int(np.searchsorted(self._t0, end, side='left')) if end is not None else len(self.blocks)
+        parts = [self.read_block(i) for i in range(lo, hi)]
+        arr = np.concatenate(parts) if parts else np.empty((0, len(self.columns)))
+        ts = arr[:, 0]
+        a = int(np.searchsorted(ts, start, side='left')) if start is not None else 0
+        b = int(np.searchsorted(ts, end, side='left')) if end is not None else len(arr)
+        arr = arr[a:b]
+        if columns is not None:
+            arr = arr[:, [self.columns.index(c) for c in columns]]
+        return np.array(arr)
+
+    def read_all(self) -> np.ndarray:
+        return self.read_range()
+
+    @property
+    def time_range(self):
+        return (int(self._t0[0]), int(self._t1[-1])) if self.blocks else (None, None)
+
+
+_readers: OrderedDict = OrderedDict()
+_readers_lock = threading.Lock()
+
+
+def open_reader(path: Union[str, Path]) -> ArchiveReader:
+    """
+    获取归档文件的共享读取器, 按 (路径, 修改时间, 大小) 缓存, 文件被改写后重新打开; 块缓存因此在多次读取间复用
+    """
+    path = Path(path)
+    st = path.stat()
+    key = (str(path.resolve()), st.st_mtime_ns, st.st_size)
+    with _readers_lock:
+        reader = _readers.get(key)
+        if reader is not None:
+            _readers.move_to_end(key)
+            return reader
+    reader = ArchiveReader(path)
+    with _readers_lock:
+        _readers[key] = reader
+        while len(_readers) > READER_CACHE_SIZE:
+            _readers.popitem(last=False)
+    return reader
+
+
+def archive_path(csv_path: Union[str, Path]) -> Path:
+    """
+    K线CSV对应的归档路径: 同级 archive/ 目录下同名 .cxa
+    """
+    path = Path(csv_path)
+    return path.parent / ARCHIVE_DIRNAME / f"{path.stem}{ARCHIVE_SUFFIX}"
+
+
+def archive_kline_file(csv_path: Union[str, Path], remove: bool = True, verify: bool = True, **kwargs) -> Path:
+    """
+    把一个K线CSV迁移到归档, 校验读回的数据在 TOLERANCE 内一致后删除CSV和 .npy 缓存; 校验失败时删除归档并抛出 ValueError
+    """
+    csv_path = Path(csv_path)
+    data = np.asarray(kline_store.load_kline_array_from(csv_path, mmap=False))
+    target = write_archive(archive_path(csv_path), data, kline_store.ARRAY_COLUMNS,
+                           meta={'kind': 'kline', 'source': csv_path.name}, **kwargs)
+    if verify:
+        restored = ArchiveReader(target).read_all()
+        if restored.shape != data.shape or \
+                not np.allclose(restored, data, rtol=0, atol=TOLERANCE, equal_nan=True):
+            target.unlink()
+            raise ValueError(f"归档校验失败: {csv_path}")
+    if remove:
+        for p in (csv_path, kline_store.cache_path(csv_path)):
+            if p.exists():
+                p.unlink()
+    return target
+
+
+def cold_kline_files(older_than_days: int = 90, data_dir: Union[str, Path] = None) -> List[Path]:
+    """
+    结束日期早于 older_than_days 天前的K线CSV
+    """
+    cutoff = (datetime.now() - timedelta(days=older_than_days)).strftime('%Y%m%d')
+    return [p for p in kline_store.find_kline_files(data_dir=data_dir, include_archive=False)
+            if kline_store.parse_kline_filename(p)['end'] < cutoff]
+
+
+def archive_cold(older_than_days: int = 90, data_dir: Union[str, Path] = None, dry_run: bool = False) -> List[Dict]:
+    """
+    把冷数据分区迁移到归档, 返回每个文件迁移前后的大小; 单个文件失败时记录错误并跳过, 保留原CSV
+    """
+    report = []
+    for path in cold_kline_files(older_than_days, data_dir):
+        size = path.stat().st_size
+        if dry_run:
+            report.append({'source': str(path), 'bytes': size})
+            continue
+        try:
+            target = archive_kline_file(path)
+        except (ValueError, OSError) as e:
+            logger.error(f"归档失败, 跳过 {path}: {e}")
+            report.append({'source': str(path), 'bytes': size, 'error': str(e)})
+            continue
+        report.append({'source': str(path), 'archive': str(target), 'bytes': size,
+                       'archive_bytes': target.stat().st_size})
+    return report
+
+
+def restore_kline_file(archive: Union[str, Path], remove: bool = False) -> Path:
+    """
+    把归档还原为K线CSV(写回 archive/ 的上级目录)
+    """
+    archive = Path(archive)
+    data = ArchiveReader(archive).read_all()
+    meta = kline_store.parse_kline_filename(archive)
+    path = kline_store.write_kline(data, meta['exchange'], meta['symbol'], meta['timeframe'],
+                                   data_dir=archive.parent.parent)
+    if remove:
+        archive.unlink()
+    return path
+
+
+def orderbook_columns(depth: int) -> List[str]:
+    cols = ['timestamp']
+    for side in ('bid', 'ask'):
+        cols += [f"{side}_px_{i}" for i in range(depth)] + [f"{side}_qty_{i}" for i in range(depth)]
+    return cols
+
+
+def write_orderbook_archive(path: Union[str, Path], timestamps: np.ndarray, bids: np.ndarray, asks: np.ndarray,
+                            **kwargs) -> Path:
+    """
+    归档盘口快照
+
+    Args:
+        timestamps: (N,) 毫秒时间戳
+        bids/asks: (N, depth, 2) 各档 [价格, 数量]
+    """
+    n, depth, _ = bids.shape
+    data = np.column_stack([np.asarray(timestamps, dtype=np.float64),
+                            bids[:, :, 0], bids[:, :, 1], asks[:, :, 0], asks[:, :, 1]])
+    meta = dict(kwargs.pop('meta', None) or {}, kind='orderbook', depth=depth)
+    return write_archive(path, data, orderbook_columns(depth), meta=meta, **kwargs)
+
+
+def read_orderbook(path: Union[str, Path], start: Optional[int] = None, end: Optional[int] = None
+                   ) -> Dict[str, np.ndarray]:
+    """
+    读取盘口快照归档, 返回 {'timestamp': (N,), 'bids': (N, depth, 2), 'asks': (N, depth, 2)}
+    """
+    reader = ArchiveReader(path)
+    depth = reader.meta['depth']
+    arr = reader.read_range(start, end)
+    book = {'timestamp': arr[:, 0].astype(np.int64)}
+    for k, side in enumerate(('bids', 'asks')):
+        base = 1 + k * 2 * depth
+        book[side] = np.stack([arr[:, base:base + depth], arr[:, base + depth:base + 2 * depth]], axis=2)
+    return book
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="K线冷数据归档")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('archive', help="迁移冷数据分区")
+    p.add_argument('--older-than', type=int, default=90, help="结束日期早于多少天前")
+    p.add_argument('--dry-run', action='store_true')
+    p = sub.add_parser('restore', help="还原为CSV")
+    p.add_argument('paths', nargs='+')
+    sub.add_parser('ls', help="列出归档文件")
+    args = parser.parse_args()
+
+    if args.command == 'archive':
+        total, archived = 0, 0
+        for item in archive_cold(args.older_than, dry_run=args.dry_run):
+            if 'error' in item:
+                print(f"{item['source']}: 失败 {item['error']}")
+                continue
+            total += item['bytes']
+            archived += item.get('archive_bytes', 0)
+            print(f"{item['source']}: {item['bytes']} -> {item.get('archive_bytes', '-')}")
+        if archived:
+            print(f"合计 {total} -> {archived} 字节, 压缩比 {total / archived:.1f}x")
+    elif args.command == 'restore':
+        for p in args.paths:
+            print(f"已还原: {restore_kline_file(p)}")
+    else:
+        for path in sorted((kline_store.DATA_DIR / ARCHIVE_DIRNAME).glob(f'*{ARCHIVE_SUFFIX}')):
+            reader = ArchiveReader(path)
+            print(f"{path.name}: {reader.rows} 行, {len(reader.blocks)} 块, {path.stat().st_size} 字节")
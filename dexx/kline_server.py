@@ -0,0 +1,379 @@
+"""
+本地K线查询服务
+
+图表、机器人和 notebook 通过同一个服务按 (exchange, symbol, timeframe, start, end, fields) 查询K线,
+共享一份热数据缓存, 不再各自按相对路径解析CSV
+
+协议: 客户端每次发送一行 JSON 请求; 服务端返回一行 JSON 响应头, 成功时随后是 shape 对应的
+float64 原始字节(C 顺序, 小端)
+
+    python -m dexx.kline_server --port 8765
+
+    with KlineClient() as client:
+        arr = client.query('okx', 'ETH-USDT', '5m', start=..., fields=['timestamp', 'close'])
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dexx import kline_store
+from kitx.LogUtil import LogUtil
+from kitx.MetricsUtil import MetricsUtil
+
+logger = LogUtil.get_logger2("KlineServer")
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = int(os.environ.get('KLINE_SERVER_PORT', 8765))
+# 缓存容量上限(字节)
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+# 分区版本(文件列表及修改时间)的缓存秒数, 期间命中缓存不访问文件系统
+DEFAULT_VERSION_TTL = 1.0
+
+_requests = MetricsUtil.counter("kline_query_total", "K线查询次数, result 为 hit/miss/coalesced/error")
+_query_seconds = MetricsUtil.histogram("kline_query_seconds", "K线查询耗时(不含网络传输)")
+_cache_bytes = MetricsUtil.gauge("kline_query_cache_bytes", "K线查询缓存占用字节数")
+
+
+class QueryError(Exception):
+    """
+    查询失败, 消息来自服务端
+    """
+
+
+class KlineQuery(NamedTuple):
+    exchange: str
+    symbol: str
+    timeframe: str
+    start: Optional[int] = None
+    end: Optional[int] = None
+    fields: Tuple[str, ...] = tuple(kline_store.ARRAY_COLUMNS)
+
+    @classmethod
+    def from_dict(cls, d: Dict) -> 'KlineQuery':
+        fields = tuple(d.get('fields') or kline_store.ARRAY_COLUMNS)
+        unknown = [f for f in fields if f not in kline_store.COL]
+        if unknown:
+            raise ValueError(f"未知字段: {unknown}")
+        start = d.get('start')
+        end = d.get('end')
+        return cls(d['exchange'], kline_store.normalize_symbol(d['symbol']), d['timeframe'],
+                   int(start) if start is not None else None, int(end) if end is not None else None, fields)
+
+
+def read_range(query: KlineQuery, data_dir=None) -> np.ndarray:
+    """
+    从K线存储读取查询结果, 返回连续的 (N, len(fields)) float64 数组
+    """
+    # 跨 CSV 与归档分区读取, 归档只解压重叠的块
+    arr = kline_store.load_kline_range(query.exchange, query.symbol, query.timeframe, query.start, query.end,
+                                       data_dir=data_dir)
+    return np.ascontiguousarray(arr[:, [kline_store.COL[f] for f in query.fields]], dtype='<f8')
+
+
+class LRUCache:
+    """
+    按字节数限制容量的LRU缓存, 只在事件循环线程中访问
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._items: OrderedDict = OrderedDict()
+
+    def get(self, key):
+        value = self._items.get(key)
+        if value is not None:
+            self._items.move_to_end(key)
+        return value
+
+    def put(self, key, value: np.ndarray):
+        if value.nbytes > self.max_bytes:
+            return
+        old = self._items.pop(key, None)
+        if old is not None:
+            self.nbytes -= old.nbytes
+        self._items[key] = value
+        self.nbytes += value.nbytes
+        while self.nbytes > self.max_bytes:
+            _, evicted = self._items.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+        _cache_bytes.set(self.nbytes)
+
+    def clear(self):
+        self._items.clear()
+        self.nbytes = 0
+        _cache_bytes.set(0)
+
+    def __len__(self):
+        return len(self._items)
+
+
+class KlineQueryServer:
+    """
+    asyncio K线查询服务
+
+    命中缓存直接返回; 未命中时在线程池中读取, 同一查询的并发请求共用一次读取.
+    缓存键包含分区文件列表及修改时间(按数据源缓存 version_ttl 秒, 在线程池中列举),
+    分区被改写后重新读取, 旧条目按LRU淘汰
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, data_dir=None,
+                 cache_bytes: int = DEFAULT_CACHE_BYTES, io_workers: int = 4,
+                 version_ttl: float = DEFAULT_VERSION_TTL):
+        """
+        Args:
+            host: 监听地址, 默认只监听本机
+            port: 监听端口, 0 为随机端口
+            data_dir: K线数据目录, 默认为项目 data/
+            cache_bytes: 缓存容量(字节)
+            io_workers: 读取文件的线程数
+            version_ttl: 分区版本的缓存秒数, 分区改写后最多延迟这么久才能查到新数据
+        """
+        self.host = host
+        self.port = port
+        self.data_dir = data_dir
+        self.cache = LRUCache(cache_bytes)
+        self.version_ttl = version_ttl
+        # (exchange, symbol, timeframe) -> (过期时间, 分区版本)
+        self._versions: Dict[Tuple, Tuple[float, Tuple]] = {}
+        self._inflight: Dict[Tuple, asyncio.Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix='kline-io')
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _partition_version(self, query: KlineQuery) -> Tuple:
+        source = (query.exchange, query.symbol, query.timeframe)
+        now = time.monotonic()
+        entry = self._versions.get(source)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        version = await asyncio.get_running_loop().run_in_executor(
+            self._executor, kline_store.partition_version, *source, self.data_dir)
+        self._versions[source] = (now + self.version_ttl, version)
+        return version
+
+    async def query(self, query: KlineQuery) -> np.ndarray:
+        """
+        服务内查询, 返回的数组为缓存中的同一对象, 调用方不应修改
+        """
+        start = time.perf_counter()
+        key = (query, await self._partition_version(query))
+        cached = self.cache.get(key)
+        if cached is not None:
+            _requests.inc(result='hit')
+            _query_seconds.observe(time.perf_counter() - start)
+            return cached
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            _requests.inc(result='coalesced')
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().run_in_executor(self._executor, read_range, query, self.data_dir)
+        self._inflight[key] = future
+        try:
+            arr = await asyncio.shield(future)
+        except Exception:
+            _requests.inc(result='error')
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        arr.flags.writeable = False
+        self.cache.put(key, arr)
+        _requests.inc(result='miss')
+        _query_seconds.observe(time.perf_counter() - start)
+        return arr
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    query = KlineQuery.from_dict(json.loads(line))
+                    arr = await self.query(query)
+                except Exception as e:
+                    header = {'ok': False, 'error': f"{type(e).__name__}: {e}"}
+                    writer.write(json.dumps(header, ensure_ascii=False).encode() + b'\n')
+                else:
+                    header = {'ok': True, 'shape': list(arr.shape), 'fields': list(query.fields)}
+                    writer.write(json.dumps(header).encode() + b'\n')
+                    writer.write(memoryview(arr).cast('B'))
+                await writer.drain()
+        except (ConnectionResetError, BrokenPipeError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> int:
+        """
+        开始监听, 返回实际端口
+        """
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"K线查询服务已启动: {self.host}:{self.port}")
+        return self.port
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def aclose(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        self._executor.shutdown(wait=False)
+
+
+def _request_line(exchange: str, symbol: str, timeframe: str, start: Optional[int], end: Optional[int],
+                  fields: Optional[Sequence[str]]) -> bytes:
+    request = {'exchange': exchange, 'symbol': symbol, 'timeframe': timeframe, 'start': start, 'end': end,
+               'fields': list(fields) if fields else None}
+    return json.dumps(request).encode() + b'\n'
+
+
+def _parse_header(line: bytes) -> Tuple[Tuple[int, int], int]:
+    if not line:
+        raise ConnectionError("K线查询服务已断开")
+    header = json.loads(line)
+    if not header['ok']:
+        raise QueryError(header['error'])
+    shape = tuple(header['shape'])
+    return shape, shape[0] * shape[1] * 8
+
+
+class KlineClient:
+    """
+    同步客户端, 复用一个TCP连接, 非线程安全
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+
+    def _connect(self):
+        if self._sock is None:
+            self._sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            self._file = self._sock.makefile('rb')
+
+    def query(self, exchange: str, symbol: str, timeframe: str, start: Optional[int] = None,
+              end: Optional[int] = None, fields: Optional[Sequence[str]] = None) -> np.ndarray:
+        """
+        查询毫秒时间戳 [start, end) 内的K线, 返回 (N, len(fields)) 数组
+        """
+        self._connect()
+        try:
+            self._sock.sendall(_request_line(exchange, symbol, timeframe, start, end, fields))
+            shape, size = _parse_header(self._file.readline())
+            buf = bytearray(size)
+            view = memoryview(buf)
+            got = 0
+            while got < size:
+                n = self._file.readinto(view[got:])
+                if not n:
+                    raise ConnectionError("K线查询服务已断开")
+                got += n
+        except (OSError, ConnectionError):
+            self.close()
+            raise
+        return np.frombuffer(buf, dtype='<f8').reshape(shape)
+
+    def query_frame(self, exchange: str, symbol: str, timeframe: str, start: Optional[int] = None,
+                    end: Optional[int] = None, fields: Optional[Sequence[str]] = None):
+        """
+        查询结果转为 DataFrame
+        """
+        import pandas as pd
+        fields = list(fields or kline_store.ARRAY_COLUMNS)
+        return pd.DataFrame(self.query(exchange, symbol, timeframe, start, end, fields), columns=fields)
+
+    def close(self):
+        if self._sock is not None:
+            self._file.close()
+            self._sock.close()
+            self._sock = None
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class AsyncKlineClient:
+    """
+    异步客户端, 同一连接上的请求按顺序发送
+    """
+
+    def __init__(self, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def query(self, exchange: str, symbol: str, timeframe: str, start: Optional[int] = None,
+                    end: Optional[int] = None, fields: Optional[Sequence[str]] = None) -> np.ndarray:
+        async with self._lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+            try:
+                self._writer.write(_request_line(exchange, symbol, timeframe, start, end, fields))
+                await self._writer.drain()
+                shape, size = _parse_header(await self._reader.readline())
+                data = await self._reader.readexactly(size)
+            except (OSError, asyncio.IncompleteReadError, ConnectionError):
+                await self.aclose()
+                raise
+        return np.frombuffer(data, dtype='<f8').reshape(shape)
+
+    async def aclose(self):
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+            self._reader = self._writer = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+
+def run_server(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, cache_mb: int = DEFAULT_CACHE_BYTES >> 20,
+               metrics_port: Optional[int] = None):
+    if metrics_port:
+        MetricsUtil.serve(metrics_port)
+    server = KlineQueryServer(host, port, cache_bytes=cache_mb << 20)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="本地K线查询服务")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--cache-mb', type=int, default=DEFAULT_CACHE_BYTES >> 20)
+    parser.add_argument('--metrics-port', type=int, default=None, help="同时开启 /metrics")
+    args = parser.parse_args()
+    run_server(args.host, args.port, args.cache_mb, args.metrics_port)
@@ -0,0 +1,253 @@
+import os
+import re
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional, Dict, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    # pandas 只在读写CSV时按需导入, 读取 .npy 缓存的命令不承担其导入耗时
+    import pandas as pd
+
+# 数据目录固定为项目根目录下的 data/, 不依赖当前工作目录
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+# 列式缓存目录, CSV 解析一次后保存为 .npy, 之后按内存映射读取
+CACHE_DIR = DATA_DIR / '.cache'
+
+KLINE_COLUMNS = ['datetime', 'timestamp', 'open', 'high', 'low', 'close', 'volume']
+# 数组列顺序, timestamp 以 float64 保存(毫秒时间戳在 2^53 以内无精度损失)
+ARRAY_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+COL = {name: i for i, name in enumerate(ARRAY_COLUMNS)}
+
+_FILE_PATTERN = re.compile(r'^(?P<exchange>[^_]+)_(?P<symbol>[^_]+)_(?P<timeframe>[^_]+)_'
+                           r'(?P<start>\d{8})_(?P<end>\d{8})\.(?:csv|cxa)$')
+# 冷数据归档目录(见 dexx.kline_archive), 位于数据目录下
+ARCHIVE_DIRNAME = 'archive'
+ARCHIVE_SUFFIX = '.cxa'
+
+
+_TIMEFRAME_MS = {'s': 1000, 'm': 60000, 'h': 3600000, 'd': 86400000, 'w': 604800000}
+
+
+def timeframe_ms(timeframe: str) -> int:
+    """
+    K线周期转换为毫秒, 例如 "5m" -> 300000
+    """
+    unit = timeframe[-1]
+    if unit not in _TIMEFRAME_MS or not timeframe[:-1].isdigit():
+        raise ValueError(f"不支持的K线周期: {timeframe}")
+    return int(timeframe[:-1]) * _TIMEFRAME_MS[unit]
+
+
+def normalize_symbol(symbol: str) -> str:
+    """
+    交易对转换为文件名格式, 例如 "ETH/USDT" -> "ETH-USDT"
+    """
+    return symbol.replace('/', '-')
+
+
+def kline_filename(exchange: str, symbol: str, timeframe: str, start_date: str, end_date: str) -> str:
+    """
+    生成K线文件名, 格式与 dexx 拉取脚本一致: {exchange}_{symbol}_{timeframe}_{YYYYMMDD}_{YYYYMMDD}.csv
+    """
+    return f"{exchange}_{normalize_symbol(symbol)}_{timeframe}_{start_date.replace('-', '')}_{end_date.replace('-', '')}.csv"
+
+
+def parse_kline_filename(path: Union[str, Path]) -> Optional[Dict[str, str]]:
+    """
+    解析K线文件名, 不符合格式时返回None
+    """
+    m = _FILE_PATTERN.match(Path(path).name)
+    return m.groupdict() if m else None
+
+
+def find_kline_files(exchange: str = None, symbol: str = None, timeframe: str = None,
+                     data_dir: Union[str, Path] = None, include_archive: bool = True) -> List[Path]:
+    """
+    按交易所/交易对/周期查找K线文件, 按结束日期排序; include_archive 时包括 archive/ 下的归档
+    """
+    data_dir = Path(data_dir) if data_dir is not None else DATA_DIR
+    symbol = normalize_symbol(symbol) if symbol else None
+    candidates = list(data_dir.glob('*.csv'))
+    if include_archive:
+        candidates += (data_dir / ARCHIVE_DIRNAME).glob(f'*{ARCHIVE_SUFFIX}')
+    found = []
+    for path in candidates:
+        meta = parse_kline_filename(path)
+        if meta is None:
+            continue
+        if exchange and meta['exchange'] != exchange:
+            continue
+        if symbol and meta['symbol'] != symbol:
+            continue
+        if timeframe and meta['timeframe'] != timeframe:
+            continue
+        found.append(path)
+    return sorted(found, key=lambda p: (parse_kline_filename(p)['end'], p.name))
+
+
+def kline_path(exchange: str, symbol: str, timeframe: str, data_dir: Union[str, Path] = None) -> Path:
+    """
+    获取结束日期最新的K线分区路径(可能是归档 .cxa), 读取完整历史请用 load_kline_array / load_kline_range
+    """
+    files = find_kline_files(exchange, symbol, timeframe, data_dir)
+    if not files:
+        raise FileNotFoundError(f"未找到K线数据: {exchange} {symbol} {timeframe}")
+    return files[-1]
+
+
+def partition_version(exchange: str, symbol: str, timeframe: str, data_dir: Union[str, Path] = None) -> tuple:
+    """
+    分区文件名及修改时间(纳秒), 拉取或归档改写分区后变化, 用于合并结果的缓存键;
+    列举后被删除(例如正在归档)的文件修改时间记为 -1, 同样视为变化
+    """
+    version = []
+    for path in find_kline_files(exchange, symbol, timeframe, data_dir):
+        try:
+            version.append((path.name, path.stat().st_mtime_ns))
+        except FileNotFoundError:
+            version.append((path.name, -1))
+    return tuple(version)
+
+
+def read_kline_csv(path: Union[str, Path]) -> 'pd.DataFrame':
+    """
+    读取K线CSV的数值列, 跳过 datetime 字符串列的解析
+    """
+    import pandas as pd
+    return pd.read_csv(path, usecols=ARRAY_COLUMNS,
+                       dtype={'timestamp': np.int64, 'open': np.float64, 'high': np.float64,
+                              'low': np.float64, 'close': np.float64, 'volume': np.float64},
+                       engine='c')[ARRAY_COLUMNS]
+
+
+def cache_path(path: Union[str, Path], suffix: str = '') -> Path:
+    """
+    CSV 对应的缓存文件路径
+    """
+    path = Path(path)
+    return path.parent / '.cache' / f"{path.stem}{suffix}.npy"
+
+
+def is_cache_fresh(cached: Path, source: Path) -> bool:
+    return cached.exists() and cached.stat().st_mtime >= source.stat().st_mtime
+
+
+def save_npy(path: Path, arr: np.ndarray):
+    # 先写临时文件再替换, 避免并发读取到写了一半的缓存
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npy")
+    np.save(tmp, arr)
+    os.replace(tmp, path)
+
+
+def load_kline_array_from(path: Union[str, Path], mmap: bool = True) -> np.ndarray:
+    """
+    读取K线文件为 N×6 float64 数组(列顺序见 ARRAY_COLUMNS)
+
+    首次读取时把CSV转换为 .npy 缓存, 之后直接内存映射, 多进程/多worker共享同一份页缓存;
+    归档文件(.cxa)直接解压到内存
+    """
+    path = Path(path)
+    if path.suffix == ARCHIVE_SUFFIX:
+        from dexx.kline_archive import open_reader
+        return open_reader(path).read_all()
+    cached = cache_path(path)
+    if not is_cache_fresh(cached, path):
+        arr = read_kline_csv(path).to_numpy(dtype=np.float64)
+        save_npy(cached, arr)
+    return np.load(cached, mmap_mode='r' if mmap else None)
+
+
+def load_kline_array(exchange: str, symbol: str, timeframe: str, mmap: bool = True,
+                     data_dir: Union[str, Path] = None) -> np.ndarray:
+    """
+    按交易所/交易对/周期读取全部历史K线数组, 合并所有 CSV 与归档分区
+
+    只有一个CSV分区时返回其 .npy 内存映射(mmap=True), 否则返回合并后的内存数组
+    """
+    arr = load_kline_range(exchange, symbol, timeframe, data_dir=data_dir)
+    return arr if mmap or not isinstance(arr, np.memmap) else np.array(arr)
+
+
+def load_kline_range(exchange: str, symbol: str, timeframe: str, start: int = None, end: int = None,
+                     data_dir: Union[str, Path] = None) -> np.ndarray:
+    """
+    读取毫秒时间戳 [start, end) 内的K线, 跨越所有分区(CSV 与归档), 重叠的时间戳以结束日期较新的分区为准
+
+    归档分区只解压与时间范围重叠的块
+    """
+    from datetime import datetime, timezone
+
+    def day(ms):
+        return datetime.fromtimestamp(ms / 1000, tz=timezone.utc).strftime('%Y%m%d')
+
+    files = find_kline_files(exchange, symbol, timeframe, data_dir)
+    if not files:
+        raise FileNotFoundError(f"未找到K线数据: {exchange} {symbol} {timeframe}")
+    parts = []
+    for path in files:
+        meta = parse_kline_filename(path)
+        # 文件名中的日期范围与查询不重叠时跳过, 不打开文件
+        if (start is not None and meta['end'] < day(start)) or (end is not None and meta['start'] > day(end)):
+            continue
+        if path.suffix == ARCHIVE_SUFFIX:
+            from dexx.kline_archive import open_reader
+            parts.append(open_reader(path).read_range(start, end))
+        else:
+            parts.append(slice_by_time(load_kline_array_from(path), start, end))
+    if len(parts) == 1:
+        return parts[0]
+    if not parts:
+        return np.empty((0, len(ARRAY_COLUMNS)))
+    arr = np.concatenate(parts)
+    ts = arr[:, COL['timestamp']]
+    # 稳定排序后每个时间戳保留最后一次出现(来自较新的分区)
+    order = np.argsort(ts, kind='stable')
+    ts_sorted = ts[order]
+    keep = np.append(ts_sorted[1:] != ts_sorted[:-1], True)
+    return arr[order[keep]]
+
+
+def load_kline_frame(exchange: str, symbol: str, timeframe: str, start: int = None, end: int = None,
+                     data_dir: Union[str, Path] = None) -> 'pd.DataFrame':
+    """
+    读取K线为DataFrame, 可按毫秒时间戳 [start, end) 截取
+    """
+    import pandas as pd
+    arr = load_kline_range(exchange, symbol, timeframe, start, end, data_dir=data_dir)
+    df = pd.DataFrame(np.array(arr), columns=ARRAY_COLUMNS)
+    df['timestamp'] = df['timestamp'].astype(np.int64)
+    df.insert(0, 'datetime', pd.to_datetime(df['timestamp'], unit='ms', utc=True))
+    return df
+
+
+def slice_by_time(arr: np.ndarray, start: int = None, end: int = None) -> np.ndarray:
+    """
+    按毫秒时间戳 [start, end) 截取(二分查找, 返回视图)
+    """
+    ts = arr[:, COL['timestamp']]
+    lo = int(np.searchsorted(ts, start, side='left')) if start is not None else 0
+    hi = int(np.searchsorted(ts, end, side='left')) if end is not None else len(arr)
+    return arr[lo:hi]
+
+
+def write_kline(data: Union['pd.DataFrame', np.ndarray], exchange: str, symbol: str, timeframe: str,
+                data_dir: Union[str, Path] = None) -> Path:
+    """
+    按项目格式写入K线CSV(datetime,timestamp,open,high,low,close,volume)
+
+    Args:
+        data: 含 ARRAY_COLUMNS 的DataFrame, 或 N×6 数组
+    """
+    import pandas as pd
+    data_dir = Path(data_dir) if data_dir is not None else DATA_DIR
+    df = pd.DataFrame(data, columns=ARRAY_COLUMNS) if isinstance(data, np.ndarray) else data[ARRAY_COLUMNS].copy()
+    df['timestamp'] = df['timestamp'].astype(np.int64)
+    df.insert(0, 'datetime', pd.to_datetime(df['timestamp'], unit='ms').dt.strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3] + 'Z')
+    start = pd.to_datetime(df['timestamp'].iloc[0], unit='ms').strftime('%Y%m%d')
+    end = pd.to_datetime(df['timestamp'].iloc[-1], unit='ms').strftime('%Y%m%d')
+    data_dir.mkdir(parents=True, exist_ok=True)
+    path = data_dir / kline_filename(exchange, symbol, timeframe, start, end)
+    df.to_csv(path, index=False)
+    return path
@@ -0,0 +1,204 @@
+"""
+合成行情数据生成器, 用于存储/指标/回测/机器人的压测
+
+多个相关交易对的对数收益率在 numpy 中按时间块批量生成:
+    - GBM: 常数波动率, 交易对之间按相关系数矩阵相关
+    - 跳跃: 复合泊松跳跃 (jump_intensity > 0)
+    - 波动率聚集: 对数波动率为 AR(1) 过程 (vol_of_vol > 0), 用 FFT 卷积一次性计算
+K线的 high/low 由每根K线内的子步路径取极值, 成交量与收益率绝对值正相关
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from dexx import kline_store
+
+# 单个时间块内 子步数 × 交易对数 × K线数 的上限, 控制内存
+_CHUNK_CELLS = 8_000_000
+
+
+class SyntheticMarket:
+    """
+    多交易对相关行情生成器
+    """
+
+    def __init__(self, symbols: Union[int, Sequence[str]] = 1, corr: Union[float, np.ndarray] = 0.6,
+                 sigma: Union[float, Sequence[float]] = 0.8, mu: float = 0.0, timeframe: str = '5m',
+                 start_price: Union[float, Sequence[float]] = 3000.0,
+                 jump_intensity: float = 0.0, jump_mean: float = 0.0, jump_std: float = 0.02,
+                 vol_of_vol: float = 0.0, vol_persistence: float = 0.995,
+                 substeps: int = 8, tick_size: float = 0.01, seed: Optional[int] = None):
+        """
+        Args:
+            symbols: 交易对数量或名称列表
+            corr: 两两相关系数(标量)或相关系数矩阵
+            sigma: 年化波动率, 可按交易对分别指定
+            mu: 年化漂移
+            timeframe: K线周期
+            start_price: 初始价格
+            jump_intensity: 每年的跳跃次数期望
+            jump_mean: 跳跃对数收益均值
+            jump_std: 跳跃对数收益标准差
+            vol_of_vol: 对数波动率的平稳标准差, 0 为关闭波动率聚集
+            vol_persistence: 对数波动率 AR(1) 系数, 越接近1聚集越持久
+            substeps: 每根K线内部的子步数, 用于生成 high/low
+            tick_size: 价格最小变动单位
+            seed: 随机种子
+        """
+        self.symbols = [f"SYN{i}-USDT" for i in range(symbols)] if isinstance(symbols, int) else list(symbols)
+        n = len(self.symbols)
+        self.timeframe = timeframe
+        self.step_ms = kline_store.timeframe_ms(timeframe)
+        dt = self.step_ms / (365 * 86400000)
+        self.dt = dt
+        self.sigma = np.broadcast_to(np.asarray(sigma, dtype=np.float64), (n,)).copy()
+        self.mu = mu
+        self.start_price = np.broadcast_to(np.asarray(start_price, dtype=np.float64), (n,)).copy()
+        self.jump_intensity = jump_intensity
+        self.jump_mean = jump_mean
+        self.jump_std = jump_std
+        self.vol_of_vol = vol_of_vol
+        self.vol_persistence = vol_persistence
+        self.substeps = max(1, substeps)
+        self.tick_size = tick_size
+        self.rng = np.random.default_rng(seed)
+
+        if np.isscalar(corr):
+            corr = np.full((n, n), float(corr))
+            np.fill_diagonal(corr, 1.0)
+        self.chol = np.linalg.cholesky(np.asarray(corr, dtype=np.float64))
+
+    def _vol_multiplier(self, n_steps: int) -> np.ndarray:
+        """
+        波动率聚集: h_t = phi * h_{t-1} + eta_t, 乘数为 exp(h_t - var/2) 使均值为1
+
+        AR(1) 等价于与核 phi^k 的卷积, 截断到残差小于1e-6后用 FFT 计算
+        """
+        n = len(self.symbols)
+        if self.vol_of_vol <= 0:
+            return np.ones((n_steps, n))
+        phi = self.vol_persistence
+        k = int(min(n_steps, np.ceil(np.log(1e-6) / np.log(phi))))
+        kernel = phi ** np.arange(k)
+        eta = self.rng.standard_normal((n_steps + k, n)) * self.vol_of_vol * np.sqrt(1 - phi ** 2)
+        size = 1 << int(np.ceil(np.log2(n_steps + 2 * k)))
+        h = np.fft.irfft(np.fft.rfft(eta, size, axis=0) * np.fft.rfft(kernel, size)[:, None], size, axis=0)
+        # 丢弃前k步预热
+        h = h[k:k + n_steps]
+        return np.exp(h - self.vol_of_vol ** 2 / 2)
+
+    def _sub_returns(self, n_bars: int, vol_mult: np.ndarray) -> np.ndarray:
+        """
+        生成 (N, n_bars, substeps) 的子步对数收益率, 按交易对连续存放以便沿时间累加
+        """
+        n = len(self.symbols)
+        s = self.substeps
+        sub_dt = self.dt / s
+        ret = (self.chol @ self.rng.standard_normal((n, n_bars * s))).reshape(n, n_bars, s)
+        # 波动率按K线变化, 在子步维度上广播
+        sigma = self.sigma[:, None] * vol_mult.T
+        ret *= (sigma * np.sqrt(sub_dt))[:, :, None]
+        ret += ((self.mu - 0.5 * sigma ** 2) * sub_dt)[:, :, None]
+        if self.jump_intensity > 0:
+            # 跳跃稀疏, 先抽总次数再随机落位, 避免对每个子步做泊松抽样
+            flat = ret.reshape(-1)
+            n_jumps = self.rng.poisson(self.jump_intensity * sub_dt * flat.size)
+            where = self.rng.integers(0, flat.size, n_jumps)
+            np.add.at(flat, where, self.jump_mean + self.jump_std * self.rng.standard_normal(n_jumps))
+        return ret
+
+    def klines(self, n_bars: int, start_ts: int = 1735689600000) -> Dict[str, np.ndarray]:
+        """
+        生成各交易对 n_bars 根K线, 返回 {symbol: N×6 数组}(列同 kline_store.ARRAY_COLUMNS)
+        """
+        n = len(self.symbols)
+        out = {sym: np.empty((n_bars, 6)) for sym in self.symbols}
+        vol_mult = self._vol_multiplier(n_bars)
+        ts = start_ts + self.step_ms * np.arange(n_bars, dtype=np.float64)
+        log_price = np.log(self.start_price)
+        chunk = max(1, _CHUNK_CELLS // (self.substeps * n))
+        for lo in range(0, n_bars, chunk):
+            hi = min(n_bars, lo + chunk)
+            sub = self._sub_returns(hi - lo, vol_mult[lo:hi])
+            # 子步累计对数价格, (N, bars, substeps)
+            path = log_price[:, None] + np.cumsum(sub.reshape(n, -1), axis=1)
+            path = path.reshape(sub.shape)
+            close = path[:, :, -1]
+            open_ = np.concatenate([log_price[:, None], close[:, :-1]], axis=1)
+            high = np.maximum(path.max(axis=2), open_)
+            low = np.minimum(path.min(axis=2), open_)
+            log_price = close[:, -1]
+
+            bar_ret = np.abs(close - open_) / (self.sigma[:, None] * np.sqrt(self.dt))
+            volume = np.round(self.rng.lognormal(3.0, 0.6, size=close.shape) * (1 + bar_ret), 6)
+            prices = [self._round(np.exp(x)) for x in (open_, high, low, close)]
+            for j, sym in enumerate(self.symbols):
+                block = out[sym][lo:hi]
+                block[:, 0] = ts[lo:hi]
+                for c, p in enumerate(prices, start=1):
+                    block[:, c] = p[j]
+                block[:, 5] = volume[j]
+        return out
+
+    def ticks(self, n_ticks: int, symbol_index: int = 0, start_ts: int = 1735689600000,
+              ticks_per_bar: float = 200.0) -> Dict[str, np.ndarray]:
+        """
+        生成单个交易对的逐笔成交: timestamp(毫秒), price, qty, side(1买/-1卖)
+
+        到达间隔服从指数分布, 平均每根K线 ticks_per_bar 笔; 价格为按 tick_size 取整的随机游走
+        """
+        gaps = self.rng.exponential(self.step_ms / ticks_per_bar, n_ticks)
+        ts = start_ts + np.cumsum(gaps)
+        tick_dt = (gaps / (365 * 86400000))
+        sigma = self.sigma[symbol_index]
+        vol_mult = self._vol_multiplier(n_ticks)[:, symbol_index] if self.vol_of_vol > 0 else 1.0
+        ret = sigma * vol_mult * np.sqrt(tick_dt) * self.rng.standard_normal(n_ticks)
+        price = self._round(self.start_price[symbol_index] * np.exp(np.cumsum(ret)))
+        side = np.where(np.diff(price, prepend=price[0]) >= 0, 1, -1)
+        # 价格不变时买卖方向随机
+        flat = np.diff(price, prepend=np.nan) == 0
+        side[flat] = self.rng.choice([-1, 1], size=flat.sum())
+        qty = np.round(self.rng.lognormal(-1.0, 1.2, n_ticks), 6)
+        return {'timestamp': np.floor(ts).astype(np.int64), 'price': price, 'qty': qty, 'side': side.astype(np.int8)}
+
+    def _round(self, price: np.ndarray) -> np.ndarray:
+        return np.maximum(np.round(price / self.tick_size) * self.tick_size, self.tick_size)
+
+    def write(self, n_bars: int, exchange: str = 'synthetic', start_ts: int = 1735689600000,
+              data_dir: Union[str, Path] = None) -> List[Path]:
+        """
+        生成并按项目K线格式写入 data/, 同时写好 .npy 列式缓存
+        """
+        paths = []
+        for sym, arr in self.klines(n_bars, start_ts).items():
+            path = kline_store.write_kline(arr, exchange, sym, self.timeframe, data_dir=data_dir)
+            kline_store.save_npy(kline_store.cache_path(path), arr)
+            paths.append(path)
+        return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="生成合成K线数据")
+    parser.add_argument('--symbols', type=int, default=10)
+    parser.add_argument('--bars', type=int, default=100_000)
+    parser.add_argument('--timeframe', default='5m')
+    parser.add_argument('--corr', type=float, default=0.6)
+    parser.add_argument('--jumps', type=float, default=20.0, help="每年跳跃次数")
+    parser.add_argument('--vol-of-vol', type=float, default=0.5)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--exchange', default='synthetic')
+    parser.add_argument('--dry-run', action='store_true', help="只生成不写文件")
+    args = parser.parse_args()
+
+    market = SyntheticMarket(args.symbols, corr=args.corr, timeframe=args.timeframe, jump_intensity=args.jumps,
+                             vol_of_vol=args.vol_of_vol, seed=args.seed)
+    start = time.perf_counter()
+    if args.dry_run:
+        data = market.klines(args.bars)
+        print(f"生成 {args.symbols} x {args.bars} 根K线, 耗时: {time.perf_counter() - start:.2f}秒")
+    else:
+        paths = market.write(args.bars, exchange=args.exchange)
+        print(f"写入 {len(paths)} 个文件, 耗时: {time.perf_counter() - start:.2f}秒")
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import time
+from pathlib import Path
+from unittest import TestCase, mock
+
+import numpy as np
+
+from dexx import kline_archive, kline_store
+from dexx.synthetic_kline import SyntheticMarket
+
+
+def assert_close(actual, desired):
+    # 归档按小数位数缩放为整数, 读回的是十进制值最近的浮点数, 与原始浮点数可能差1个ulp
+    np.testing.assert_allclose(actual, desired, rtol=0, atol=1e-9)
+
+
+class TestKlineArchive(TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.data_dir = Path(self._tmp.name)
+        self.market = SyntheticMarket(['AAA-USDT'], timeframe='5m', seed=4)
+        self.klines = self.market.klines(20000, start_ts=1704067200000)['AAA-USDT']
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_round_trip_and_block_access(self):
+        path = kline_archive.write_archive(self.data_dir / 'a.cxa', self.klines, kline_store.ARRAY_COLUMNS,
+                                           block_rows=1000)
+        reader = kline_archive.ArchiveReader(path)
+        self.assertEqual(len(reader.blocks), 20)
+        assert_close(reader.read_all(), self.klines)
+
+        start, end = int(self.klines[1500, 0]), int(self.klines[4200, 0])
+        reader = kline_archive.ArchiveReader(path)
+        assert_close(reader.read_range(start, end), self.klines[1500:4200])
+        # 只解压重叠的块
+        self.assertEqual(sorted(reader._cache), [1, 2, 3, 4])
+        assert_close(reader.read_range(start, end, columns=['close']), self.klines[1500:4200, [4]])
+        self.assertLess(path.stat().st_size, self.klines.nbytes / 4)
+
+    def test_archive_cold_is_transparent(self):
+        csv = kline_store.write_kline(self.klines[:10000], 'syn', 'AAA-USDT', '5m', data_dir=self.data_dir)
+        kline_store.load_kline_array_from(csv)
+        recent = kline_store.write_kline(self.klines[9000:], 'syn', 'AAA-USDT', '5m', data_dir=self.data_dir)
+        # 结束日期在阈值之内的分区保持为CSV
+        now_ms = (int(time.time() * 1000) // 300000) * 300000
+        hot_klines = self.market.klines(500, start_ts=now_ms - 499 * 300000)['AAA-USDT']
+        hot = kline_store.write_kline(hot_klines, 'syn', 'AAA-USDT', '5m', data_dir=self.data_dir)
+        csv_size = csv.stat().st_size
+        report = kline_archive.archive_cold(older_than_days=30, data_dir=self.data_dir)
+        self.assertEqual({Path(r['source']).name for r in report}, {csv.name, recent.name})
+        self.assertTrue(hot.exists())
+        self.assertFalse(csv.exists())
+        self.assertFalse(kline_store.cache_path(csv).exists())
+        self.assertLess(report[0]['archive_bytes'] * 5, csv_size)
+
+        self.assertEqual(kline_store.kline_path('syn', 'AAA-USDT', '5m', data_dir=self.data_dir), hot)
+        path = kline_archive.archive_path(recent)
+        # 完整历史跨越归档分区和仍为CSV的分区
+        full = kline_store.load_kline_array('syn', 'AAA-USDT', '5m', data_dir=self.data_dir)
+        assert_close(full, np.concatenate([self.klines, hot_klines]))
+        frame = kline_store.load_kline_frame('syn', 'AAA-USDT', '5m', data_dir=self.data_dir)
+        self.assertEqual(len(frame), len(full))
+        start, end = int(self.klines[8000, 0]), int(self.klines[12000, 0])
+        assert_close(
+            kline_store.load_kline_range('syn', 'AAA-USDT', '5m', start, end, data_dir=self.data_dir),
+            self.klines[8000:12000])
+
+        restored = kline_archive.restore_kline_file(path)
+        assert_close(np.asarray(kline_store.load_kline_array_from(restored)), self.klines[9000:])
+
+    def test_reader_reused_across_loads(self):
+        kline_archive.write_archive(self.data_dir / 'archive' / 'syn_AAA-USDT_5m_20240101_20240310.cxa',
+                                    self.klines, kline_store.ARRAY_COLUMNS, block_rows=1000)
+        start, end = int(self.klines[1500, 0]), int(self.klines[4200, 0])
+        first = kline_store.load_kline_range('syn', 'AAA-USDT', '5m', start, end, data_dir=self.data_dir)
+        path = kline_store.find_kline_files('syn', 'AAA-USDT', '5m', self.data_dir)[0]
+        reader = kline_archive.open_reader(path)
+        self.assertEqual(sorted(reader._cache), [1, 2, 3, 4])
+        with mock.patch.object(kline_archive.zstandard, 'ZstdDecompressor', side_effect=AssertionError):
+            again = kline_store.load_kline_range('syn', 'AAA-USDT', '5m', start, end, data_dir=self.data_dir)
+        np.testing.assert_array_equal(first, again)
+
+        # 改写后按新的修改时间重新打开
+        kline_archive.write_archive(path, self.klines[:3000], kline_store.ARRAY_COLUMNS, block_rows=1000)
+        os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10 ** 9))
+        self.assertIsNot(kline_archive.open_reader(path), reader)
+        self.assertEqual(len(kline_store.load_kline_range('syn', 'AAA-USDT', '5m', data_dir=self.data_dir)), 3000)
+
+    def test_unscalable_columns_stored_raw(self):
+        # 大数值按相对精度看似只有1位小数, 但缩放后误差超过归档精度; 超出 2^53 的列无法缩放
+        data = self.klines[:3000].copy()
+        data[:, 5] = 123456789.123 + np.arange(3000) * 1e-3
+        data[:, 4] *= 1e9
+        data[10, 3] = np.nan
+        path = kline_archive.write_archive(self.data_dir / 'big.cxa', data, kline_store.ARRAY_COLUMNS)
+        reader = kline_archive.ArchiveReader(path)
+        self.assertEqual(reader.decimals[3:], [kline_archive.RAW] * 3)
+        np.testing.assert_array_equal(reader.read_all()[:, 3:], data[:, 3:])
+
+        csv = kline_store.write_kline(data[:, [0, 1, 2, 2, 4, 5]], 'syn', 'BIG-USDT', '5m', data_dir=self.data_dir)
+        report = kline_archive.archive_cold(older_than_days=0, data_dir=self.data_dir)
+        self.assertNotIn('error', report[0])
+        self.assertFalse(csv.exists())
+
+    def test_orderbook_round_trip(self):
+        trades = self.market.ticks(5000)
+        mid = trades['price']
+        levels = np.arange(1, 6) * 0.01
+        rng = np.random.default_rng(0)
+        bids = np.stack([np.round(mid[:, None] - levels, 2), np.round(rng.lognormal(0, 1, (5000, 5)), 4)], axis=2)
+        asks = np.stack([np.round(mid[:, None] + levels, 2), np.round(rng.lognormal(0, 1, (5000, 5)), 4)], axis=2)
+        path = kline_archive.write_orderbook_archive(self.data_dir / 'book.cxa', trades['timestamp'], bids, asks,
+                                                     block_rows=512)
+        book = kline_archive.read_orderbook(path, int(trades['timestamp'][100]), int(trades['timestamp'][3000]))
+        np.testing.assert_array_equal(book['timestamp'], trades['timestamp'][100:3000])
+        np.testing.assert_allclose(book['bids'], bids[100:3000], rtol=0, atol=1e-12)
+        np.testing.assert_allclose(book['asks'], asks[100:3000], rtol=0, atol=1e-12)
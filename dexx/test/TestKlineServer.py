@@ -0,0 +1,119 @@
+import asyncio
+import tempfile
+import threading
+from unittest import TestCase, mock
+
+import numpy as np
+
+from dexx import kline_server, kline_store
+from dexx.kline_server import AsyncKlineClient, KlineClient, KlineQueryServer, LRUCache, QueryError
+from dexx.synthetic_kline import SyntheticMarket
+
+
+class TestKlineServer(TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self._tmp.name
+        SyntheticMarket(['AAA-USDT'], timeframe='5m', seed=1).write(2000, exchange='syn', data_dir=self.data_dir)
+        self.full = np.asarray(kline_store.load_kline_array('syn', 'AAA-USDT', '5m', data_dir=self.data_dir))
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def test_async_query_coalesces_and_caches(self):
+        calls = []
+        read_range = kline_server.read_range
+
+        def counting(query, data_dir):
+            calls.append(query)
+            return read_range(query, data_dir)
+
+        async def run():
+            server = KlineQueryServer(port=0, data_dir=self.data_dir)
+            port = await server.start()
+            start, end = int(self.full[100, 0]), int(self.full[200, 0])
+            clients = [AsyncKlineClient(port=port) for _ in range(5)]
+            with mock.patch.object(kline_server, 'read_range', counting):
+                results = await asyncio.gather(*(c.query('syn', 'AAA-USDT', '5m', start, end, ['timestamp', 'close'])
+                                                 for c in clients))
+                again = await clients[0].query('syn', 'AAA/USDT', '5m', start, end, ['timestamp', 'close'])
+                with self.assertRaises(QueryError):
+                    await clients[0].query('syn', 'AAA-USDT', '5m', fields=['bad'])
+            for c in clients:
+                await c.aclose()
+            await server.aclose()
+            return results, again
+
+        results, again = asyncio.run(run())
+        expected = self.full[100:200][:, [0, 4]]
+        for arr in results + [again]:
+            np.testing.assert_array_equal(arr, expected)
+        self.assertEqual(len(calls), 1)
+
+    def test_rewritten_partition_invalidates_cache(self):
+        extra = SyntheticMarket(['AAA-USDT'], timeframe='5m', seed=2).klines(50, start_ts=int(self.full[-1, 0]) + 300000)
+
+        async def run():
+            server = KlineQueryServer(port=0, data_dir=self.data_dir, version_ttl=0)
+            query = kline_server.KlineQuery('syn', 'AAA-USDT', '5m')
+            before = await server.query(query)
+            kline_store.write_kline(extra['AAA-USDT'], 'syn', 'AAA-USDT', '5m', data_dir=self.data_dir)
+            after = await server.query(query)
+            await server.aclose()
+            return before, after
+
+        before, after = asyncio.run(run())
+        self.assertEqual(len(before), 2000)
+        self.assertEqual(len(after), 2050)
+
+    def test_cache_hit_skips_filesystem_within_ttl(self):
+        async def run():
+            server = KlineQueryServer(port=0, data_dir=self.data_dir, version_ttl=60)
+            query = kline_server.KlineQuery('syn', 'AAA-USDT', '5m')
+            first = await server.query(query)
+            with mock.patch.object(kline_store, 'find_kline_files', side_effect=AssertionError):
+                second = await server.query(query)
+            await server.aclose()
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertIs(first, second)
+
+    def test_partition_removed_while_listing(self):
+        # 列举之后被归档删除的分区视为版本变化, 不抛出异常
+        files = kline_store.find_kline_files('syn', 'AAA-USDT', '5m', self.data_dir)
+        before = kline_store.partition_version('syn', 'AAA-USDT', '5m', self.data_dir)
+        files[0].unlink()
+        with mock.patch.object(kline_store, 'find_kline_files', return_value=files):
+            after = kline_store.partition_version('syn', 'AAA-USDT', '5m', self.data_dir)
+        self.assertEqual(after, ((files[0].name, -1),))
+        self.assertNotEqual(before, after)
+
+    def test_sync_client(self):
+        loop = asyncio.new_event_loop()
+        server = KlineQueryServer(port=0, data_dir=self.data_dir)
+        port = loop.run_until_complete(server.start())
+        thread = threading.Thread(target=loop.run_forever, daemon=True)
+        thread.start()
+        try:
+            with KlineClient(port=port) as client:
+                np.testing.assert_array_equal(client.query('syn', 'AAA-USDT', '5m'), self.full)
+                df = client.query_frame('syn', 'AAA-USDT', '5m', start=int(self.full[-10, 0]))
+                self.assertEqual(len(df), 10)
+        finally:
+            asyncio.run_coroutine_threadsafe(server.aclose(), loop).result()
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
+
+    def test_lru_evicts_by_bytes(self):
+        cache = LRUCache(max_bytes=3 * 800)
+        for i in range(4):
+            cache.put(i, np.zeros(100))
+        self.assertIsNone(cache.get(0))
+        cache.get(1)
+        cache.put(4, np.zeros(100))
+        self.assertIsNotNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.nbytes, 3 * 800)
@@ -0,0 +1,40 @@
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from dexx import kline_store
+from dexx.synthetic_kline import SyntheticMarket
+
+
+class TestSyntheticKline(TestCase):
+
+    def test_klines_shape_and_ohlc(self):
+        market = SyntheticMarket(3, corr=0.8, timeframe='5m', jump_intensity=50, vol_of_vol=0.5, seed=1)
+        data = market.klines(20000)
+        self.assertEqual(list(data), market.symbols)
+        arr = data[market.symbols[0]]
+        self.assertEqual(arr.shape, (20000, 6))
+        self.assertTrue((np.diff(arr[:, 0]) == 300000).all())
+        self.assertTrue((arr[:, 2] >= np.maximum(arr[:, 1], arr[:, 4])).all())
+        self.assertTrue((arr[:, 3] <= np.minimum(arr[:, 1], arr[:, 4])).all())
+        # 上一根收盘即下一根开盘
+        np.testing.assert_array_equal(arr[1:, 1], arr[:-1, 4])
+
+        rets = [np.diff(np.log(v[:, 4])) for v in data.values()]
+        self.assertGreater(np.corrcoef(rets)[0, 1], 0.5)
+
+    def test_seed_is_reproducible(self):
+        a = SyntheticMarket(2, seed=3).klines(1000)
+        b = SyntheticMarket(2, seed=3).klines(1000)
+        for sym in a:
+            np.testing.assert_array_equal(a[sym], b[sym])
+
+    def test_write_round_trip(self):
+        market = SyntheticMarket(['AAA-USDT'], timeframe='1h', seed=2)
+        with tempfile.TemporaryDirectory() as tmp:
+            path, = market.write(500, exchange='syn', data_dir=tmp)
+            arr = np.asarray(kline_store.load_kline_array_from(path))
+            self.assertEqual(arr.shape, (500, 6))
+            info = kline_store.parse_kline_filename(path)
+            self.assertEqual((info['exchange'], info['symbol'], info['timeframe']), ('syn', 'AAA-USDT', '1h'))
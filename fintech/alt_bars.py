@@ -0,0 +1,461 @@
+"""
+非时间K线: 成交笔数/成交量/成交额K线、tick 不平衡K线、Renko 砖块和价格区间K线
+
+输入为逐笔成交 {'timestamp', 'price', 'qty'[, 'side']}(如 SyntheticMarket.ticks 的输出),
+或细粒度时间K线 N×6 数组(以 close 为价格、volume 为成交量). 输出与时间K线相同的 N×6 数组
+(列同 kline_store.ARRAY_COLUMNS, timestamp 为每根K线第一笔事件的时间), 可直接用于回测
+
+每种K线有两条路径, 结果一致:
+    - 批量: 对整段历史向量化计算; 阈值类K线完全向量化, 依赖上一根K线状态的类型按K线循环、K线内部向量化查找
+    - 流式: XxxBarBuilder.update 每个事件 O(1), 用于实时行情
+"""
+import math
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+from dexx import kline_store
+
+Events = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+BarData = Union[Dict[str, np.ndarray], np.ndarray]
+
+MEASURES = ('tick', 'volume', 'dollar')
+
+
+def tick_rule(price: np.ndarray) -> np.ndarray:
+    """
+    按价格变化判断主动买卖方向: 上涨为1, 下跌为-1, 不变时沿用上一笔, 开头未知时为1
+    """
+    sign = np.sign(np.diff(np.asarray(price, dtype=np.float64), prepend=np.nan))
+    sign[np.isnan(sign)] = 0
+    idx = np.where(sign != 0, np.arange(len(sign)), 0)
+    np.maximum.accumulate(idx, out=idx)
+    out = sign[idx]
+    out[out == 0] = 1
+    return out
+
+
+def to_events(data: BarData) -> Events:
+    """
+    统一为 (timestamp, price, qty, side) 四个等长数组
+    """
+    if isinstance(data, dict):
+        ts = np.asarray(data['timestamp'], dtype=np.float64)
+        price = np.asarray(data['price'], dtype=np.float64)
+        qty = np.asarray(data['qty'], dtype=np.float64)
+        side = data.get('side')
+        side = tick_rule(price) if side is None else np.asarray(side, dtype=np.float64)
+        return ts, price, qty, side
+    arr = np.asarray(data, dtype=np.float64)
+    col = kline_store.COL
+    price = arr[:, col['close']]
+    # 时间K线: 收阳为买方主导, 平盘沿用价格变化方向
+    side = np.sign(price - arr[:, col['open']])
+    flat = side == 0
+    side[flat] = tick_rule(price)[flat]
+    return arr[:, col['timestamp']], price, arr[:, col['volume']], side
+
+
+def _measure(kind: str, price: np.ndarray, qty: np.ndarray):
+    if kind == 'tick':
+        return np.ones_like(price)
+    if kind == 'volume':
+        return qty
+    if kind == 'dollar':
+        return price * qty
+    raise ValueError(f"不支持的K线类型: {kind}, 可选: {MEASURES}")
+
+
+def _aggregate(ts: np.ndarray, price: np.ndarray, qty: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """
+    按事件区间 [starts[i], ends[i]] 聚合为 N×6 K线
+    """
+    out = np.empty((len(starts), 6))
+    if not len(starts):
+        return out
+    out[:, 0] = ts[starts]
+    out[:, 1] = price[starts]
+    # reduceat 的区间为 [starts[i], starts[i+1]), 末尾之后的事件不属于任何K线, 截掉
+    stop = ends[-1] + 1
+    out[:, 2] = np.maximum.reduceat(price[:stop], starts)
+    out[:, 3] = np.minimum.reduceat(price[:stop], starts)
+    out[:, 4] = price[ends]
+    out[:, 5] = np.add.reduceat(qty[:stop], starts)
+    return out
+
+
+def threshold_bars(data: BarData, kind: str = 'volume', threshold: float = 1000.0) -> np.ndarray:
+    """
+    成交笔数/成交量/成交额K线: 累计量每跨过 threshold 的整数倍收一根K线, 跨越的那笔计入当前K线,
+    超出部分不清零(累计值直接按 floor(cum / threshold) 分组), 末尾未完成的K线丢弃
+    """
+    ts, price, qty, _ = to_events(data)
+    bar_id = np.floor(np.cumsum(_measure(kind, price, qty)) / threshold)
+    ends = np.flatnonzero(np.diff(bar_id, prepend=0.0) > 0)
+    starts = np.concatenate([[0], ends[:-1] + 1]).astype(np.int64) if len(ends) else ends
+    return _aggregate(ts, price, qty, starts, ends)
+
+
+def _scan(start: int, n: int, first_hit: Callable[[int, int], int], chunk: int = 256) -> int:
+    """
+    从 start 开始按倍增的块查找第一个满足条件的事件, first_hit(start, hi) 返回 [start, hi) 内的绝对下标或 -1
+    """
+    size = max(16, chunk)
+    while True:
+        hi = min(n, start + size)
+        j = first_hit(start, hi)
+        if j >= 0 or hi >= n:
+            return j
+        size *= 2
+
+
+def _first(mask: np.ndarray, offset: int) -> int:
+    j = int(np.argmax(mask))
+    return offset + j if len(mask) and mask[j] else -1
+
+
+def _ewma(old: float, new: float, alpha: float) -> float:
+    return old + alpha * (new - old)
+
+
+class _ImbalanceState:
+    """
+    tick 不平衡K线的阈值: E[T] * max(|E[b]|, min_imbalance), E[T]/E[b] 为按K线更新的指数均值
+    """
+
+    def __init__(self, expected_ticks: float, span: int, min_imbalance: float):
+        self.expected_ticks = float(expected_ticks)
+        self.expected_imbalance = 0.0
+        self.alpha = 2.0 / (span + 1)
+        self.min_imbalance = min_imbalance
+        # 限制 E[T] 的漂移范围, 避免阈值自激增长或塌缩
+        self.bounds = (expected_ticks / 10, expected_ticks * 10)
+
+    @property
+    def threshold(self) -> float:
+        return self.expected_ticks * max(abs(self.expected_imbalance), self.min_imbalance)
+
+    def on_bar(self, ticks: int, theta: float):
+        expected = _ewma(self.expected_ticks, ticks, self.alpha)
+        self.expected_ticks = min(max(expected, self.bounds[0]), self.bounds[1])
+        self.expected_imbalance = _ewma(self.expected_imbalance, theta / ticks, self.alpha)
+
+
+def tick_imbalance_bars(data: BarData, expected_ticks: float = 100.0, span: int = 20,
+                        min_imbalance: float = 0.1) -> np.ndarray:
+    """
+    tick 不平衡K线: 当前K线内买卖方向累计和 |theta| 达到阈值时收线, 阈值随历史K线长度和不平衡度自适应
+
+    Args:
+        expected_ticks: 初始期望K线笔数
+        span: 阈值指数均值的跨度(K线数)
+        min_imbalance: 不平衡度下限, 防止买卖均衡时阈值趋于0
+    """
+    ts, price, qty, side = to_events(data)
+    state = _ImbalanceState(expected_ticks, span, min_imbalance)
+    n = len(price)
+    starts, ends = [], []
+    start = 0
+    while start < n:
+        threshold = state.threshold
+
+        def hit(lo, hi):
+            return _first(np.abs(np.cumsum(side[lo:hi])) >= threshold, lo)
+
+        j = _scan(start, n, hit, int(state.expected_ticks * 2))
+        if j < 0:
+            break
+        starts.append(start)
+        ends.append(j)
+        state.on_bar(j - start + 1, float(side[start:j + 1].sum()))
+        start = j + 1
+    return _aggregate(ts, price, qty, np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64))
+
+
+def _renko_level(price: float, level: int, brick: float) -> int:
+    """
+    价格离开 (level-1, level+1) 个砖块区间时的新砖块层级, 未离开时返回原层级
+    """
+    if price >= (level + 1) * brick:
+        return max(level + 1, math.floor(price / brick))
+    if price <= (level - 1) * brick:
+        return min(level - 1, math.ceil(price / brick))
+    return level
+
+
+def _renko_bricks(ts: float, level: int, new_level: int, brick: float, volume: float) -> List[Tuple]:
+    step = 1 if new_level > level else -1
+    bricks = []
+    for k in range(level, new_level, step):
+        lo, hi = sorted((k * brick, (k + step) * brick))
+        bricks.append((ts, k * brick, hi, lo, (k + step) * brick, volume if not bricks else 0.0))
+    return bricks
+
+
+def renko_bars(data: BarData, brick: float) -> np.ndarray:
+    """
+    Renko 砖块: 价格在 brick 整数倍的网格上每移动一格生成一块, 一次跳过多格时生成多块
+    (成交量计入第一块); 砖块时间为触发的那笔事件的时间
+    """
+    ts, price, qty, _ = to_events(data)
+    n = len(price)
+    if not n:
+        return np.empty((0, 6))
+    level = round(price[0] / brick)
+    bricks = []
+    start = 0
+    vol_cum = np.cumsum(qty)
+    last_vol = 0.0
+    while start < n:
+        up, down = (level + 1) * brick, (level - 1) * brick
+
+        def hit(lo, hi):
+            p = price[lo:hi]
+            return _first((p >= up) | (p <= down), lo)
+
+        j = _scan(start, n, hit)
+        if j < 0:
+            break
+        new_level = _renko_level(price[j], level, brick)
+        bricks += _renko_bricks(ts[j], level, new_level, brick, vol_cum[j] - last_vol)
+        last_vol = vol_cum[j]
+        level = new_level
+        start = j + 1
+    return np.array(bricks, dtype=np.float64).reshape(-1, 6)
+
+
+def range_bars(data: BarData, size: float) -> np.ndarray:
+    """
+    价格区间K线: 当前K线最高价与最低价之差达到 size 时收线
+    """
+    ts, price, qty, _ = to_events(data)
+    n = len(price)
+    starts, ends = [], []
+    start = 0
+    while start < n:
+        def hit(lo, hi):
+            p = price[lo:hi]
+            return _first(np.maximum.accumulate(p) - np.minimum.accumulate(p) >= size, lo)
+
+        j = _scan(start, n, hit, 2 * (ends[-1] - starts[-1] + 1) if ends else 256)
+        if j < 0:
+            break
+        starts.append(start)
+        ends.append(j)
+        start = j + 1
+    return _aggregate(ts, price, qty, np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64))
+
+
+def bar_label(kind: str, param: float) -> str:
+    """
+    K线文件名中的周期字段, 例如 volume1000 / dollar1e06 / renko2.5
+    """
+    return f"{kind}{param:g}".replace('+', '')
+
+
+def write_bars(bars: np.ndarray, exchange: str, symbol: str, kind: str, param: float,
+               data_dir: Union[str, Path] = None) -> Path:
+    """
+    按项目K线格式写入, 周期字段为 bar_label(kind, param), 可用 kline_store.load_kline_array 读回
+
+    同一笔事件触发的多块 Renko 时间相同, 而读取时按时间戳去重, 写入前把重复的时间戳依次后移1毫秒
+    """
+    bars = np.array(bars, dtype=np.float64)
+    if len(bars):
+        ts = bars[:, kline_store.COL['timestamp']]
+        offset = np.arange(len(ts), dtype=np.float64)
+        # 严格递增: ts[i] = max(ts[i], ts[i-1] + 1)
+        ts[:] = np.maximum.accumulate(ts - offset) + offset
+    path = kline_store.write_kline(bars, exchange, symbol, bar_label(kind, param), data_dir=data_dir)
+    kline_store.save_npy(kline_store.cache_path(path), bars)
+    return path
+
+
+def build_bars(data: BarData, kind: str, param: float, **kwargs) -> np.ndarray:
+    """
+    按类型批量构建: tick/volume/dollar 的 param 为阈值, imbalance 为初始期望笔数, renko 为砖块大小, range 为区间大小
+    """
+    if kind in MEASURES:
+        return threshold_bars(data, kind, param)
+    if kind == 'imbalance':
+        return tick_imbalance_bars(data, param, **kwargs)
+    if kind == 'renko':
+        return renko_bars(data, param)
+    if kind == 'range':
+        return range_bars(data, param)
+    raise ValueError(f"不支持的K线类型: {kind}")
+
+
+class BarBuilder(ABC):
+    """
+    流式K线构建器基类, update 每个事件 O(1), 完成的K线追加到 bars 并回调 on_bar
+    """
+    kind = ''
+
+    def __init__(self, on_bar: Optional[Callable[[Tuple], None]] = None):
+        self.on_bar = on_bar
+        self.bars: List[Tuple] = []
+        self._bar: Optional[list] = None
+
+    def _add(self, ts: float, price: float, qty: float):
+        bar = self._bar
+        if bar is None:
+            self._bar = [ts, price, price, price, price, qty]
+            return
+        if price > bar[2]:
+            bar[2] = price
+        elif price < bar[3]:
+            bar[3] = price
+        bar[4] = price
+        bar[5] += qty
+
+    def _emit(self, bar: Tuple):
+        self.bars.append(bar)
+        if self.on_bar is not None:
+            self.on_bar(bar)
+
+    def _close(self):
+        self._emit(tuple(self._bar))
+        self._bar = None
+
+    @abstractmethod
+    def update(self, ts: float, price: float, qty: float = 0.0, side: float = 0.0) -> int:
+        """
+        处理一个事件, 返回本次完成的K线数
+        """
+
+    def to_array(self) -> np.ndarray:
+        return np.array(self.bars, dtype=np.float64).reshape(-1, 6)
+
+    def write(self, exchange: str, symbol: str, param: float, data_dir: Union[str, Path] = None) -> Path:
+        return write_bars(self.to_array(), exchange, symbol, self.kind, param, data_dir)
+
+
+class ThresholdBarBuilder(BarBuilder):
+    """
+    流式成交笔数/成交量/成交额K线, 与 threshold_bars 结果一致
+    """
+
+    def __init__(self, kind: str = 'volume', threshold: float = 1000.0, on_bar=None):
+        super().__init__(on_bar)
+        if kind not in MEASURES:
+            raise ValueError(f"不支持的K线类型: {kind}, 可选: {MEASURES}")
+        self.kind = kind
+        self.threshold = threshold
+        self._cum = 0.0
+        self._bar_id = 0.0
+
+    def update(self, ts, price, qty=0.0, side=0.0) -> int:
+        self._add(ts, price, qty)
+        self._cum += 1.0 if self.kind == 'tick' else qty if self.kind == 'volume' else price * qty
+        bar_id = math.floor(self._cum / self.threshold)
+        if bar_id > self._bar_id:
+            self._bar_id = bar_id
+            self._close()
+            return 1
+        return 0
+
+
+class TickImbalanceBarBuilder(BarBuilder):
+    """
+    流式 tick 不平衡K线, 与 tick_imbalance_bars 结果一致; side 为0时按 tick rule 判断方向
+    """
+    kind = 'imbalance'
+
+    def __init__(self, expected_ticks: float = 100.0, span: int = 20, min_imbalance: float = 0.1, on_bar=None):
+        super().__init__(on_bar)
+        self._state = _ImbalanceState(expected_ticks, span, min_imbalance)
+        self._threshold = self._state.threshold
+        self._theta = 0.0
+        self._ticks = 0
+        self._last_price: Optional[float] = None
+        self._last_side = 1.0
+
+    def update(self, ts, price, qty=0.0, side=0.0) -> int:
+        if not side:
+            if self._last_price is not None and price != self._last_price:
+                self._last_side = 1.0 if price > self._last_price else -1.0
+            side = self._last_side
+        self._last_price = price
+        self._add(ts, price, qty)
+        self._theta += side
+        self._ticks += 1
+        if abs(self._theta) >= self._threshold:
+            self._state.on_bar(self._ticks, self._theta)
+            self._threshold = self._state.threshold
+            self._theta = 0.0
+            self._ticks = 0
+            self._close()
+            return 1
+        return 0
+
+
+class RenkoBarBuilder(BarBuilder):
+    """
+    流式 Renko 砖块, 与 renko_bars 结果一致; 每个事件 O(1), 一次跳过多格时为 O(生成的砖块数)
+    """
+    kind = 'renko'
+
+    def __init__(self, brick: float, on_bar=None):
+        super().__init__(on_bar)
+        self.brick = brick
+        self._level: Optional[int] = None
+        self._volume = 0.0
+
+    def update(self, ts, price, qty=0.0, side=0.0) -> int:
+        if self._level is None:
+            self._level = round(price / self.brick)
+        self._volume += qty
+        new_level = _renko_level(price, self._level, self.brick)
+        if new_level == self._level:
+            return 0
+        bricks = _renko_bricks(ts, self._level, new_level, self.brick, self._volume)
+        for bar in bricks:
+            self._emit(bar)
+        self._level = new_level
+        self._volume = 0.0
+        return len(bricks)
+
+
+class RangeBarBuilder(BarBuilder):
+    """
+    流式价格区间K线, 与 range_bars 结果一致
+    """
+    kind = 'range'
+
+    def __init__(self, size: float, on_bar=None):
+        super().__init__(on_bar)
+        self.size = size
+
+    def update(self, ts, price, qty=0.0, side=0.0) -> int:
+        self._add(ts, price, qty)
+        if self._bar[2] - self._bar[3] >= self.size:
+            self._close()
+            return 1
+        return 0
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    from dexx.synthetic_kline import SyntheticMarket
+
+    parser = argparse.ArgumentParser(description="由逐笔成交构建非时间K线")
+    parser.add_argument('--ticks', type=int, default=10_000_000)
+    parser.add_argument('--write', action='store_true', help="写入 data/")
+    args = parser.parse_args()
+
+    market = SyntheticMarket(['SYN-USDT'], timeframe='1m', start_price=3000, seed=1)
+    trades = market.ticks(args.ticks, ticks_per_bar=20)
+    days = (trades['timestamp'][-1] - trades['timestamp'][0]) / 86400000
+    print(f"{args.ticks} 笔成交, 约 {days:.0f} 天")
+    for kind, param in (('tick', 1000), ('volume', 500), ('dollar', 1.5e6), ('imbalance', 100),
+                        ('renko', 5.0), ('range', 10.0)):
+        start = time.perf_counter()
+        bars = build_bars(trades, kind, param)
+        print(f"{bar_label(kind, param):<16} {len(bars):>8} 根, 耗时 {time.perf_counter() - start:.2f}秒")
+        if args.write and len(bars):
+            print(f"  -> {write_bars(bars, 'synthetic', 'SYN-USDT', kind, param)}")
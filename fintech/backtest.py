@@ -0,0 +1,65 @@
+"""
+向量化单品种回测, 用 numpy 一次性计算持仓、手续费和净值, 不逐K线循环
+"""
+from typing import Dict
+
+import numpy as np
+
+from fintech import indicators
+
+# 年化系数使用的每年K线数
+BARS_PER_YEAR = {'1m': 525600, '5m': 105120, '15m': 35040, '1h': 8760, '4h': 2190, '1d': 365}
+
+
+def run_positions(close: np.ndarray, position: np.ndarray, fee_rate: float = 0.001,
+                  timeframe: str = '5m') -> Dict[str, object]:
+    """
+    按目标仓位序列回测
+
+    Args:
+        close: 收盘价
+        position: 每根K线收盘后的目标仓位(-1~1), 下一根K线生效
+        fee_rate: 单边手续费率, 按换手计费
+        timeframe: K线周期, 用于年化
+
+    Returns:
+        dict: equity 净值曲线, returns 每根K线收益率, 以及汇总指标
+    """
+    close = np.asarray(close, dtype=np.float64)
+    position = np.nan_to_num(np.asarray(position, dtype=np.float64))
+    bar_ret = np.zeros(len(close))
+    bar_ret[1:] = close[1:] / close[:-1] - 1
+    held = np.zeros(len(close))
+    held[1:] = position[:-1]
+    turnover = np.abs(np.diff(position, prepend=0.0))
+    returns = held * bar_ret - turnover * fee_rate
+    equity = np.cumprod(1 + returns)
+    return {'equity': equity, 'returns': returns, **summarize(returns, equity, turnover, timeframe)}
+
+
+def summarize(returns: np.ndarray, equity: np.ndarray, turnover: np.ndarray, timeframe: str = '5m') -> Dict[str, float]:
+    """
+    汇总指标: 总收益、年化波动、夏普、最大回撤、换手
+    """
+    periods = BARS_PER_YEAR.get(timeframe, 365)
+    std = returns.std()
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    return {
+        'total_return': float(equity[-1] - 1) if len(equity) else 0.0,
+        'volatility': float(std * np.sqrt(periods)),
+        'sharpe': float(returns.mean() / std * np.sqrt(periods)) if std > 0 else 0.0,
+        'max_drawdown': float(drawdown.min()) if len(drawdown) else 0.0,
+        'turnover': float(turnover.sum()),
+    }
+
+
+def sma_cross_backtest(close: np.ndarray, fast: int = 10, slow: int = 30, fee_rate: float = 0.001,
+                       allow_short: bool = False, timeframe: str = '5m') -> Dict[str, object]:
+    """
+    均线交叉策略(与 sample/backtrader_test_01.py 的 SmaCross 相同): 快线在慢线上方做多
+    """
+    fast_ma = indicators.sma(close, fast)
+    slow_ma = indicators.sma(close, slow)
+    position = np.where(fast_ma > slow_ma, 1.0, -1.0 if allow_short else 0.0)
+    position[np.isnan(slow_ma)] = 0.0
+    return run_positions(close, position, fee_rate, timeframe)
@@ -0,0 +1,107 @@
+"""
+向量化技术指标, 输入为一维 numpy 数组, 输出与输入等长, 前期不足窗口的位置为 NaN
+
+与 talib 同名指标口径一致: EMA/RSI/ATR 以前 period 个值的简单平均作为初值(RSI/ATR 使用 Wilder 平滑),
+预热期为 NaN; 不依赖 talib 以便在训练/回测 worker 中使用
+"""
+import numpy as np
+
+
+def sma(x: np.ndarray, period: int) -> np.ndarray:
+    """
+    简单移动平均, 基于累加和 O(N)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(len(x), np.nan)
+    if len(x) < period:
+        return out
+    csum = np.cumsum(np.insert(x, 0, 0.0))
+    out[period - 1:] = (csum[period:] - csum[:-period]) / period
+    return out
+
+
+def _seeded_ewm(x: np.ndarray, period: int, alpha: float, start: int) -> np.ndarray:
+    """
+    y[start] = mean(x[start - period + 1:start + 1]), 之后 y[t] = (1 - alpha) * y[t-1] + alpha * x[t]; 之前为 NaN
+    """
+    import pandas as pd
+    out = np.full(len(x), np.nan)
+    if len(x) <= start:
+        return out
+    seeded = x[start:].copy()
+    seeded[0] = x[start - period + 1:start + 1].mean()
+    out[start:] = pd.Series(seeded).ewm(alpha=alpha, adjust=False).mean().to_numpy()
+    return out
+
+
+def ema(x: np.ndarray, period: int) -> np.ndarray:
+    """
+    指数移动平均, alpha = 2 / (period + 1), 以前 period 个值的 SMA 为初值(同 talib)
+    """
+    return _seeded_ewm(np.asarray(x, dtype=np.float64), period, 2.0 / (period + 1), period - 1)
+
+
+def rolling_std(x: np.ndarray, period: int) -> np.ndarray:
+    """
+    滚动标准差(总体标准差, 与talib STDDEV一致)
+    """
+    import pandas as pd
+    return pd.Series(np.asarray(x, dtype=np.float64)).rolling(period).std(ddof=0).to_numpy(copy=True)
+
+
+def rsi(close: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    相对强弱指数, 0~100, 前 period 根为 NaN
+    """
+    close = np.asarray(close, dtype=np.float64)
+    diff = np.diff(close, prepend=np.nan)
+    # 第一个差分在下标1, 初值为下标 1..period 的平均
+    gain = _seeded_ewm(np.where(diff > 0, diff, 0.0), period, 1.0 / period, period)
+    loss = _seeded_ewm(np.where(diff < 0, -diff, 0.0), period, 1.0 / period, period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        value = 100.0 - 100.0 / (1.0 + gain / loss)
+    return np.where(loss == 0, 100.0, value)
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    prev_close = np.roll(close, 1)
+    prev_close[0] = close[0]
+    return np.maximum(high, prev_close) - np.minimum(low, prev_close)
+
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int = 14) -> np.ndarray:
+    """
+    平均真实波幅, 前 period 根为 NaN
+    """
+    tr = true_range(np.asarray(high, dtype=np.float64), np.asarray(low, dtype=np.float64),
+                    np.asarray(close, dtype=np.float64))
+    # 第一根K线没有前收盘价, 同 talib 从下标1开始
+    return _seeded_ewm(tr, period, 1.0 / period, period)
+
+
+def bollinger(close: np.ndarray, period: int = 20, k: float = 2.0):
+    """
+    布林带, 返回 (上轨, 中轨, 下轨)
+    """
+    mid = sma(close, period)
+    std = rolling_std(close, period)
+    return mid + k * std, mid, mid - k * std
+
+
+def log_return(close: np.ndarray, periods: int = 1) -> np.ndarray:
+    """
+    对数收益率 log(c_t / c_{t-periods})
+    """
+    close = np.asarray(close, dtype=np.float64)
+    out = np.full(len(close), np.nan)
+    out[periods:] = np.log(close[periods:] / close[:-periods])
+    return out
+
+
+def zscore(x: np.ndarray, period: int) -> np.ndarray:
+    """
+    滚动 z-score
+    """
+    x = np.asarray(x, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (x - sma(x, period)) / rolling_std(x, period)
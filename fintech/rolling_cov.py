@@ -0,0 +1,296 @@
+"""
+多交易对协方差/相关系数矩阵, 用于对冲比例和配对选择
+
+    - EwmaCovariance: 指数加权, 每根K线一次秩1更新
+    - RollingCovariance: 固定窗口, 环形缓冲区 + 累计和/叉积和, 新增与移出各一次秩1更新, 定期全量重算消除累积误差
+两者都提供 from_history 由历史收益率一次性向量化计算出当前状态, 之后按K线增量更新;
+300×300 矩阵每次更新为 O(N^2), 约百微秒级
+"""
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+def log_returns(close: np.ndarray) -> np.ndarray:
+    """
+    (T, N) 收盘价 -> (T-1, N) 对数收益率, 缺失/未上市记为0
+    """
+    close = np.asarray(close, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ret = np.log(close[1:] / close[:-1])
+    return np.nan_to_num(ret, nan=0.0, posinf=0.0, neginf=0.0)
+
+
+def correlation(cov: np.ndarray) -> np.ndarray:
+    """
+    协方差矩阵转相关系数矩阵, 方差为0的交易对相关系数记为0
+    """
+    std = np.sqrt(np.clip(np.diag(cov), 0, None))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inv = np.where(std > 0, 1.0 / std, 0.0)
+    corr = cov * inv[:, None] * inv[None, :]
+    np.fill_diagonal(corr, np.where(std > 0, 1.0, 0.0))
+    return corr
+
+
+def hedge_ratio(cov: np.ndarray, target: int, hedge: int) -> float:
+    """
+    最小方差对冲比例: 持有1单位 target 收益时应做空 hedge 的数量, beta = cov(t, h) / var(h)
+    """
+    var = cov[hedge, hedge]
+    return float(cov[target, hedge] / var) if var > 0 else 0.0
+
+
+def top_pairs(corr: np.ndarray, k: int = 10, symbols: Optional[Sequence[str]] = None,
+              absolute: bool = False) -> List[Tuple]:
+    """
+    相关性最高的 k 个交易对(上三角), 用于配对选择
+
+    Returns:
+        [(i, j, corr), ...] 或传入 symbols 时 [(symbol_i, symbol_j, corr), ...], 按相关系数降序
+    """
+    rows, cols = np.triu_indices(len(corr), k=1)
+    values = corr[rows, cols]
+    score = np.abs(values) if absolute else values
+    k = min(k, len(values))
+    best = np.argpartition(-score, k - 1)[:k] if k else np.array([], dtype=np.int64)
+    best = best[np.argsort(-score[best])]
+    names = symbols if symbols is not None else range(len(corr))
+    names = list(names)
+    return [(names[rows[b]], names[cols[b]], float(values[b])) for b in best]
+
+
+def rolling_cov_at(returns: np.ndarray, window: int, ends: Optional[Sequence[int]] = None) -> np.ndarray:
+    """
+    一次性计算多个时点的滚动窗口样本协方差
+
+    Args:
+        returns: (T, N) 收益率
+        window: 窗口长度
+        ends: 窗口最后一行的行号, 默认只计算最后一行
+
+    Returns:
+        (len(ends), N, N)
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    ends = np.asarray([len(returns) - 1] if ends is None else ends, dtype=np.int64)
+    if (ends < window - 1).any():
+        raise ValueError(f"窗口 {window} 超出历史长度")
+    # (K, window, N), 去均值后批量矩阵乘
+    x = returns[ends[:, None] - np.arange(window - 1, -1, -1)[None, :]]
+    x -= x.mean(axis=1, keepdims=True)
+    return np.matmul(x.transpose(0, 2, 1), x) / (window - 1)
+
+
+class EwmaCovariance:
+    """
+    指数加权协方差, alpha = 1 - 0.5 ** (1 / halflife)
+
+        d = x - mean;  mean += alpha * d;  cov = (1 - alpha) * (cov + alpha * d d^T)
+
+    与对全部历史按权重 alpha(1-alpha)^k 计算的加权(有偏)协方差完全一致, from_history 即按此一次性计算
+    """
+
+    def __init__(self, n: int, halflife: float = 288.0, min_periods: int = 2, symbols: Optional[Sequence[str]] = None):
+        self.n = n
+        self.alpha = 1 - 0.5 ** (1 / halflife)
+        self.min_periods = min_periods
+        self.symbols = list(symbols) if symbols is not None else None
+        self.mean = np.zeros(n)
+        self._cov = np.zeros((n, n))
+        self.count = 0
+        self._last_close: Optional[np.ndarray] = None
+
+    def update(self, x: np.ndarray):
+        """
+        加入一根K线的收益率向量 (N,), 缺失值记为0
+        """
+        x = np.nan_to_num(np.asarray(x, dtype=np.float64))
+        if self.count == 0:
+            self.mean[:] = x
+        else:
+            d = x - self.mean
+            self.mean += self.alpha * d
+            # cov = (1-a) * cov + (1-a) * a * d d^T, 原地计算避免分配新矩阵
+            self._cov *= 1 - self.alpha
+            self._cov += np.outer(d * ((1 - self.alpha) * self.alpha), d)
+        self.count += 1
+
+    def update_close(self, close: np.ndarray):
+        """
+        按最新收盘价更新, 内部保存上一根收盘价计算对数收益率
+        """
+        close = np.asarray(close, dtype=np.float64)
+        if self._last_close is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.update(np.log(close / self._last_close))
+        self._last_close = np.where(np.isnan(close), self._last_close, close) if self._last_close is not None \
+            else close.copy()
+
+    @property
+    def cov(self) -> Optional[np.ndarray]:
+        return self._cov if self.count >= self.min_periods else None
+
+    @property
+    def corr(self) -> Optional[np.ndarray]:
+        return correlation(self._cov) if self.count >= self.min_periods else None
+
+    @classmethod
+    def from_history(cls, returns: np.ndarray, halflife: float = 288.0, **kwargs) -> 'EwmaCovariance':
+        """
+        由 (T, N) 历史收益率一次性计算当前状态, 结果与逐行 update 相同
+        """
+        returns = np.nan_to_num(np.asarray(returns, dtype=np.float64))
+        t, n = returns.shape
+        est = cls(n, halflife, **kwargs)
+        if t == 0:
+            return est
+        a = est.alpha
+        # 第一行权重 (1-a)^(T-1), 其余第 k 行为 a(1-a)^(T-1-k), 总和为1
+        weights = a * (1 - a) ** np.arange(t - 1, -1, -1, dtype=np.float64)
+        weights[0] = (1 - a) ** (t - 1)
+        est.mean = weights @ returns
+        centered = returns - est.mean
+        est._cov = centered.T @ (centered * weights[:, None])
+        est.count = t
+        return est
+
+
+class RollingCovariance:
+    """
+    固定窗口样本协方差
+
+    维护窗口内收益率的环形缓冲区、列和 S 与叉积和 P, 每根K线:
+        S += x - old;  P += x x^T - old old^T;  cov = (P - S S^T / w) / (w - 1)
+    每 recompute_every 次更新用缓冲区全量重算一次, 消除浮点累积误差
+    """
+
+    def __init__(self, n: int, window: int = 288, recompute_every: Optional[int] = None,
+                 symbols: Optional[Sequence[str]] = None):
+        if window < 2:
+            raise ValueError("窗口长度至少为2")
+        self.n = n
+        self.window = window
+        self.recompute_every = recompute_every or window
+        self.symbols = list(symbols) if symbols is not None else None
+        self._buf = np.zeros((window, n))
+        self._pos = 0
+        self.count = 0
+        self._sum = np.zeros(n)
+        self._cross = np.zeros((n, n))
+        self._since_recompute = 0
+        self._pair = np.empty((2, n))
+        self._last_close: Optional[np.ndarray] = None
+
+    def _recompute(self):
+        rows = self._buf if self.count >= self.window else self._buf[:self.count]
+        self._sum = rows.sum(axis=0)
+        self._cross = rows.T @ rows
+        self._since_recompute = 0
+
+    def update(self, x: np.ndarray):
+        """
+        加入一根K线的收益率向量 (N,), 缺失值记为0
+        """
+        x = np.nan_to_num(np.asarray(x, dtype=np.float64))
+        old = self._buf[self._pos]
+        if self.count >= self.window:
+            # x x^T - old old^T 合并为一次 (N,2)@(2,N) 的矩阵乘
+            self._pair[0] = x
+            self._pair[1] = -old
+            self._sum += x - old
+            self._cross += self._pair.T @ np.stack([x, old])
+        else:
+            self._sum += x
+            self._cross += np.outer(x, x)
+        self._buf[self._pos] = x
+        self._pos = (self._pos + 1) % self.window
+        self.count += 1
+        self._since_recompute += 1
+        if self._since_recompute >= self.recompute_every:
+            self._recompute()
+
+    def update_close(self, close: np.ndarray):
+        """
+        按最新收盘价更新, 内部保存上一根收盘价计算对数收益率
+        """
+        close = np.asarray(close, dtype=np.float64)
+        if self._last_close is not None:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                self.update(np.log(close / self._last_close))
+        self._last_close = np.where(np.isnan(close), self._last_close, close) if self._last_close is not None \
+            else close.copy()
+
+    @property
+    def cov(self) -> Optional[np.ndarray]:
+        w = min(self.count, self.window)
+        if w < 2:
+            return None
+        return (self._cross - np.outer(self._sum, self._sum / w)) / (w - 1)
+
+    @property
+    def corr(self) -> Optional[np.ndarray]:
+        cov = self.cov
+        return correlation(cov) if cov is not None else None
+
+    @classmethod
+    def from_history(cls, returns: np.ndarray, window: int = 288, **kwargs) -> 'RollingCovariance':
+        """
+        用 (T, N) 历史收益率的最后 window 行初始化
+        """
+        returns = np.nan_to_num(np.asarray(returns, dtype=np.float64))
+        est = cls(returns.shape[1], window, **kwargs)
+        tail = returns[-window:]
+        est._buf[:len(tail)] = tail
+        est.count = len(tail)
+        est._pos = len(tail) % window
+        est._recompute()
+        return est
+
+
+def from_store(symbols: Sequence[str], timeframe: str = '5m', exchange: str = 'okx', method: str = 'ewma',
+               start: Optional[int] = None, end: Optional[int] = None, data_dir=None, **kwargs):
+    """
+    从K线存储读取多个交易对, 对齐后一次性计算历史状态, 返回可继续 update_close 的估计器
+
+    Args:
+        method: 'ewma' 或 'rolling', 其余参数传给对应类的 from_history(halflife / window 等)
+    """
+    from fintech.portfolio_backtest import load_panel
+
+    panel = load_panel(symbols, timeframe, exchange, start, end, data_dir=data_dir)
+    close = panel.field('close')
+    returns = log_returns(close)
+    if method == 'ewma':
+        est = EwmaCovariance.from_history(returns, symbols=panel.symbols, **kwargs)
+    elif method == 'rolling':
+        est = RollingCovariance.from_history(returns, symbols=panel.symbols, **kwargs)
+    else:
+        raise ValueError(f"不支持的方法: {method}")
+    est._last_close = close[-1].copy()
+    return est
+
+
+if __name__ == '__main__':
+    import time
+
+    from dexx.synthetic_kline import SyntheticMarket
+
+    market = SyntheticMarket(300, corr=0.4, timeframe='5m', seed=1)
+    data = market.klines(3000)
+    close = np.column_stack([data[s][:, 4] for s in market.symbols])
+    returns = log_returns(close)
+
+    start = time.perf_counter()
+    ewma = EwmaCovariance.from_history(returns[:-200], halflife=288)
+    rolling = RollingCovariance.from_history(returns[:-200], window=288)
+    print(f"历史初始化耗时: {(time.perf_counter() - start) * 1000:.1f}ms")
+
+    for name, est in (('ewma', ewma), ('rolling', rolling)):
+        start = time.perf_counter()
+        for x in returns[-200:]:
+            est.update(x)
+            corr = est.corr
+        per_bar = (time.perf_counter() - start) / 200 * 1000
+        print(f"{name}: 每根K线更新+相关系数 {per_bar:.3f}ms, 平均相关系数 {corr[np.triu_indices(300, 1)].mean():.3f}")
+    print(top_pairs(rolling.corr, 3, market.symbols))
@@ -0,0 +1,78 @@
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from dexx import kline_store
+from dexx.synthetic_kline import SyntheticMarket
+from fintech.alt_bars import (RangeBarBuilder, RenkoBarBuilder, ThresholdBarBuilder, TickImbalanceBarBuilder,
+                              build_bars, range_bars, renko_bars, threshold_bars, tick_rule, write_bars)
+
+
+class TestAltBars(TestCase):
+
+    def setUp(self):
+        self.trades = SyntheticMarket(['AAA-USDT'], timeframe='1m', start_price=100, seed=5).ticks(50000)
+
+    def _stream(self, builder):
+        t = self.trades
+        for ts, p, q, s in zip(t['timestamp'].tolist(), t['price'].tolist(), t['qty'].tolist(), t['side'].tolist()):
+            builder.update(ts, p, q, s)
+        return builder.to_array()
+
+    def test_streaming_matches_batch(self):
+        cases = [
+            (ThresholdBarBuilder('tick', 500), threshold_bars(self.trades, 'tick', 500)),
+            (ThresholdBarBuilder('volume', 200), threshold_bars(self.trades, 'volume', 200)),
+            (ThresholdBarBuilder('dollar', 20000), threshold_bars(self.trades, 'dollar', 20000)),
+            (TickImbalanceBarBuilder(50), build_bars(self.trades, 'imbalance', 50)),
+            (RenkoBarBuilder(0.2), renko_bars(self.trades, 0.2)),
+            (RangeBarBuilder(0.5), range_bars(self.trades, 0.5)),
+        ]
+        for builder, batch in cases:
+            stream = self._stream(builder)
+            self.assertGreater(len(batch), 5, builder.kind)
+            self.assertEqual(stream.shape, batch.shape, builder.kind)
+            np.testing.assert_allclose(stream, batch, rtol=1e-9, err_msg=builder.kind)
+
+    def test_bar_invariants(self):
+        bars = threshold_bars(self.trades, 'tick', 1000)
+        self.assertEqual(len(bars), 50)
+        np.testing.assert_allclose(bars[:, 5].sum(), self.trades['qty'][:50000].sum())
+        self.assertTrue((bars[:, 2] >= np.maximum(bars[:, 1], bars[:, 4])).all())
+        self.assertTrue((bars[:, 3] <= np.minimum(bars[:, 1], bars[:, 4])).all())
+
+        bricks = renko_bars(self.trades, 0.2)
+        np.testing.assert_allclose(np.abs(bricks[:, 4] - bricks[:, 1]), 0.2)
+        np.testing.assert_allclose(bricks[1:, 1], bricks[:-1, 4])
+
+        ranges = range_bars(self.trades, 0.5)
+        self.assertTrue((ranges[:, 2] - ranges[:, 3] >= 0.5).all())
+
+    def test_from_klines_and_write(self):
+        klines = SyntheticMarket(['BBB-USDT'], timeframe='1m', seed=2).klines(5000)['BBB-USDT']
+        bars = build_bars(klines, 'volume', 1000)
+        self.assertGreater(len(bars), 10)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write_bars(bars, 'syn', 'BBB-USDT', 'volume', 1000, data_dir=tmp)
+            loaded = kline_store.load_kline_array('syn', 'BBB-USDT', 'volume1000', data_dir=tmp)
+            np.testing.assert_allclose(loaded, bars)
+            self.assertTrue(path.name.startswith('syn_BBB-USDT_volume1000_'))
+
+    def test_renko_bricks_survive_write(self):
+        # 一笔成交跳过多格时生成多块同一时间的砖块
+        trades = {'timestamp': np.arange(1, 6) * 1000.0, 'price': np.array([100, 100.3, 99.9, 100.02, 99.5]),
+                  'qty': np.ones(5)}
+        bricks = renko_bars(trades, 0.05)
+        self.assertLess(len(np.unique(bricks[:, 0])), len(bricks))
+        with tempfile.TemporaryDirectory() as tmp:
+            write_bars(bricks, 'syn', 'AAA-USDT', 'renko', 0.05, data_dir=tmp)
+            # 再写一个无关分区, 触发跨分区按时间戳合并去重
+            write_bars(bricks[-1:] + [2 * 86400000, 0, 0, 0, 0, 0], 'syn', 'AAA-USDT', 'renko', 0.05, data_dir=tmp)
+            loaded = kline_store.load_kline_array('syn', 'AAA-USDT', 'renko0.05', data_dir=tmp)
+        self.assertEqual(len(loaded), len(bricks) + 1)
+        np.testing.assert_allclose(loaded[:-1, 1:], bricks[:, 1:])
+        self.assertTrue((np.diff(loaded[:, 0]) > 0).all())
+
+    def test_tick_rule(self):
+        np.testing.assert_array_equal(tick_rule(np.array([1, 1, 2, 2, 1, 1, 3])), [1, 1, 1, 1, -1, -1, 1])
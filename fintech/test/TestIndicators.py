@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+import numpy as np
+
+from fintech import indicators
+
+
+def talib_ema(x, period):
+    # talib 算法的逐点实现: SMA 初值后按 alpha = 2 / (period + 1) 递推
+    out = np.full(len(x), np.nan)
+    out[period - 1] = x[:period].mean()
+    a = 2.0 / (period + 1)
+    for t in range(period, len(x)):
+        out[t] = out[t - 1] + a * (x[t] - out[t - 1])
+    return out
+
+
+def talib_wilder(values, period):
+    # values[1:] 有效, 初值为 values[1..period] 的平均
+    out = np.full(len(values), np.nan)
+    out[period] = values[1:period + 1].mean()
+    for t in range(period + 1, len(values)):
+        out[t] = (out[t - 1] * (period - 1) + values[t]) / period
+    return out
+
+
+class TestIndicators(TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 300)))
+        self.high = self.close * (1 + rng.uniform(0, 0.01, 300))
+        self.low = self.close * (1 - rng.uniform(0, 0.01, 300))
+
+    def test_ema_seeded_with_sma(self):
+        np.testing.assert_allclose(indicators.ema(self.close, 20), talib_ema(self.close, 20), rtol=1e-12)
+
+    def test_rsi_matches_talib_from_first_value(self):
+        diff = np.diff(self.close, prepend=np.nan)
+        gain = talib_wilder(np.where(diff > 0, diff, 0.0), 14)
+        loss = talib_wilder(np.where(diff < 0, -diff, 0.0), 14)
+        expected = 100 - 100 / (1 + gain / loss)
+        out = indicators.rsi(self.close, 14)
+        self.assertTrue(np.isnan(out[:14]).all())
+        np.testing.assert_allclose(out, expected, rtol=1e-10)
+
+    def test_atr_matches_talib(self):
+        tr = indicators.true_range(self.high, self.low, self.close)
+        out = indicators.atr(self.high, self.low, self.close, 14)
+        self.assertTrue(np.isnan(out[:14]).all())
+        np.testing.assert_allclose(out, talib_wilder(tr, 14), rtol=1e-10)
@@ -0,0 +1,63 @@
+from unittest import TestCase
+
+import numpy as np
+
+from fintech.portfolio_backtest import build_panel, run_portfolio, momentum_weights, risk_contributions
+
+
+def _loop_backtest(close, weights, rows, fee_rate):
+    # 逐K线按持仓数量模拟, 作为矩阵实现的对照
+    n_t, n_s = close.shape
+    units, cash = np.zeros(n_s), 1.0
+    out = []
+    for t in range(n_t):
+        value = cash + units @ close[t]
+        if t in rows:
+            fee = np.abs(weights[t] * value - units * close[t]).sum() * fee_rate
+            value -= fee
+            target = weights[t] * value
+            units = target / close[t]
+            cash = value - target.sum()
+        out.append(value)
+    return np.array(out)
+
+
+class TestPortfolioBacktest(TestCase):
+
+    def test_panel_fills_missing_bars(self):
+        a = np.array([[0, 1, 2, 0.5, 1.5, 10], [1, 1.5, 2, 1, 1.8, 10], [2, 1.8, 2, 1.7, 1.9, 10]], dtype=float)
+        b = np.array([[1, 5, 6, 4, 5.5, 3]], dtype=float)
+        panel = build_panel({'A': a[[0, 2]], 'B': b})
+        np.testing.assert_array_equal(panel.timestamps, [0, 1, 2])
+        close = panel.field('close')
+        self.assertTrue(np.isnan(close[0, 1]))
+        self.assertEqual(close[1, 0], 1.5)
+        self.assertEqual(panel.field('volume')[1, 0], 0.0)
+        self.assertEqual(close[2, 1], 5.5)
+        np.testing.assert_array_equal(panel.valid, [[True, False], [False, True], [True, False]])
+
+    def test_matches_loop(self):
+        rng = np.random.default_rng(0)
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (200, 4)), axis=0))
+        weights = rng.uniform(-0.5, 0.5, (200, 4))
+        result = run_portfolio(close, weights, rebalance=7, fee_rate=0.001)
+        rows = set(range(0, 200, 7))
+        values = _loop_backtest(close, weights, rows, 0.001)
+        np.testing.assert_allclose(result['equity'], values, rtol=1e-10)
+        self.assertAlmostEqual(result['symbol_pnl'].sum() - result['fees'], result['equity'][-1] - 1, places=10)
+
+    def test_unlisted_symbol_gets_no_weight(self):
+        close = np.ones((50, 2)) * [10.0, 20.0]
+        close[:20, 1] = np.nan
+        close[20:, 1] = np.linspace(20, 40, 30)
+        result = run_portfolio(close, np.full((50, 2), 0.5), rebalance=10, fee_rate=0.0)
+        self.assertTrue((result['weights'][:20, 1] == 0).all())
+        self.assertGreater(result['equity'][-1], 1.0)
+
+    def test_momentum_and_risk(self):
+        close = np.exp(np.cumsum(np.random.default_rng(1).normal(0, 0.01, (300, 6)), axis=0))
+        weights = momentum_weights(close, lookback=20, top=2, long_short=True)
+        np.testing.assert_allclose(weights[20:].sum(axis=1), 0.0, atol=1e-12)
+        np.testing.assert_allclose(np.abs(weights[20:]).sum(axis=1), 1.0)
+        vol, contrib = risk_contributions(close, weights[-1])
+        self.assertAlmostEqual(contrib.sum(), vol)
@@ -0,0 +1,57 @@
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from dexx.synthetic_kline import SyntheticMarket
+from fintech.rolling_cov import (EwmaCovariance, RollingCovariance, correlation, from_store, hedge_ratio,
+                                 log_returns, rolling_cov_at, top_pairs)
+
+
+class TestRollingCov(TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.returns = rng.normal(0, 0.01, (500, 6)) @ np.linalg.cholesky(np.full((6, 6), 0.5) + 0.5 * np.eye(6)).T
+
+    def test_ewma_incremental_matches_history(self):
+        inc = EwmaCovariance(6, halflife=50)
+        for x in self.returns:
+            inc.update(x)
+        batch = EwmaCovariance.from_history(self.returns, halflife=50)
+        np.testing.assert_allclose(inc.cov, batch.cov, rtol=1e-9, atol=1e-15)
+        np.testing.assert_allclose(inc.mean, batch.mean, atol=1e-15)
+
+    def test_rolling_matches_numpy(self):
+        est = RollingCovariance.from_history(self.returns[:100], window=60, recompute_every=1000)
+        for x in self.returns[100:]:
+            est.update(x)
+        np.testing.assert_allclose(est.cov, np.cov(self.returns[-60:], rowvar=False), rtol=1e-8, atol=1e-14)
+        np.testing.assert_allclose(rolling_cov_at(self.returns, 60)[0], est.cov, rtol=1e-8, atol=1e-14)
+        np.testing.assert_allclose(est.corr, np.corrcoef(self.returns[-60:], rowvar=False), atol=1e-10)
+
+    def test_rolling_warmup(self):
+        est = RollingCovariance(6, window=100)
+        self.assertIsNone(est.cov)
+        for x in self.returns[:30]:
+            est.update(x)
+        np.testing.assert_allclose(est.cov, np.cov(self.returns[:30], rowvar=False), atol=1e-14)
+
+    def test_pairs_and_hedge(self):
+        cov = np.cov(self.returns, rowvar=False)
+        corr = correlation(cov)
+        pairs = top_pairs(corr, 3, symbols=list('ABCDEF'))
+        self.assertEqual(len(pairs), 3)
+        self.assertGreaterEqual(pairs[0][2], pairs[-1][2])
+        self.assertAlmostEqual(hedge_ratio(cov, 0, 1), cov[0, 1] / cov[1, 1])
+
+    def test_from_store(self):
+        market = SyntheticMarket(['AAA-USDT', 'BBB-USDT'], corr=0.9, timeframe='1h', seed=3)
+        with tempfile.TemporaryDirectory() as tmp:
+            paths = market.write(600, exchange='syn', data_dir=tmp)
+            est = from_store(market.symbols, '1h', 'syn', method='rolling', window=200, data_dir=tmp)
+            close = np.column_stack([np.loadtxt(p, delimiter=',', skiprows=1, usecols=5) for p in paths])
+        np.testing.assert_allclose(est.cov, np.cov(log_returns(close)[-200:], rowvar=False), rtol=1e-8)
+        self.assertGreater(est.corr[0, 1], 0.8)
+        est.update_close(close[-1] * [1.01, 1.02])
+        self.assertEqual(est.count, 201)
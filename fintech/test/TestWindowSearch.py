@@ -0,0 +1,90 @@
+from unittest import TestCase
+
+import numpy as np
+
+from dexx.synthetic_kline import SyntheticMarket
+from fintech.window_search import WindowIndex, distance_profile, embed_windows, log_prices, znorm
+
+
+class TestWindowSearch(TestCase):
+
+    def setUp(self):
+        market = SyntheticMarket(4, corr=0.2, timeframe='5m', vol_of_vol=0.5, seed=3)
+        self.data = market.klines(5000)
+        self.symbols = market.symbols
+        self.index = WindowIndex(window=32, dims=8)
+        for sym in self.symbols:
+            self.index.add(sym, self.data[sym][:, 0], self.data[sym][:, 4])
+
+    def test_distance_profile_matches_naive(self):
+        x = np.log(self.data[self.symbols[0]][:, 4])
+        q = x[100:132]
+        dist = distance_profile(q, x)
+        windows = np.lib.stride_tricks.sliding_window_view(x, 32)
+        naive = np.linalg.norm(znorm(windows) - znorm(q), axis=1)
+        np.testing.assert_allclose(dist, naive, atol=1e-6)
+        self.assertAlmostEqual(dist[100], 0.0, places=5)
+
+    def test_embedding_matches_naive_paa(self):
+        x = np.log(self.data[self.symbols[1]][:, 4])
+        emb = embed_windows(x, np.array([0, 17, 400]), 32, 8)
+        for row, s in zip(emb, (0, 17, 400)):
+            paa = znorm(x[s:s + 32]).reshape(8, 4).mean(axis=1)
+            np.testing.assert_allclose(row, paa / np.linalg.norm(paa), atol=1e-6)
+
+    def test_finds_planted_window(self):
+        # 另一序列中按比例缩放的同一段走势应被精确找到, 距离接近0
+        close = self.data[self.symbols[2]][:, 4]
+        query = close[2000:2032] * 1.7
+        best = self.index.query(query, k=3)[0]
+        self.assertEqual((best.key, best.end), (self.symbols[2], 2031))
+        self.assertLess(best.distance, 1e-6)
+
+    def test_excludes_self_and_overlaps(self):
+        matches = self.index.query(key=self.symbols[0], end=3000, k=10)
+        self.assertEqual(len(matches), 10)
+        for m in matches:
+            if m.key == self.symbols[0]:
+                self.assertGreaterEqual(abs(m.end - 3000), 32)
+        self.assertTrue(all(a.distance <= b.distance for a, b in zip(matches, matches[1:])))
+
+    def test_recall_against_exact(self):
+        close = self.data[self.symbols[3]][:, 4]
+        query = close[-32:] * np.exp(np.random.default_rng(0).normal(0, 0.002, 32))
+        approx = self.index.query(query, k=5, candidates=500)
+        exact = self.index.exact_query(query, k=5)
+        self.assertAlmostEqual(approx[0].distance, exact[0].distance, places=6)
+        self.assertGreaterEqual(len({(m.key, m.end) for m in approx} & {(m.key, m.end) for m in exact}), 4)
+
+    def test_incremental_update_matches_bulk(self):
+        arr = self.data[self.symbols[0]]
+        inc = WindowIndex(window=32, dims=8)
+        inc.add('x', arr[:1000, 0], arr[:1000, 4])
+        for row in arr[1000:1100]:
+            inc.update('x', row[0], row[4])
+        bulk = WindowIndex(window=32, dims=8)
+        bulk.add('x', arr[:1100, 0], arr[:1100, 4])
+        self.assertEqual(len(inc), 1100 - 31)
+        np.testing.assert_allclose(inc._emb.view, bulk._emb.view, atol=1e-5)
+        ret = inc.forward_returns(inc.query(key='x', end=500, k=3), 10)
+        self.assertEqual(ret.shape, (3,))
+
+    def test_gap_in_close_does_not_poison_series(self):
+        arr = self.data[self.symbols[0]]
+        close = arr[:2000, 4].copy()
+        close[[0, 500, 501, 900]] = [np.nan, 0.0, np.nan, -1.0]
+        index = WindowIndex(window=32, dims=8)
+        index.add('x', arr[:2000, 0], close)
+        index.update('x', arr[2000, 0], np.nan)
+        x = index.series('x')
+        self.assertTrue(np.isfinite(x).all())
+        self.assertEqual((x[0], x[501], x[2000]), (np.log(close[1]), np.log(close[499]), x[1999]))
+        self.assertTrue(np.isfinite(index._emb.view).all())
+        # 缺口之后的窗口仍可被检索到
+        best = index.query(close[1500:1532], k=1)[0]
+        self.assertEqual(best.end, 1531)
+        np.testing.assert_array_equal(log_prices([0.0, np.nan], last=1.5), [1.5, 1.5])
+        with self.assertRaises(ValueError):
+            log_prices([np.nan, 0.0])
+        with self.assertRaises(ValueError):
+            distance_profile(x[:32], np.append(x, np.nan))
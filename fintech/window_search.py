@@ -0,0 +1,352 @@
+"""
+历史K线窗口相似度检索, 用于类比(analog)信号: 找出各交易对历史上与当前走势最相似的窗口
+
+窗口取对数收盘价并做 z 标准化, 两个窗口的欧氏距离与相关系数一一对应: d^2 = 2m(1 - corr)
+    - 索引: 每个窗口压缩为 dims 维分段均值(PAA)并归一化为单位向量, 由累加和一次性向量化计算, 不展开窗口
+    - 查询: 嵌入矩阵与查询向量做一次矩阵向量乘取候选, 再用完整窗口精确重排, 同一交易对重叠的结果只保留最好的
+    - 精确检索: distance_profile 用 FFT (MASS) 计算单个序列所有窗口的距离, 用于小规模精确查询或验证
+新K线到达时 update 只计算以新K线结尾的窗口, 不重建索引
+非正或非有限的收盘价(缺失数据)沿用上一个有效价格, 否则对数为 NaN/-inf, 经累加和污染之后的所有窗口
+单核上 200 万个窗口(dims=16, 约 128MB)的 top-10 查询约 20ms, 主要耗时为一次矩阵向量乘
+"""
+from typing import Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from dexx import kline_store
+
+
+class Match(NamedTuple):
+    key: Hashable
+    # 窗口最后一根K线在该序列中的下标与时间戳
+    end: int
+    timestamp: int
+    distance: float
+    corr: float
+
+
+def log_prices(close: np.ndarray, last: Optional[float] = None) -> np.ndarray:
+    """
+    收盘价取对数, 非正或非有限值沿用上一个有效价格的对数; 开头没有有效价格时沿用 last(之前的对数价格),
+    仍没有则用之后第一个有效价格. 全部无效且没有 last 时抛出 ValueError
+    """
+    close = np.asarray(close, dtype=np.float64)
+    valid = np.isfinite(close) & (close > 0)
+    out = np.full(len(close), np.nan)
+    out[valid] = np.log(close[valid])
+    if valid.all():
+        return out
+    if not valid.any():
+        if last is None:
+            raise ValueError("收盘价中没有有效价格(需为正的有限值)")
+        return np.full(len(close), last)
+    idx = np.where(valid, np.arange(len(close)), -1)
+    np.maximum.accumulate(idx, out=idx)
+    head = last if last is not None else out[valid][0]
+    return np.where(idx >= 0, out[np.maximum(idx, 0)], head)
+
+
+def _window_stats(cs: np.ndarray, cs2: np.ndarray, starts: np.ndarray, m: int) -> Tuple[np.ndarray, np.ndarray]:
+    mean = (cs[starts + m] - cs[starts]) / m
+    var = (cs2[starts + m] - cs2[starts]) / m - mean ** 2
+    return mean, np.sqrt(np.clip(var, 0, None))
+
+
+def embed_windows(x: np.ndarray, starts: np.ndarray, window: int, dims: int) -> np.ndarray:
+    """
+    计算 x[s:s+window] 的 z 标准化 PAA 嵌入(单位向量), 返回 (len(starts), dims) float32; 平坦窗口为零向量
+    """
+    x = np.asarray(x, dtype=np.float64)
+    seg = window // dims
+    # 减去首值降低累加和的数值误差
+    x = x - x[0] if len(x) else x
+    cs = np.concatenate([[0.0], np.cumsum(x)])
+    cs2 = np.concatenate([[0.0], np.cumsum(x * x)])
+    starts = np.asarray(starts, dtype=np.int64)
+    mean, std = _window_stats(cs, cs2, starts, window)
+    edges = starts[:, None] + np.arange(dims + 1)[None, :] * seg
+    paa = (cs[edges[:, 1:]] - cs[edges[:, :-1]]) / seg
+    paa -= mean[:, None]
+    norm = np.linalg.norm(paa, axis=1)
+    ok = (std > 1e-12) & (norm > 0)
+    out = np.zeros_like(paa)
+    out[ok] = paa[ok] / norm[ok, None]
+    return out.astype(np.float32)
+
+
+def znorm(w: np.ndarray) -> np.ndarray:
+    """
+    按最后一维 z 标准化, 平坦窗口为0
+    """
+    w = np.asarray(w, dtype=np.float64)
+    std = w.std(axis=-1, keepdims=True)
+    return np.where(std > 1e-12, (w - w.mean(axis=-1, keepdims=True)) / np.where(std > 1e-12, std, 1.0), 0.0)
+
+
+def distance_profile(query: np.ndarray, x: np.ndarray) -> np.ndarray:
+    """
+    MASS: 查询与 x 所有长度为 m 的窗口之间的 z 标准化欧氏距离, 基于 FFT 的滑动点积, O(n log n)
+
+    Returns:
+        (n - m + 1,) 距离, 下标为窗口起点
+    """
+    q = znorm(query)
+    x = np.asarray(x, dtype=np.float64)
+    if not (np.isfinite(q).all() and np.isfinite(x).all()):
+        # 单个 NaN 会经 FFT 与累加和扩散到所有距离, 先用 log_prices 处理缺失价格
+        raise ValueError("distance_profile 的输入含 NaN/inf")
+    m, n = len(q), len(x)
+    size = 1 << int(np.ceil(np.log2(n + m)))
+    dot = np.fft.irfft(np.fft.rfft(x, size) * np.fft.rfft(q[::-1], size), size)[m - 1:n]
+    xc = x - x[0]
+    cs = np.concatenate([[0.0], np.cumsum(xc)])
+    cs2 = np.concatenate([[0.0], np.cumsum(xc * xc)])
+    _, std = _window_stats(cs, cs2, np.arange(n - m + 1), m)
+    # q 均值为0, 滑动点积不受 x 平移影响
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.where(std > 1e-12, dot / (m * std), 0.0)
+    return np.sqrt(np.clip(2 * m * (1 - corr), 0, None))
+
+
+def _top(scores: np.ndarray, k: int, stride: int = 64) -> np.ndarray:
+    """
+    分数最高的 k 个下标(无序)
+
+    先用等间隔抽样估计阈值, 只对超过阈值的少量元素做 argpartition, 比全量 argpartition 快数倍;
+    超过阈值的数量不足 k 时退回全量
+    """
+    n = len(scores)
+    if n > 16 * stride * k:
+        sample = scores[::stride]
+        r = 2 * k // stride + 2
+        threshold = np.partition(sample, len(sample) - r)[len(sample) - r]
+        idx = np.flatnonzero(scores >= threshold)
+        if len(idx) >= k:
+            return idx[np.argpartition(-scores[idx], k - 1)[:k]]
+    return np.argpartition(-scores, k - 1)[:k]
+
+
+class _Growable:
+    """
+    沿最后一维按容量倍增的数组, 追加均摊 O(1)
+    """
+
+    def __init__(self, shape_head: Tuple[int, ...] = (), dtype=np.float64, capacity: int = 1024):
+        self._data = np.empty(shape_head + (capacity,), dtype=dtype)
+        self.size = 0
+
+    def extend(self, values: np.ndarray):
+        n = self.size + np.shape(values)[-1]
+        if n > self._data.shape[-1]:
+            grown = np.empty(self._data.shape[:-1] + (max(n, 2 * self._data.shape[-1]),), dtype=self._data.dtype)
+            grown[..., :self.size] = self._data[..., :self.size]
+            self._data = grown
+        self._data[..., self.size:n] = values
+        self.size = n
+
+    @property
+    def view(self) -> np.ndarray:
+        return self._data[..., :self.size]
+
+
+class WindowIndex:
+    """
+    多序列K线窗口相似度索引
+    """
+
+    def __init__(self, window: int = 64, dims: int = 16, exclusion: Optional[int] = None):
+        """
+        Args:
+            window: 窗口长度(K线根数), 需为 dims 的整数倍
+            dims: 嵌入维度
+            exclusion: 同一序列中两个结果窗口结尾的最小间隔, 默认 window // 2, 避免返回大量重叠的近似结果
+        """
+        if window % dims:
+            raise ValueError(f"窗口长度 {window} 不是嵌入维度 {dims} 的整数倍")
+        self.window = window
+        self.dims = dims
+        self.exclusion = exclusion if exclusion is not None else window // 2
+        self.keys: List[Hashable] = []
+        self._key_id: Dict[Hashable, int] = {}
+        self._series: List[_Growable] = []
+        self._ts: List[_Growable] = []
+        # 每个序列的窗口按结尾顺序追加, _rows[sid][e - window + 1] 为以 e 结尾的窗口在嵌入矩阵中的行号
+        self._rows: List[_Growable] = []
+        # 嵌入按列存储 (dims, N), 查询时 q @ emb 顺序读内存, 比行存储的矩阵向量乘快
+        self._emb = _Growable((dims,), np.float32, 1 << 16)
+        self._src = _Growable((), np.int32, 1 << 16)
+        self._end = _Growable((), np.int64, 1 << 16)
+
+    def __len__(self):
+        return self._emb.size
+
+    def add(self, key: Hashable, timestamps: np.ndarray, close: np.ndarray) -> int:
+        """
+        追加一个序列的新K线(新序列或已有序列的后续K线), 返回新增的窗口数
+        """
+        close = np.asarray(close, dtype=np.float64)
+        if key not in self._key_id:
+            self._key_id[key] = len(self.keys)
+            self.keys.append(key)
+            self._series.append(_Growable())
+            self._ts.append(_Growable((), np.int64))
+            self._rows.append(_Growable((), np.int64))
+        sid = self._key_id[key]
+        series = self._series[sid]
+        old = series.size
+        series.extend(log_prices(close, series.view[-1] if old else None))
+        self._ts[sid].extend(np.asarray(timestamps, dtype=np.int64))
+        starts = np.arange(max(0, old - self.window + 1), series.size - self.window + 1)
+        if not len(starts):
+            return 0
+        x = series.view
+        # 只取覆盖新窗口的一段计算, 累加和不依赖更早的数据
+        lo = starts[0]
+        self._rows[sid].extend(np.arange(self._emb.size, self._emb.size + len(starts)))
+        self._emb.extend(embed_windows(x[lo:], starts - lo, self.window, self.dims).T)
+        self._src.extend(np.full(len(starts), sid, dtype=np.int32))
+        self._end.extend(starts + self.window - 1)
+        return len(starts)
+
+    def update(self, key: Hashable, timestamp: int, close: float) -> int:
+        """
+        新K线到达时增量更新
+        """
+        return self.add(key, [timestamp], [close])
+
+    def series(self, key: Hashable) -> np.ndarray:
+        """
+        序列的对数收盘价
+        """
+        return self._series[self._key_id[key]].view
+
+    def _windows(self, sid: int, ends: np.ndarray) -> np.ndarray:
+        x = self._series[sid].view
+        return np.lib.stride_tricks.sliding_window_view(x, self.window)[ends - self.window + 1]
+
+    def query(self, close: Optional[np.ndarray] = None, k: int = 10, key: Hashable = None, end: Optional[int] = None,
+              candidates: Optional[int] = None) -> List[Match]:
+        """
+        查找最相似的 k 个历史窗口
+
+        Args:
+            close: 查询窗口的收盘价(长度为 window); 不传时使用索引中 key 序列以 end 结尾的窗口(默认最新)
+            k: 返回数量
+            key/end: 查询自身序列时排除与查询重叠的窗口
+            candidates: 按嵌入相似度取的候选数, 默认 k 的 20 倍, 越大召回越高
+        """
+        if close is None:
+            x = self.series(key)
+            end = len(x) - 1 if end is None else end
+            q_log = x[end - self.window + 1:end + 1]
+        else:
+            q_log = log_prices(np.asarray(close, dtype=np.float64)[-self.window:])
+        if len(q_log) != self.window:
+            raise ValueError(f"查询窗口长度应为 {self.window}")
+        q = embed_windows(q_log, np.array([0]), self.window, self.dims)[0]
+        emb, src, ends = self._emb.view, self._src.view, self._end.view
+        scores = q @ emb
+        if key is not None and key in self._key_id and end is not None:
+            rows = self._rows[self._key_id[key]].view
+            lo = max(0, end - 2 * self.window + 2)
+            scores[rows[lo:max(lo, end + 1)]] = -np.inf
+
+        n_cand = min(len(scores), candidates or k * 20)
+        if n_cand <= 0:
+            return []
+        cand = _top(scores, n_cand)
+        cand = cand[np.isfinite(scores[cand])]
+
+        # 用完整窗口精确计算距离后排序
+        qz = znorm(q_log)
+        corr = np.empty(len(cand))
+        for sid in np.unique(src[cand]):
+            mask = src[cand] == sid
+            corr[mask] = znorm(self._windows(sid, ends[cand[mask]])) @ qz / self.window
+        order = np.argsort(-corr)
+
+        matches: List[Match] = []
+        taken: Dict[int, List[int]] = {}
+        for i in order:
+            sid, e = int(src[cand[i]]), int(ends[cand[i]])
+            if any(abs(e - t) < self.exclusion for t in taken.get(sid, ())):
+                continue
+            taken.setdefault(sid, []).append(e)
+            c = float(min(1.0, corr[i]))
+            matches.append(Match(self.keys[sid], e, int(self._ts[sid].view[e]),
+                                 float(np.sqrt(max(0.0, 2 * self.window * (1 - c)))), c))
+            if len(matches) >= k:
+                break
+        return matches
+
+    def exact_query(self, close: np.ndarray, k: int = 10) -> List[Match]:
+        """
+        对所有序列做 MASS 精确检索(不使用嵌入), 用于验证或小规模数据
+        """
+        q_log = log_prices(np.asarray(close, dtype=np.float64)[-self.window:])
+        found = []
+        for sid, key in enumerate(self.keys):
+            x = self._series[sid].view
+            if len(x) < self.window:
+                continue
+            dist = distance_profile(q_log, x)
+            top = np.argsort(dist)[:k * self.window]
+            found += [(float(dist[s]), sid, int(s + self.window - 1)) for s in top]
+        found.sort()
+        matches: List[Match] = []
+        taken: Dict[int, List[int]] = {}
+        for dist, sid, e in found:
+            if any(abs(e - t) < self.exclusion for t in taken.get(sid, ())):
+                continue
+            taken.setdefault(sid, []).append(e)
+            matches.append(Match(self.keys[sid], e, int(self._ts[sid].view[e]), dist,
+                                 1 - dist ** 2 / (2 * self.window)))
+            if len(matches) >= k:
+                break
+        return matches
+
+    def forward_returns(self, matches: Sequence[Match], horizon: int) -> np.ndarray:
+        """
+        各匹配窗口之后 horizon 根K线的对数收益率, 数据不足时为 NaN, 可作为类比信号
+        """
+        out = np.full(len(matches), np.nan)
+        for i, match in enumerate(matches):
+            x = self.series(match.key)
+            if match.end + horizon < len(x):
+                out[i] = x[match.end + horizon] - x[match.end]
+        return out
+
+    @classmethod
+    def from_store(cls, sources: Sequence[Tuple[str, str, str]], window: int = 64, dims: int = 16,
+                   data_dir=None, **kwargs) -> 'WindowIndex':
+        """
+        由K线存储构建索引, 序列键为 (exchange, symbol, timeframe)
+        """
+        index = cls(window, dims, **kwargs)
+        for source in sources:
+            arr = kline_store.load_kline_range(*source, data_dir=data_dir)
+            index.add(tuple(source), arr[:, kline_store.COL['timestamp']], arr[:, kline_store.COL['close']])
+        return index
+
+
+if __name__ == '__main__':
+    import time
+
+    from dexx.synthetic_kline import SyntheticMarket
+
+    market = SyntheticMarket(20, corr=0.3, timeframe='5m', vol_of_vol=0.5, jump_intensity=20, seed=1)
+    data = market.klines(100_000)
+    start = time.perf_counter()
+    index = WindowIndex(window=64, dims=16)
+    for sym, arr in data.items():
+        index.add(sym, arr[:, 0], arr[:, 4])
+    print(f"索引 {len(index)} 个窗口, 构建耗时 {time.perf_counter() - start:.2f}秒")
+
+    query_key = market.symbols[0]
+    start = time.perf_counter()
+    for _ in range(20):
+        matches = index.query(key=query_key, k=10)
+    print(f"top-10 查询耗时 {(time.perf_counter() - start) / 20 * 1000:.1f}ms")
+    for m in matches[:3]:
+        print(m)
+    print("后续12根K线收益率均值:", np.nanmean(index.forward_returns(matches, 12)))
@@ -31,11 +31,22 @@ def make_kline_v1():
     kline.render("kline_chart.html")
 
 
-def make_kline_v2():
+def make_kline_v2(csv_path: str = None, output: str = "eth-usdt_kline_chart.html", df: pd.DataFrame = None):
     '''
     数据处理
+
+    csv_path 默认为项目 data/ 下的 okx ETH-USDT 5m 全部历史(含归档分区), 也可以传入单个K线文件(CSV 或 .cxa),
+    或直接传入含 timestamp/open/high/low/close 的 df
     '''
-    df = pd.read_csv('../../data/okx_ETH-USDT_5m_20250101_20250629.csv')
+    if df is None:
+        from dexx import kline_store
+        if csv_path is None:
+            df = kline_store.load_kline_frame('okx', 'ETH-USDT', '5m')
+        else:
+            df = pd.DataFrame(kline_store.load_kline_array_from(csv_path, mmap=False),
+                              columns=kline_store.ARRAY_COLUMNS)
+    else:
+        df = df.copy()
     # 如果是毫秒时间戳，需要先除以1000
     df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
     # 步骤2：将datetime对象格式化为文本时间
@@ -88,7 +99,7 @@ def make_kline_v2():
         )
     )
     # 渲染图表
-    kline.render("eth-usdt_kline_chart.html")
+    return kline.render(output)
 
 
 if __name__ == '__main__':
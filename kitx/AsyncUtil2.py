@@ -1,33 +1,101 @@
 import asyncio
 import concurrent.futures
+import contextlib
+import itertools
+import multiprocessing
 from typing import Callable, Any, Optional, List, Dict, Union, Awaitable
-from functools import wraps
+from functools import wraps, partial
 import time
 from datetime import datetime
 from kitx.LogUtil import LogUtil
+from kitx.RetryUtil import RetryPolicy
+from kitx.MetricsUtil import MetricsUtil
+from kitx.ShmUtil import release_attached
 
 logger = LogUtil.get_logger2("AsyncUtil")
 
+#  任务级指标: 排队等待/执行耗时直方图, 执行中任务数与执行器饱和度
+_queue_wait = MetricsUtil.histogram("async_task_queue_wait_seconds", "任务提交到开始执行的等待时间")
+_run_time = MetricsUtil.histogram("async_task_run_seconds", "任务在执行器中的执行时间")
+_task_total = MetricsUtil.counter("async_tasks_total", "按状态统计的任务数")
+_inflight = MetricsUtil.gauge("async_tasks_inflight", "已提交未完成的任务数")
+_saturation = MetricsUtil.gauge("async_executor_saturation", "执行中任务数 / max_workers")
+# 执行器实例编号, 用于区分各实例的饱和度
+_pool_ids = itertools.count(1)
+
+
+class _TaskWrapper:
+    """
+    任务包装器, 定义在模块级别以便进程池pickle
+    """
+
+    def __init__(self, func: Callable, task_id: str, release_shared: bool = False):
+        self.func = func
+        self.task_id = task_id
+        # 进程池worker中参数是按名称attach的副本, 任务结束后释放; 线程池中参数是调用方自己的对象, 不能关闭
+        self.release_shared = release_shared
+        self.__name__ = getattr(func, '__name__', 'task')
+
+    def __call__(self, *args, **kwargs):
+        """
+        返回 (结果, 开始时间, 结束时间), 使用 time.time() 以便跨进程比较;
+        失败时把开始/结束时间附加到异常的 task_timing 属性上(随异常pickle回主进程)
+        """
+        started = time.time()
+        try:
+            result = self.func(*args, **kwargs)
+            return result, started, time.time()
+        except Exception as e:
+            logger.error("任务  %s  函数执行失败:  %s,  错误:  %s", self.task_id, self.__name__, e)
+            try:
+                e.task_timing = (started, time.time())
+            except AttributeError:
+                pass
+            raise
+        finally:
+            if self.release_shared:
+                release_attached(args)
+                release_attached(kwargs.values())
+
 
 class AsyncUtil2:
     """
     异步执行工具类
     """
-    def __init__(self, max_workers: int = 10, thread_pool: bool = True):
+    def __init__(self, max_workers: int = 10, thread_pool: bool = True,
+                 initializer: Optional[Callable] = None, initargs: tuple = (),
+                 mp_context: Optional[str] = None, name: Optional[str] = None):
         """
         初始化异步工具类
+
+        Args:
+            max_workers:  最大worker数
+            thread_pool:  True使用线程池, False使用进程池(适合CPU密集的指标/回测任务)
+            initializer:  进程池worker启动时执行一次, 可预加载数据/指标到 ShmUtil.worker_state()
+            initargs:  initializer的参数
+            mp_context:  进程启动方式, 例如 "fork"/"spawn", 默认使用平台默认值
+            name:  饱和度指标中的实例名称, 默认为 "thread-1"/"process-2" 形式
         """
         self.max_workers = max_workers
         self.thread_pool = thread_pool
+        self.name = name or f"{'thread' if thread_pool else 'process'}-{next(_pool_ids)}"
         self._executor = None
         self._loop = None
         self._tasks = {}
+        self._inflight_count = 0
 
         #  创建执行器
         if thread_pool:
             self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
         else:
-            self._executor = concurrent.futures.ProcessPoolExecutor(max_workers=max_workers)
+            #  worker常驻复用, 大数组通过 ShmUtil.SharedArray 传递, 避免每个任务复制数据
+            context = multiprocessing.get_context(mp_context) if mp_context else None
+            self._executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=context,
+                initializer=initializer,
+                initargs=initargs
+            )
 
     def __del__(self):
         """析构函数，清理资源"""
@@ -42,29 +110,51 @@ class AsyncUtil2:
 
     async def run_async(self, func: Callable, *args, **kwargs) -> Any:
         loop = asyncio.get_event_loop()
-        task_id = f"{func.__name__}_{id(func)}_{time.time()}"
+        name = func.__name__
+        task_id = f"{name}_{id(func)}_{time.time()}"
+        executor = 'thread' if self.thread_pool else 'process'
 
-        logger.info(f"开始异步执行任务:  {task_id}")
-        start_time = time.time()
+        logger.debug("开始异步执行任务:  %s", task_id)
+        submitted = time.time()
+        self._track_inflight(executor, 1)
 
         try:
-            #  在线程池中执行函数
-            result = await loop.run_in_executor(
-                self._executor,
-                # 函数wrapper
-                self._wrap_function(func, task_id),
-                *args,
-                **kwargs
-            )
-            elapsed = time.time() - start_time
-            logger.info(f"异步任务  {task_id}  执行完成，耗时:  {elapsed:.2f}秒")
+            # 未开启追踪时不创建span, 省去每次调用生成id的开销
+            span = MetricsUtil.span(name, executor=executor) if MetricsUtil.registry().tracing \
+                else contextlib.nullcontext()
+            with span:
+                #  run_in_executor 不支持kwargs, 用partial绑定; 进程池下参数按pickle传递
+                result, started, finished = await loop.run_in_executor(
+                    self._executor,
+                    # 函数wrapper
+                    partial(self._wrap_function(func, task_id), *args, **kwargs)
+                )
+            self._observe(name, submitted, started, finished)
+            _task_total.inc(task=name, status='ok')
             return result
 
         except Exception as e:
-            elapsed = time.time() - start_time
-            logger.error(f"异步任务  {task_id}  执行失败，耗时:  {elapsed:.2f}秒，错误:  {e}")
+            timing = getattr(e, 'task_timing', None)
+            if timing is not None:
+                self._observe(name, submitted, *timing)
+            _task_total.inc(task=name, status='error')
+            logger.error("异步任务  %s  执行失败，耗时:  %.2f秒，错误:  %s", task_id, time.time() - submitted, e)
             raise
 
+        finally:
+            self._track_inflight(executor, -1)
+
+    @staticmethod
+    def _observe(name: str, submitted: float, started: float, finished: float):
+        _queue_wait.observe(max(0.0, started - submitted), task=name)
+        _run_time.observe(finished - started, task=name)
+
+    def _track_inflight(self, executor: str, delta: int):
+        self._inflight_count += delta
+        _inflight.inc(delta, executor=executor)
+        _saturation.set(min(self._inflight_count, self.max_workers) / self.max_workers,
+                        executor=executor, pool=self.name)
+
     async def run_multiple(self, tasks: List[Dict[str, Any]]) -> List[Any]:
         if not tasks:
             return []
@@ -119,7 +209,9 @@ class AsyncUtil2:
                           delay: float = 1.0, backoff: float = 2.0,
                           *args, **kwargs) -> Any:
         """
-        带重试机制的异步执行
+        带重试机制的异步执行, 等待时间为指数退避 + jitter
+
+        需要限速/熔断时使用 kitx.RetryUtil 的 Endpoint 或 RetryUtil.resilient 装饰器
 
         Args:
             func:  要执行的函数
@@ -129,35 +221,27 @@ class AsyncUtil2:
             *args:  函数位置参数
             **kwargs:  函数关键字参数
          """
+        policy = RetryPolicy(max_retries=max_retries, base_delay=delay, max_delay=float('inf'), backoff=backoff)
         logger.info(f"开始执行带重试的任务:  {func.__name__}，最大重试次数:  {max_retries}")
         for attempt in range(max_retries + 1):
             try:
                 logger.info(f"第  {attempt + 1}  次尝试执行任务:  {func.__name__}")
-                result = await self.run_async(func, *args, **kwargs)
+                if asyncio.iscoroutinefunction(func):
+                    result = await func(*args, **kwargs)
+                else:
+                    result = await self.run_async(func, *args, **kwargs)
                 logger.info(f"任务执行成功:  {func.__name__}，尝试次数:  {attempt + 1}")
                 return result
             except Exception as e:
-                if attempt < max_retries:
-                    wait_time = delay * (backoff ** attempt)
-                    logger.warning(f"任务执行失败:  {func.__name__}，错误:  {e}，{wait_time}秒后重试")
-                    await asyncio.sleep(wait_time)
-                else:
+                if attempt >= max_retries:
                     logger.error(f"任务执行失败，已达到最大重试次数:  {func.__name__}，错误:  {e}")
-                raise
+                    raise
+                wait_time = policy.delay(attempt)
+                logger.warning(f"任务执行失败:  {func.__name__}，错误:  {e}，{wait_time:.2f}秒后重试")
+                await asyncio.sleep(wait_time)
 
     def _wrap_function(self, func: Callable, task_id: str) -> Callable:
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            try:
-                logger.debug(f"任务  {task_id}  开始执行函数:  {func.__name__}")
-                result = func(*args, **kwargs)
-                logger.debug(f"任务  {task_id}  函数执行完成:  {func.__name__}")
-                return result
-            except  Exception as e:
-                logger.error(f"任务  {task_id}  函数执行失败:  {func.__name__},  错误:  {e}")
-                raise
-
-        return wrapper
+        return _TaskWrapper(func, task_id, release_shared=not self.thread_pool)
 
     def async_decorator(self, timeout: Optional[float] = None, max_retries: int = 0):
         """
@@ -167,11 +251,11 @@ class AsyncUtil2:
             @wraps(func)
             def wrapper(*args, **kwargs):
                 if max_retries > 0:
-                    coro = self.retry_async(func, max_retries, *args, **kwargs)
+                    coro = self.retry_async(func, max_retries, 1.0, 2.0, *args, **kwargs)
                 else:
                     coro = self.run_async(func, *args, **kwargs)
                 if timeout:
-                    coro = self.run_with_timeout(func, timeout, *args, **kwargs)
+                    coro = asyncio.wait_for(coro, timeout=timeout)
                 return self.run_sync(coro)
             return wrapper
 
@@ -263,32 +347,51 @@ if __name__ == "__main__":
         print(f"装饰器执行结果:  {result}")
 
 
+    def window_mean(close, start: int, end: int):
+        """进程池任务: 读取共享内存中的收盘价"""
+        return float(close.array[start:end].mean())
+
+
+    #  示例6:  进程池 + 共享内存参数
+    async def demo_process_pool():
+        print("\n===  进程池共享内存示例  ===")
+        import numpy as np
+        from kitx.ShmUtil import SharedArray
+        process_util = AsyncUtil2(max_workers=2, thread_pool=False)
+        with SharedArray.from_array(np.random.randn(1_000_000).cumsum()) as close:
+            tasks = [{'func': window_mean, 'args': (close, i, i + 250_000)} for i in range(0, 1_000_000, 250_000)]
+            results = await process_util.run_multiple(tasks)
+        process_util.close()
+        print(f"进程池执行结果:  {results}")
+
+
     #  运行所有示例
     async def run_all_demos():
         await demo_basic()
         await demo_multiple()
         await demo_timeout()
         await demo_retry()
+        await demo_process_pool()
 
-        #  装饰器示例在同步上下文中运行
-        demo_decorator()
 
+    #  主函数
+    def main():
+        print("开始异步工具类演示...")
+        start_time = time.time()
 
-#  主函数
-def main():
-    print("开始异步工具类演示...")
-    start_time = time.time()
+        #  运行异步演示
+        async_util.run_sync(run_all_demos())
 
-    #  运行异步演示
-    async_util.run_sync(run_all_demos())
+        #  装饰器示例在同步上下文中运行
+        demo_decorator()
 
-    elapsed = time.time() - start_time
-    print(f"\n所有演示完成，总耗时:  {elapsed:.2f}秒")
+        elapsed = time.time() - start_time
+        print(f"\n所有演示完成，总耗时:  {elapsed:.2f}秒")
 
-    #  关闭资源
-    async_util.close()
-    print("异步工具类演示结束!")
+        #  关闭资源
+        async_util.close()
+        print("异步工具类演示结束!")
 
 
-#  运行主函数
-main()
+    #  运行主函数
+    main()
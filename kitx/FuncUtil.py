@@ -1,19 +1,90 @@
 from typing import Callable, Any, Optional, List, Dict, Union, Awaitable
 from functools import wraps
 from kitx.LogUtil import LogUtil
+from kitx.MetricsUtil import MetricsUtil
+import cProfile
+import io
+import logging
+import os
+import pstats
+import reprlib
+import threading
+import time
+import tracemalloc
 import uuid
 
 logger = LogUtil.get_logger2("FuncUtil")
 
+_repr = reprlib.Repr()
+_repr.maxstring = 200
+_repr.maxother = 200
+
+
+def _short_repr(obj: Any) -> str:
+    """
+    日志用的简短repr, DataFrame/ndarray只输出类型和形状
+    """
+    shape = getattr(obj, 'shape', None)
+    if shape is not None:
+        return f"{type(obj).__name__}(shape={shape})"
+    return _repr.repr(obj)
+
+
+class _ProfileStats:
+    """
+    单个调用点的统计
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        """
+        原地清零, 装饰器闭包持有的是同一个对象
+        """
+        self.calls = 0
+        self.sampled = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.alloc_peak = 0
+        self.alloc_total = 0
+        self.alloc_top: List[str] = []
+        self.profiler: Optional[cProfile.Profile] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        n = self.sampled or 1
+        return {'name': self.name, 'calls': self.calls, 'sampled': self.sampled,
+                'total': self.total, 'mean': self.total / n, 'min': self.min if self.sampled else 0.0,
+                'max': self.max, 'alloc_peak': self.alloc_peak, 'alloc_mean': self.alloc_total / n}
+
+
+class _ProfileState:
+    # 环境变量 FUNC_PROFILE=1 时默认开启
+    enabled = os.environ.get('FUNC_PROFILE', '0') == '1'
+    stats: Dict[str, _ProfileStats] = {}
+    # cProfile 同一时刻只能有一个profiler启用
+    cprofile_active = False
+    # tracemalloc 是否由 profile_func 开启, 关闭/重置时只停止自己开启的
+    tracemalloc_started = False
+
+
+_profile_hist = MetricsUtil.histogram("func_call_seconds", "profile_func 采样的函数耗时")
+
 
 class FuncUtil:
 
     def log_func_proxy(self, func: Callable) -> Callable:
         @wraps(func)
         def wrapper(*args, **kwargs):
-            logger.info(f"{func.__name__} request: args={args}, kwargs={kwargs}")
+            # 未开启INFO时不格式化参数和结果
+            if not logger.isEnabledFor(logging.INFO):
+                return func(*args, **kwargs)
+            logger.info(f"{func.__name__} request: args={_short_repr(args)}, kwargs={_short_repr(kwargs)}")
             result = func(*args, **kwargs)
-            logger.info(f"{func.__name__} response: {result}")
+            logger.info(f"{func.__name__} response: {_short_repr(result)}")
             return result
 
         return wrapper
@@ -23,13 +94,134 @@ class FuncUtil:
             @wraps(func)
             def wrapper(*args, **kwargs):
                 logger.info(f"{func.__name__} req: args={args}, kwargs={kwargs}; reqId={traceId} ")
-                return func(*args, **kwargs)
+                # traceId 写入追踪上下文, 函数内的 AsyncUtil2 任务span会挂在同一trace下
+                with MetricsUtil.span(func.__name__, trace_id=traceId):
+                    return func(*args, **kwargs)
 
             return wrapper
 
         # 返回decorator
         return decorator
 
+    @staticmethod
+    def profile_func(sample_rate: float = 1.0, trace_malloc: bool = False, cprofile: bool = False,
+                     name: Optional[str] = None):
+        """
+        性能分析装饰器, 关闭时只多一次属性判断, 可以常驻在拉取/指标/策略函数上
+
+        Args:
+            sample_rate: 采样比例, 例如0.01表示每100次调用采样1次
+            trace_malloc: 是否用tracemalloc记录采样调用的内存峰值(tracemalloc开启后全局生效, 仅用于排查)
+            cprofile: 是否对采样调用做cProfile, 结果在同一调用点累计
+            name: 调用点名称, 默认为 module.qualname
+        """
+        every = max(1, round(1 / sample_rate)) if sample_rate > 0 else 0
+
+        def decorator(func: Callable) -> Callable:
+            site = name or f"{func.__module__}.{func.__qualname__}"
+            stats = _ProfileState.stats.setdefault(site, _ProfileStats(site))
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                if not _ProfileState.enabled:
+                    return func(*args, **kwargs)
+                stats.calls += 1
+                if not every or stats.calls % every:
+                    return func(*args, **kwargs)
+                return FuncUtil._profile_call(stats, func, args, kwargs, trace_malloc, cprofile)
+
+            return wrapper
+
+        return decorator
+
+    @staticmethod
+    def _profile_call(stats: _ProfileStats, func: Callable, args, kwargs, trace_malloc: bool, cprofile: bool):
+        alloc_base = 0
+        if trace_malloc:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _ProfileState.tracemalloc_started = True
+            alloc_base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+        profiler = None
+        if cprofile and not _ProfileState.cprofile_active:
+            _ProfileState.cprofile_active = True
+            profiler = stats.profiler = stats.profiler or cProfile.Profile()
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                _ProfileState.cprofile_active = False
+            alloc = tracemalloc.get_traced_memory()[1] - alloc_base if trace_malloc else 0
+            with stats.lock:
+                stats.sampled += 1
+                stats.total += elapsed
+                stats.min = min(stats.min, elapsed)
+                stats.max = max(stats.max, elapsed)
+                stats.alloc_total += alloc
+                new_peak = alloc > stats.alloc_peak
+                stats.alloc_peak = max(stats.alloc_peak, alloc)
+            if new_peak:
+                # 只在出现新的内存峰值时做快照, 记录分配最多的代码行
+                top = tracemalloc.take_snapshot().statistics('lineno')[:5]
+                stats.alloc_top = [str(stat) for stat in top]
+            _profile_hist.observe(elapsed, func=stats.name)
+
+    @staticmethod
+    def set_profile_enabled(enabled: bool = True):
+        """
+        静态方法：全局开启/关闭 profile_func
+        """
+        _ProfileState.enabled = enabled
+        if not enabled:
+            FuncUtil._stop_tracemalloc()
+
+    @staticmethod
+    def _stop_tracemalloc():
+        if _ProfileState.tracemalloc_started:
+            tracemalloc.stop()
+            _ProfileState.tracemalloc_started = False
+
+    @staticmethod
+    def profile_reset():
+        """
+        静态方法：清空所有调用点的统计, 并停止 profile_func 开启的 tracemalloc
+        """
+        for stats in list(_ProfileState.stats.values()):
+            with stats.lock:
+                stats.clear()
+        FuncUtil._stop_tracemalloc()
+
+    @staticmethod
+    def profile_stats() -> Dict[str, Dict[str, Any]]:
+        return {site: stats.to_dict() for site, stats in _ProfileState.stats.items() if stats.calls}
+
+    @staticmethod
+    def profile_report(sort: str = 'total', top: int = 20, cprofile_lines: int = 10) -> str:
+        """
+        静态方法：汇总报告, 按 total/mean/max/calls/alloc_peak 排序
+        """
+        rows = sorted(FuncUtil.profile_stats().values(), key=lambda r: r[sort], reverse=True)[:top]
+        out = io.StringIO()
+        out.write(f"{'function':<60} {'calls':>9} {'sampled':>8} {'total(s)':>10} {'mean(ms)':>10} "
+                  f"{'max(ms)':>10} {'peak(KB)':>10}\n")
+        for r in rows:
+            out.write(f"{r['name'][-60:]:<60} {r['calls']:>9} {r['sampled']:>8} {r['total']:>10.4f} "
+                      f"{r['mean'] * 1e3:>10.3f} {r['max'] * 1e3:>10.3f} {r['alloc_peak'] / 1024:>10.1f}\n")
+        for r in rows:
+            stats = _ProfileState.stats[r['name']]
+            if stats.alloc_top:
+                out.write(f"\n[{r['name']}] top allocations:\n  " + "\n  ".join(stats.alloc_top) + "\n")
+            if stats.profiler is not None:
+                buf = io.StringIO()
+                pstats.Stats(stats.profiler, stream=buf).sort_stats('cumulative').print_stats(cprofile_lines)
+                out.write(f"\n[{r['name']}] cProfile:\n{buf.getvalue()}")
+        return out.getvalue()
+
 
 def run1():
     def hello(name: str, **kwargs):
@@ -47,6 +239,19 @@ def run2():
     hello("2222", k1="v2")
 
 
+def run3():
+    FuncUtil.set_profile_enabled(True)
+
+    @FuncUtil.profile_func(sample_rate=0.1, trace_malloc=True, cprofile=True)
+    def build(n: int):
+        return sorted(str(i) for i in range(n))
+
+    for _ in range(100):
+        build(10000)
+    print(FuncUtil.profile_report())
+
+
 if __name__ == '__main__':
     run1()
     run2()
+    run3()
@@ -1,28 +1,198 @@
+import atexit
 import logging
 import os
+import queue
+import threading
 from datetime import datetime
-from typing import Optional, Dict, Any
+from logging.handlers import QueueHandler, RotatingFileHandler
+from typing import Optional, Dict, Any, List
 from pathlib import Path
 
 
+class _BatchRotatingFileHandler(RotatingFileHandler):
+    """
+    按批刷盘的文件处理器: emit 时不flush, 由后台写线程每批写完后统一flush
+    """
+
+    def flush(self):
+        pass
+
+    def flush_batch(self):
+        super().flush()
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    只入队不格式化, 消息格式化推迟到后台写线程; 调用方不应在记录日志后修改参数对象
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class _LogWriter:
+    """
+    单个后台写线程, 按logger名称把记录分发给各自的处理器
+    """
+
+    def __init__(self, batch_size: int = 512):
+        self.queue = queue.SimpleQueue()
+        self.batch_size = batch_size
+        self._handlers: Dict[str, List[logging.Handler]] = {}
+        self._lock = threading.Lock()
+        self._start()
+        # fork前写完缓冲避免子进程重复写出; fork出的子进程(进程池worker)没有写线程, 需要重新启动
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(before=self._before_fork, after_in_child=self._after_fork)
+
+    def _start(self):
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+
+    def _before_fork(self):
+        if LogUtil._writer is self and self._thread.is_alive() and threading.current_thread() is not self._thread:
+            self.flush(timeout=1.0)
+
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        if LogUtil._writer is self:
+            self._start()
+
+    def register(self, name: str, handlers: List[logging.Handler]):
+        with self._lock:
+            self._handlers[name] = handlers
+
+    def _run(self):
+        while True:
+            record = self.queue.get()
+            batch = [record]
+            try:
+                while len(batch) < self.batch_size:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            touched = set()
+            markers = []
+            for i, record in enumerate(batch):
+                if record is None:
+                    self._flush(touched)
+                    # 停止前唤醒所有等待 flush 的调用方, 包括停止标记之后入队的
+                    markers += [r for r in batch[i + 1:] if isinstance(r, threading.Event)]
+                    try:
+                        while True:
+                            item = self.queue.get_nowait()
+                            if isinstance(item, threading.Event):
+                                markers.append(item)
+                    except queue.Empty:
+                        pass
+                    for marker in markers:
+                        marker.set()
+                    return
+                if isinstance(record, threading.Event):
+                    markers.append(record)
+                    continue
+                for handler in self._handlers.get(record.name, ()):
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+                        touched.add(handler)
+            self._flush(touched)
+            for marker in markers:
+                marker.set()
+
+    @staticmethod
+    def _flush(handlers):
+        for handler in handlers:
+            if isinstance(handler, _BatchRotatingFileHandler):
+                handler.flush_batch()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        等待当前已入队的日志写完
+        """
+        if not self._thread.is_alive():
+            return True
+        marker = threading.Event()
+        self.queue.put(marker)
+        return marker.wait(timeout)
+
+    def stop(self):
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join(timeout=5)
+        with self._lock:
+            for handlers in self._handlers.values():
+                for handler in handlers:
+                    handler.close()
+            self._handlers.clear()
+
+
+def _env_level() -> int:
+    """
+    环境变量 LOG_LEVEL 对应的级别, 无效时使用 INFO
+    """
+    level = logging.getLevelName(os.environ.get('LOG_LEVEL', 'INFO').upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
 class LogUtil:
     """
     静态日志工厂类
+
+    同名logger只配置一次; 默认异步模式下记录经 QueueHandler 交给单个后台线程格式化并批量写文件,
+    调用线程(事件循环/拉取循环)只做级别判断和入队
     """
 
-    _default_log_dir = Path(__file__).parent.parent / 'logs'
-    _default_level = logging.DEBUG
+    # 环境变量 LOG_DIR 可改写默认目录, 测试时指向临时目录, 不写入仓库的 logs/
+    _default_log_dir = os.environ.get('LOG_DIR') or Path(__file__).parent.parent / 'logs'
+    _default_level = _env_level()
     _default_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
     _default_date_format = '%Y-%m-%d %H:%M:%S'
+    _default_async = True
+    _loggers: Dict[str, logging.Logger] = {}
+    _writer: Optional[_LogWriter] = None
+    _lock = threading.Lock()
+
+    @staticmethod
+    def _get_writer() -> _LogWriter:
+        if LogUtil._writer is None:
+            LogUtil._writer = _LogWriter()
+            atexit.register(LogUtil.shutdown)
+        return LogUtil._writer
+
+    @staticmethod
+    def flush(timeout: float = 5.0) -> bool:
+        """
+        静态方法：等待异步模式下已入队的日志写入文件
+        """
+        writer = LogUtil._writer
+        return writer.flush(timeout) if writer is not None else True
+
+    @staticmethod
+    def shutdown():
+        """
+        静态方法：写完队列中剩余的日志并关闭处理器
+        """
+        with LogUtil._lock:
+            writer, LogUtil._writer = LogUtil._writer, None
+            if writer is not None:
+                writer.stop()
+                for logger in LogUtil._loggers.values():
+                    logger.handlers.clear()
+                LogUtil._loggers.clear()
 
     @staticmethod
     def get_logger(name: str, log_file: Optional[str] = None, level: int = None, log_dir: str = None,
                    enable_console: bool = True,
                    enable_file: bool = True,
                    max_bytes: int = 10 * 1024 * 1024,
-                   backup_count: int = 5) -> logging.Logger:
+                   backup_count: int = 5,
+                   async_mode: bool = None) -> logging.Logger:
         """
-        静态方法：获取或创建logger实例
+        静态方法：获取或创建logger实例, 同名logger只在首次调用时添加处理器
         
         Args:
             name: logger名称
@@ -33,10 +203,23 @@ class LogUtil:
             enable_file: 是否启用文件输出
             max_bytes: 单个日志文件最大大小（字节）
             backup_count: 备份文件数量
+            async_mode: 是否经队列由后台线程写日志，如果为None则使用默认配置
             
         Returns:
             logging.Logger: 配置好的logger实例
         """
+        with LogUtil._lock:
+            logger = LogUtil._loggers.get(name)
+            if logger is None:
+                logger = LogUtil._create_logger(name, log_file, level, log_dir, enable_console, enable_file,
+                                                max_bytes, backup_count, async_mode)
+                LogUtil._loggers[name] = logger
+            return logger
+
+    @staticmethod
+    def _create_logger(name: str, log_file: Optional[str], level: Optional[int], log_dir: Optional[str],
+                       enable_console: bool, enable_file: bool, max_bytes: int, backup_count: int,
+                       async_mode: Optional[bool]) -> logging.Logger:
 
         # 使用默认参数
         if level is None:
@@ -45,13 +228,16 @@ class LogUtil:
             log_dir = LogUtil._default_log_dir
         if log_file is None:
             log_file = f"{name}.log"
+        if async_mode is None:
+            async_mode = LogUtil._default_async
 
         # 确保日志目录存在
         os.makedirs(log_dir, exist_ok=True)
 
-        # 创建logger
+        # 创建logger, 级别在logger上判断, 低于级别的记录不会创建/格式化
         logger = logging.getLogger(name)
         logger.setLevel(level)
+        handlers = []
 
         # 创建格式器
         formatter = logging.Formatter(
@@ -62,9 +248,9 @@ class LogUtil:
         # 文件处理器
         if enable_file:
             try:
-                from logging.handlers import RotatingFileHandler
                 log_path = os.path.join(log_dir, log_file)
-                file_handler = RotatingFileHandler(
+                file_cls = _BatchRotatingFileHandler if async_mode else RotatingFileHandler
+                file_handler = file_cls(
                     log_path,
                     maxBytes=max_bytes,
                     backupCount=backup_count,
@@ -72,7 +258,7 @@ class LogUtil:
                 )
                 file_handler.setLevel(level)
                 file_handler.setFormatter(formatter)
-                logger.addHandler(file_handler)
+                handlers.append(file_handler)
             except Exception as e:
                 print(f"创建文件日志处理器失败: {e}")
 
@@ -82,22 +268,31 @@ class LogUtil:
                 console_handler = logging.StreamHandler()
                 console_handler.setLevel(level)
                 console_handler.setFormatter(formatter)
-                logger.addHandler(console_handler)
+                handlers.append(console_handler)
             except Exception as e:
                 print(f"创建控制台日志处理器失败: {e}")
+
+        if async_mode and handlers:
+            writer = LogUtil._get_writer()
+            writer.register(name, handlers)
+            logger.addHandler(_DeferredQueueHandler(writer.queue))
+        else:
+            for handler in handlers:
+                logger.addHandler(handler)
         return logger
 
     @staticmethod
     def set_default_config(log_dir: str = None, level: int = None,
-                           format_str: str = None, date_format: str = None):
+                           format_str: str = None, date_format: str = None, async_mode: bool = None):
         """
-        静态方法：设置默认日志配置
+        静态方法：设置默认日志配置, 只影响之后新建的logger
 
         Args:
             log_dir: 默认日志目录
             level: 默认日志级别
             format_str: 默认日志格式
             date_format: 默认日期格式
+            async_mode: 默认是否异步写日志
         """
         if log_dir is not None:
             LogUtil._default_log_dir = log_dir
@@ -107,10 +302,12 @@ class LogUtil:
             LogUtil._default_format = format_str
         if date_format is not None:
             LogUtil._default_date_format = date_format
+        if async_mode is not None:
+            LogUtil._default_async = async_mode
 
     @staticmethod
     def get_logger2(name: str, log_dir: str = None) -> logging.Logger:
-        return LogUtil.get_logger_with_date(name, logging.DEBUG, log_dir=LogUtil._default_log_dir)
+        return LogUtil.get_logger_with_date(name, log_dir=log_dir)
 
     @staticmethod
     def get_logger_with_date(name: str, level: int = None, log_dir: str = None,
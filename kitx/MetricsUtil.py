@@ -0,0 +1,303 @@
+import bisect
+import contextvars
+import json
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Tuple, Optional, List, Any
+
+# 默认耗时分桶(秒), 覆盖毫秒级指标计算到分钟级的历史拉取
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_trace_id: contextvars.ContextVar = contextvars.ContextVar('trace_id', default=None)
+_span_id: contextvars.ContextVar = contextvars.ContextVar('span_id', default=None)
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    # Prometheus 文本格式要求转义标签值中的反斜杠、双引号和换行
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(key: Tuple, extra: str = '') -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+class _Metric:
+    type_name = ''
+
+    def __init__(self, name: str, help_text: str = ''):
+        self.name = name
+        self.help = help_text
+        self._values: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def _prometheus_header(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.type_name}']
+
+
+class Counter(_Metric):
+    """
+    单调递增计数器
+    """
+    type_name = 'counter'
+
+    def inc(self, value: float = 1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + value
+
+    def to_prometheus(self) -> List[str]:
+        lines = self._prometheus_header()
+        lines += [f'{self.name}{_label_text(k)} {v}' for k, v in list(self._values.items())]
+        return lines
+
+    def to_dict(self) -> List[Dict]:
+        return [{'labels': dict(k), 'value': v} for k, v in list(self._values.items())]
+
+
+class Gauge(Counter):
+    """
+    瞬时值, 例如执行中的任务数
+    """
+    type_name = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def dec(self, value: float = 1.0, **labels):
+        self.inc(-value, **labels)
+
+
+class Histogram(_Metric):
+    """
+    分桶直方图, 记录次数、总和与各桶计数, 导出时估算分位数
+    """
+    type_name = 'histogram'
+
+    def __init__(self, name: str, help_text: str = '', buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [各桶计数(最后一个为+Inf), count, sum, max]
+                state = [[0] * (len(self.buckets) + 1), 0, 0.0, 0.0]
+                self._values[key] = state
+            state[0][idx] += 1
+            state[1] += 1
+            state[2] += value
+            state[3] = max(state[3], value)
+
+    def quantile(self, q: float, **labels) -> Optional[float]:
+        state = self._values.get(_label_key(labels))
+        return self._quantile(state, q) if state else None
+
+    def _quantile(self, state, q: float) -> float:
+        counts, count = state[0], state[1]
+        target = q * count
+        cumulative = 0
+        for i, c in enumerate(counts):
+            cumulative += c
+            if cumulative >= target and c:
+                return self.buckets[i] if i < len(self.buckets) else state[3]
+        return state[3]
+
+    def to_prometheus(self) -> List[str]:
+        lines = self._prometheus_header()
+        for key, (counts, count, total, _) in list(self._values.items()):
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float('inf'),), counts):
+                cumulative += c
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                le_label = 'le="' + le + '"'
+                lines.append(f'{self.name}_bucket{_label_text(key, le_label)} {cumulative}')
+            lines.append(f'{self.name}_count{_label_text(key)} {count}')
+            lines.append(f'{self.name}_sum{_label_text(key)} {total}')
+        return lines
+
+    def to_dict(self) -> List[Dict]:
+        return [{'labels': dict(k), 'count': s[1], 'sum': s[2], 'max': s[3],
+                 'p50': self._quantile(s, 0.5), 'p95': self._quantile(s, 0.95), 'p99': self._quantile(s, 0.99)}
+                for k, s in list(self._values.items())]
+
+
+class Span:
+    """
+    追踪span, 通过contextvars在协程/调用链中传递traceId
+    """
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, trace_id: Optional[str] = None, **attrs):
+        self.registry = registry
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = None
+        self.attrs = attrs
+        self.start = 0.0
+        self.duration = 0.0
+        self._tokens = None
+
+    def __enter__(self) -> 'Span':
+        self.trace_id = self.trace_id or _trace_id.get() or uuid.uuid4().hex
+        self.parent_id = _span_id.get()
+        self._tokens = (_trace_id.set(self.trace_id), _span_id.set(self.span_id))
+        self.start = time.time()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.duration = time.time() - self.start
+        _trace_id.reset(self._tokens[0])
+        _span_id.reset(self._tokens[1])
+        if exc_type is not None:
+            self.attrs['error'] = repr(exc_val)
+        self.registry.record_span(self)
+        return False
+
+    def to_dict(self) -> Dict:
+        return {'name': self.name, 'trace_id': self.trace_id, 'span_id': self.span_id,
+                'parent_id': self.parent_id, 'start': self.start, 'duration': self.duration,
+                'attrs': {k: str(v) for k, v in self.attrs.items()}}
+
+
+class MetricsRegistry:
+    """
+    指标注册表, 支持导出为 Prometheus 文本或 JSON
+    """
+
+    def __init__(self, max_spans: int = 10000):
+        self._metrics: Dict[str, _Metric] = {}
+        self._spans = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+        self.tracing = False
+
+    def _get(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str = '') -> Counter:
+        return self._get(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str = '') -> Gauge:
+        return self._get(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str = '', buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def record_span(self, span: Span):
+        if self.tracing:
+            self._spans.append(span)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Dict]:
+        return [s.to_dict() for s in list(self._spans) if trace_id is None or s.trace_id == trace_id]
+
+    def to_prometheus(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines += metric.to_prometheus()
+        return '\n'.join(lines) + '\n'
+
+    def to_dict(self) -> Dict:
+        return {
+            'timestamp': time.time(),
+            'metrics': {name: {'type': m.type_name, 'values': m.to_dict()} for name, m in list(self._metrics.items())},
+            'spans': self.spans(),
+        }
+
+    def dump_json(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+    def serve(self, port: int = 9108, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        """
+        在后台线程启动本地HTTP端点: /metrics 为Prometheus文本, /metrics.json 为JSON
+        """
+        registry = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.startswith('/metrics.json'):
+                    body = json.dumps(registry.to_dict(), ensure_ascii=False).encode('utf-8')
+                    content_type = 'application/json'
+                elif self.path.startswith('/metrics'):
+                    body = registry.to_prometheus().encode('utf-8')
+                    content_type = 'text/plain; version=0.0.4'
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), _Handler)
+        threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+        return server
+
+
+class MetricsUtil:
+    """
+    静态指标工厂类, 使用进程内默认注册表
+    """
+    _registry = MetricsRegistry()
+
+    @staticmethod
+    def registry() -> MetricsRegistry:
+        return MetricsUtil._registry
+
+    @staticmethod
+    def counter(name: str, help_text: str = '') -> Counter:
+        return MetricsUtil._registry.counter(name, help_text)
+
+    @staticmethod
+    def gauge(name: str, help_text: str = '') -> Gauge:
+        return MetricsUtil._registry.gauge(name, help_text)
+
+    @staticmethod
+    def histogram(name: str, help_text: str = '', buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return MetricsUtil._registry.histogram(name, help_text, buckets)
+
+    @staticmethod
+    def enable_tracing(enabled: bool = True):
+        """
+        静态方法：开启/关闭span记录(关闭时span仍传递traceId, 但不保存)
+        """
+        MetricsUtil._registry.tracing = enabled
+
+    @staticmethod
+    def span(name: str, trace_id: Optional[str] = None, **attrs) -> Span:
+        return Span(MetricsUtil._registry, name, trace_id, **attrs)
+
+    @staticmethod
+    def current_trace_id() -> Optional[str]:
+        return _trace_id.get()
+
+    @staticmethod
+    def dump_json(path: str):
+        MetricsUtil._registry.dump_json(path)
+
+    @staticmethod
+    def serve(port: int = 9108, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+        return MetricsUtil._registry.serve(port, host)
@@ -0,0 +1,334 @@
+import asyncio
+import random
+import threading
+import time
+from functools import wraps
+from typing import Callable, Any, Optional, Dict
+
+from kitx.LogUtil import LogUtil
+
+logger = LogUtil.get_logger2("RetryUtil")
+
+# ccxt 异常类名, 按名称匹配避免强依赖ccxt
+_RATE_LIMIT_ERRORS = {'RateLimitExceeded', 'DDoSProtection'}
+_RETRYABLE_ERRORS = {'NetworkError', 'RequestTimeout', 'ExchangeNotAvailable', 'OnMaintenance',
+                     'TimeoutError', 'ConnectionError', 'ClientConnectionError', 'ServerDisconnectedError'}
+
+
+def _error_names(e: BaseException) -> set:
+    return {cls.__name__ for cls in type(e).__mro__}
+
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    """
+    是否为限频错误: ccxt RateLimitExceeded/DDoSProtection 或 HTTP 状态码属性为 429
+
+    不匹配错误消息文本, ccxt 的消息中含带毫秒时间戳的URL, 容易误判
+    """
+    if _error_names(e) & _RATE_LIMIT_ERRORS:
+        return True
+    return getattr(e, 'status', None) == 429 or getattr(e, 'status_code', None) == 429
+
+
+def is_retryable_error(e: BaseException) -> bool:
+    """
+    是否值得重试: 限频/网络/超时类错误; 参数错误、余额不足等直接抛出
+    """
+    return is_rate_limit_error(e) or bool(_error_names(e) & _RETRYABLE_ERRORS)
+
+
+class CircuitOpenError(Exception):
+    """
+    熔断器处于打开状态, 请求被拒绝
+    """
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"熔断器 {name} 已打开, {retry_in:.1f}秒后重试")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """
+    自适应令牌桶(AIMD)
+
+    成功时速率加性增长到 max_rate, 遇到限频时速率乘性下降并暂停到 retry_after,
+    使持续吞吐稳定在交易所允许的上限附近
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None,
+                 min_rate: Optional[float] = None, max_rate: Optional[float] = None,
+                 increase: Optional[float] = None, decrease: float = 0.5):
+        """
+        Args:
+            rate: 初始速率(次/秒)
+            capacity: 桶容量, 默认等于 rate(允许1秒的突发)
+            min_rate: 最低速率, 默认 rate / 20
+            max_rate: 最高速率, 默认 rate
+            increase: 每次成功增加的速率, 默认 max_rate / 50
+            decrease: 限频时速率乘以的因子
+        """
+        self.max_rate = max_rate if max_rate is not None else rate
+        self.min_rate = min_rate if min_rate is not None else rate / 20
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1.0)
+        self.increase = increase if increase is not None else self.max_rate / 50
+        self.decrease = decrease
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self) -> float:
+        """
+        预占一个令牌, 返回需要等待的秒数(令牌可透支, 调用方等待后即可执行)
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate, self._blocked_until - now)
+            return wait
+
+    def acquire(self) -> float:
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self) -> float:
+        wait = self.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        with self._lock:
+            now = time.monotonic()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = min(self._tokens, 0.0)
+            self._updated = now
+            pause = retry_after if retry_after is not None else 1.0 / self.rate
+            self._blocked_until = max(self._blocked_until, now + pause)
+
+
+class CircuitBreaker:
+    """
+    熔断器: 连续失败达到阈值后打开, recovery_timeout 后半开放行一个探测请求
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str = 'default', failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = CircuitBreaker.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def retry_in(self) -> float:
+        """
+        距离半开状态的剩余秒数
+        """
+        if self.state != CircuitBreaker.OPEN:
+            return 0.0
+        return max(0.0, self._opened_at + self.recovery_timeout - time.monotonic())
+
+    def before_call(self):
+        """
+        调用前检查, 熔断打开时抛出 CircuitOpenError
+        """
+        with self._lock:
+            if self.state == CircuitBreaker.OPEN:
+                if self.retry_in() > 0:
+                    raise CircuitOpenError(self.name, self.retry_in())
+                self.state = CircuitBreaker.HALF_OPEN
+                self._probing = False
+            if self.state == CircuitBreaker.HALF_OPEN:
+                if self._probing:
+                    raise CircuitOpenError(self.name, self.recovery_timeout)
+                self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            self.state = CircuitBreaker.CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == CircuitBreaker.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != CircuitBreaker.OPEN:
+                    logger.warning(f"熔断器 {self.name} 打开, 连续失败 {self._failures} 次")
+                self.state = CircuitBreaker.OPEN
+                self._opened_at = time.monotonic()
+
+
+class RetryPolicy:
+    """
+    指数退避 + full jitter 的重试策略
+    """
+
+    def __init__(self, max_retries: int = 3, base_delay: float = 1.0, max_delay: float = 30.0,
+                 backoff: float = 2.0, jitter: bool = True):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.jitter = jitter
+
+    def delay(self, attempt: int) -> float:
+        """
+        第 attempt 次失败后的等待时间(attempt从0开始)
+        """
+        cap = min(self.max_delay, self.base_delay * (self.backoff ** attempt))
+        return random.uniform(0, cap) if self.jitter else cap
+
+
+class Endpoint:
+    """
+    单个接口的弹性调用: 令牌桶限速 + 熔断 + 重试
+    """
+
+    def __init__(self, name: str, rate: float = 10.0, policy: Optional[RetryPolicy] = None,
+                 failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate)
+        self.breaker = CircuitBreaker(name, failure_threshold, recovery_timeout)
+        self.policy = policy if policy is not None else RetryPolicy()
+
+    def _on_error(self, e: Exception, attempt: int) -> float:
+        """
+        记录失败并返回重试前的等待时间, 不可重试时直接抛出
+        """
+        if is_rate_limit_error(e):
+            # 限频说明接口可用, 只降速不计入熔断
+            self.bucket.on_rate_limited(getattr(e, 'retry_after', None))
+            self.breaker.record_success()
+        elif is_retryable_error(e):
+            self.breaker.record_failure()
+        else:
+            # 业务错误同样说明接口可用
+            self.breaker.record_success()
+            raise e
+        if attempt >= self.policy.max_retries:
+            logger.error(f"接口 {self.name} 已达到最大重试次数 {self.policy.max_retries}, 错误: {e}")
+            raise e
+        wait = self.policy.delay(attempt)
+        logger.warning(f"接口 {self.name} 第 {attempt + 1} 次调用失败: {e}, {wait:.2f}秒后重试")
+        return wait
+
+    def _on_success(self):
+        self.bucket.on_success()
+        self.breaker.record_success()
+
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        同步调用
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            self.bucket.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                time.sleep(self._on_error(e, attempt))
+                attempt += 1
+                continue
+            self._on_success()
+            return result
+
+    async def call_async(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        异步调用, func 可以是协程函数或普通函数
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            await self.bucket.acquire_async()
+            try:
+                result = func(*args, **kwargs)
+                if asyncio.iscoroutine(result):
+                    result = await result
+            except Exception as e:
+                await asyncio.sleep(self._on_error(e, attempt))
+                attempt += 1
+                continue
+            self._on_success()
+            return result
+
+
+class RetryUtil:
+    """
+    按接口名称共享的限速/熔断/重试工具
+    """
+    _endpoints: Dict[str, Endpoint] = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def endpoint(name: str, rate: float = 10.0, max_retries: int = 3, base_delay: float = 1.0,
+                 max_delay: float = 30.0, failure_threshold: int = 5,
+                 recovery_timeout: float = 30.0) -> Endpoint:
+        """
+        静态方法：获取或创建接口, 同名接口共享令牌桶与熔断器
+
+        同名接口只在首次调用时按参数创建, 之后调用传入的参数被忽略; 配置不同的调用方应使用不同名称
+
+        Args:
+            name: 接口名称, 例如 "okx.fetch_ohlcv"
+            rate: 初始/最大速率(次/秒)
+            max_retries: 最大重试次数
+            base_delay: 重试初始等待时间(秒)
+            max_delay: 重试最大等待时间(秒)
+            failure_threshold: 熔断的连续失败次数
+            recovery_timeout: 熔断打开后多少秒进入半开状态
+        """
+        with RetryUtil._lock:
+            ep = RetryUtil._endpoints.get(name)
+            if ep is None:
+                policy = RetryPolicy(max_retries, base_delay, max_delay)
+                ep = Endpoint(name, rate, policy, failure_threshold, recovery_timeout)
+                RetryUtil._endpoints[name] = ep
+            return ep
+
+    @staticmethod
+    def resilient(name: str, **endpoint_kwargs) -> Callable:
+        """
+        静态方法：弹性调用装饰器, 支持普通函数与协程函数
+
+        Example:
+            @RetryUtil.resilient("okx.fetch_ohlcv", rate=20)
+            def fetch(...): ...
+        """
+        ep = RetryUtil.endpoint(name, **endpoint_kwargs)
+
+        def decorator(func: Callable) -> Callable:
+            if asyncio.iscoroutinefunction(func):
+                @wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    return await ep.call_async(func, *args, **kwargs)
+
+                return async_wrapper
+
+            @wraps(func)
+            def wrapper(*args, **kwargs):
+                return ep.call(func, *args, **kwargs)
+
+            return wrapper
+
+        return decorator
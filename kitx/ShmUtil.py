@@ -0,0 +1,149 @@
+from multiprocessing import shared_memory
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+# 进程内缓存: 共享内存名称 -> [SharedMemory, 引用计数], 同一任务的多个参数引用同一段共享内存时只attach一次
+_attached: Dict[str, list] = {}
+# 进程内worker状态, 用于常驻worker缓存已加载的指标/数据
+_worker_state: Dict[str, Any] = {}
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    entry = _attached.get(name)
+    if entry is None:
+        entry = _attached[name] = [shared_memory.SharedMemory(name=name), 0]
+    entry[1] += 1
+    return entry[0]
+
+
+def _detach(name: str):
+    """
+    引用计数减一, 进程内最后一个句柄关闭时释放映射
+    """
+    entry = _attached.get(name)
+    if entry is None:
+        return
+    entry[1] -= 1
+    if entry[1] <= 0:
+        del _attached[name]
+        try:
+            entry[0].close()
+        except BufferError:
+            # 调用方仍持有由 array 派生的视图, 映射随视图回收时释放
+            pass
+
+
+def release_attached(values) -> int:
+    """
+    关闭参数中按名称attach的 SharedArray(含 list/tuple/dict 的一层元素), 返回关闭的数量
+
+    进程池worker常驻复用, 任务结束后需要解除参数的映射, 否则worker会一直映射已被owner unlink 的共享内存
+    """
+    closed = 0
+    for value in values:
+        items = value.values() if isinstance(value, dict) else value if isinstance(value, (list, tuple)) else (value,)
+        for item in items:
+            if isinstance(item, SharedArray) and not item._owner and item.array is not None:
+                item.close()
+                closed += 1
+    return closed
+
+
+def _rebuild(name: str, shape: Tuple[int, ...], dtype: str) -> "SharedArray":
+    return SharedArray(shape, dtype, name=name)
+
+
+class SharedArray:
+    """
+    基于 multiprocessing.shared_memory 的 NumPy 数组句柄
+
+    pickle 时只传递 (name, shape, dtype), 子进程中按名称 attach 后得到零拷贝视图,
+    因此可以作为进程池任务的参数或输出缓冲区
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype: Any = np.float64, name: Optional[str] = None):
+        """
+        Args:
+            shape: 数组形状
+            dtype: 数组类型
+            name: 共享内存名称, 为None时新建共享内存(当前进程为owner)
+        """
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = np.dtype(dtype)
+        nbytes = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+        if name is None:
+            self._shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self._owner = True
+        else:
+            self._shm = _attach(name)
+            self._owner = False
+        self.name = self._shm.name
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self._shm.buf)
+
+    @staticmethod
+    def from_array(arr: np.ndarray) -> "SharedArray":
+        """
+        将已有数组复制到共享内存(只复制一次), 之后各worker共享同一份数据
+        """
+        arr = np.asarray(arr)
+        shared = SharedArray(arr.shape, arr.dtype)
+        shared.array[...] = arr
+        return shared
+
+    @staticmethod
+    def from_frame(df, columns=None) -> Dict[str, "SharedArray"]:
+        """
+        将DataFrame按列放入共享内存, 例如K线的 timestamp/open/high/low/close/volume
+        """
+        columns = columns if columns is not None else list(df.columns)
+        return {col: SharedArray.from_array(df[col].to_numpy()) for col in columns}
+
+    def __reduce__(self):
+        return _rebuild, (self.name, self.shape, self.dtype.str)
+
+    def __len__(self):
+        return self.shape[0] if self.shape else 0
+
+    def __repr__(self):
+        return f"SharedArray(name={self.name}, shape={self.shape}, dtype={self.dtype})"
+
+    def close(self):
+        """
+        释放共享内存; owner负责unlink, 避免 /dev/shm 泄漏, 非owner在最后一个句柄关闭时解除映射
+        """
+        if self.array is None:
+            return
+        self.array = None
+        if not self._owner:
+            _detach(self.name)
+        else:
+            self._shm.close()
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def worker_state() -> Dict[str, Any]:
+    """
+    获取当前进程的worker状态字典
+
+    进程池中的worker是常驻的, 任务可以把已加载的K线/指标缓存在这里, 供后续任务复用
+    """
+    return _worker_state
+
+
+def worker_cached(key: str, loader, *args, **kwargs) -> Any:
+    """
+    在worker状态中按key缓存loader的结果, 仅首次调用时加载
+    """
+    if key not in _worker_state:
+        _worker_state[key] = loader(*args, **kwargs)
+    return _worker_state[key]
@@ -0,0 +1,83 @@
+import asyncio
+from unittest import TestCase
+
+import numpy as np
+
+from kitx.AsyncUtil2 import AsyncUtil2
+from kitx.ShmUtil import SharedArray, worker_cached
+
+
+def _window_sum(close, start, end, scale=1.0):
+    return float(close.array[start:end].sum()) * scale
+
+
+def _fill(out, value):
+    out.array[:] = value
+    return len(out)
+
+
+def _load_calls():
+    return np.arange(10)
+
+
+def _first_sum(shared):
+    return float(sum(s.array[1] for s in shared))
+
+
+def _attached_count():
+    from kitx import ShmUtil
+    return len(ShmUtil._attached)
+
+
+def _cached_len():
+    return len(worker_cached('arange', _load_calls))
+
+
+class TestAsyncUtil2(TestCase):
+
+    def setUp(self):
+        self.util = AsyncUtil2(max_workers=2, thread_pool=False)
+
+    def tearDown(self):
+        self.util.close()
+
+    def test_process_pool_shared_args(self):
+        with SharedArray.from_array(np.arange(100, dtype=np.float64)) as close:
+            result = asyncio.run(self.util.run_async(_window_sum, close, 0, 10, scale=2.0))
+        self.assertEqual(result, 90.0)
+
+    def test_process_pool_shared_output(self):
+        with SharedArray((1000,), np.float32) as out:
+            n = asyncio.run(self.util.run_async(_fill, out, 3.0))
+            self.assertEqual(n, 1000)
+            self.assertTrue(np.all(out.array == 3.0))
+
+    def test_worker_state_reused(self):
+        tasks = [{'func': _cached_len} for _ in range(4)]
+        self.assertEqual(asyncio.run(self.util.run_multiple(tasks)), [10] * 4)
+
+    def test_worker_releases_attached_args(self):
+        util = AsyncUtil2(max_workers=1, thread_pool=False)
+        arrays = [SharedArray.from_array(np.arange(100, dtype=np.float64)) for _ in range(5)]
+        try:
+            for shared in arrays:
+                asyncio.run(util.run_async(_window_sum, shared, 0, 10))
+                self.assertEqual(asyncio.run(util.run_async(_first_sum, shared=[shared, shared])), 2.0)
+            self.assertEqual(asyncio.run(util.run_async(_attached_count)), 0)
+        finally:
+            util.close()
+            for shared in arrays:
+                shared.close()
+
+    def test_attached_released_on_last_close(self):
+        import pickle
+        from kitx import ShmUtil
+        with SharedArray.from_array(np.arange(10, dtype=np.float64)) as owner:
+            first, second = pickle.loads(pickle.dumps(owner)), pickle.loads(pickle.dumps(owner))
+            self.assertIs(first._shm, second._shm)
+            first.close()
+            first.close()
+            self.assertIn(owner.name, ShmUtil._attached)
+            self.assertEqual(second.array[3], 3.0)
+            second.close()
+            self.assertNotIn(owner.name, ShmUtil._attached)
@@ -0,0 +1,51 @@
+from unittest import TestCase
+
+from kitx.FuncUtil import FuncUtil
+
+
+class TestFuncUtil(TestCase):
+
+    def tearDown(self):
+        FuncUtil.set_profile_enabled(False)
+        FuncUtil.profile_reset()
+
+    def test_profile_disabled(self):
+        FuncUtil.set_profile_enabled(False)
+
+        @FuncUtil.profile_func(name="TestFuncUtil.disabled")
+        def add(a, b):
+            return a + b
+
+        self.assertEqual(add(1, 2), 3)
+        self.assertNotIn("TestFuncUtil.disabled", FuncUtil.profile_stats())
+
+    def test_profile_sampled(self):
+        FuncUtil.set_profile_enabled(True)
+
+        @FuncUtil.profile_func(sample_rate=0.25, trace_malloc=True, cprofile=True, name="TestFuncUtil.sampled")
+        def build(n):
+            return [i * 2 for i in range(n)]
+
+        for _ in range(20):
+            build(1000)
+        stats = FuncUtil.profile_stats()["TestFuncUtil.sampled"]
+        self.assertEqual(stats['calls'], 20)
+        self.assertEqual(stats['sampled'], 5)
+        self.assertGreater(stats['alloc_peak'], 0)
+        self.assertIn("TestFuncUtil.sampled", FuncUtil.profile_report())
+
+    def test_profile_after_reset(self):
+        import tracemalloc
+        FuncUtil.set_profile_enabled(True)
+
+        @FuncUtil.profile_func(trace_malloc=True, name="TestFuncUtil.reset")
+        def build(n):
+            return list(range(n))
+
+        build(10)
+        FuncUtil.profile_reset()
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertNotIn("TestFuncUtil.reset", FuncUtil.profile_stats())
+        for _ in range(3):
+            build(10)
+        self.assertEqual(FuncUtil.profile_stats()["TestFuncUtil.reset"]['calls'], 3)
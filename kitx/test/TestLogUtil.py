@@ -0,0 +1,53 @@
+import logging
+import os
+import tempfile
+from unittest import TestCase
+
+from kitx.LogUtil import LogUtil
+
+
+class TestLogUtil(TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_handlers_added_once(self):
+        first = LogUtil.get_logger("TestLogUtil.once", log_dir=self.tmp.name, enable_console=False)
+        second = LogUtil.get_logger("TestLogUtil.once", log_dir=self.tmp.name, enable_console=False)
+        self.assertIs(first, second)
+        self.assertEqual(len(second.handlers), 1)
+
+    def test_async_write_and_level(self):
+        logger = LogUtil.get_logger("TestLogUtil.async", log_dir=self.tmp.name, level=logging.INFO,
+                                    enable_console=False)
+        logger.debug("hidden %s", "debug")
+        for i in range(100):
+            logger.info("bar %d", i)
+        self.assertTrue(LogUtil.flush())
+        with open(os.path.join(self.tmp.name, "TestLogUtil.async.log"), encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(len(lines), 100)
+        self.assertTrue(lines[-1].endswith("bar 99"))
+
+    def test_invalid_env_level_falls_back_to_info(self):
+        from unittest import mock
+        from kitx.LogUtil import _env_level
+        with mock.patch.dict(os.environ, {'LOG_LEVEL': 'verbose'}):
+            self.assertEqual(_env_level(), logging.INFO)
+        with mock.patch.dict(os.environ, {'LOG_LEVEL': 'debug'}):
+            self.assertEqual(_env_level(), logging.DEBUG)
+
+    def test_stop_releases_flush_waiters(self):
+        import threading
+        from kitx.LogUtil import _LogWriter
+        writer = _LogWriter()
+        marker = threading.Event()
+        # 停止标记之后入队的 flush 也应被唤醒
+        writer.queue.put(None)
+        writer.queue.put(marker)
+        writer.stop()
+        self.assertTrue(marker.wait(1.0))
+        self.assertTrue(writer.flush(timeout=0.1))
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from kitx.AsyncUtil2 import AsyncUtil2
+from kitx.FuncUtil import FuncUtil
+from kitx.MetricsUtil import MetricsRegistry, MetricsUtil
+
+
+class TestMetricsUtil(TestCase):
+
+    def test_histogram_export(self):
+        registry = MetricsRegistry()
+        hist = registry.histogram("fetch_seconds", "fetch", buckets=(0.1, 1.0))
+        for v in (0.05, 0.5, 0.5, 2.0):
+            hist.observe(v, exchange="okx")
+        text = registry.to_prometheus()
+        self.assertIn('fetch_seconds_bucket{exchange="okx",le="0.1"} 1', text)
+        self.assertIn('fetch_seconds_bucket{exchange="okx",le="+Inf"} 4', text)
+        self.assertEqual(hist.quantile(0.5, exchange="okx"), 1.0)
+
+    def test_async_task_metrics(self):
+        util = AsyncUtil2(max_workers=2)
+        asyncio.run(util.run_async(time.sleep, 0.01))
+        util.close()
+        run_time = MetricsUtil.registry().to_dict()['metrics']['async_task_run_seconds']['values']
+        sleep = [v for v in run_time if v['labels'] == {'task': 'sleep'}][0]
+        self.assertGreaterEqual(sleep['count'], 1)
+        self.assertGreaterEqual(sleep['max'], 0.01)
+
+    def test_label_values_escaped(self):
+        registry = MetricsRegistry()
+        registry.counter("errors_total").inc(error='bad "x"\\n\nend')
+        self.assertIn('errors_total{error="bad \\"x\\"\\\\n\\nend"} 1.0', registry.to_prometheus())
+
+    def test_failed_task_timing_and_pool_saturation(self):
+        def fail_after_sleep():
+            time.sleep(0.01)
+            raise ValueError("boom")
+
+        first, second = AsyncUtil2(max_workers=2), AsyncUtil2(max_workers=2, name='bench')
+        with self.assertRaises(ValueError):
+            asyncio.run(first.run_async(fail_after_sleep))
+        first.close()
+        second.close()
+        metrics = MetricsUtil.registry().to_dict()['metrics']
+        run_time = [v for v in metrics['async_task_run_seconds']['values']
+                    if v['labels'] == {'task': 'fail_after_sleep'}][0]
+        self.assertGreaterEqual(run_time['max'], 0.01)
+        pools = {v['labels']['pool'] for v in metrics['async_executor_saturation']['values']}
+        self.assertIn(first.name, pools)
+        self.assertNotEqual(first.name, second.name)
+
+    def test_trace_id_span(self):
+        MetricsUtil.enable_tracing(True)
+
+        @FuncUtil.log_func_annotation(None, "trace-001")
+        def hello(name):
+            return MetricsUtil.current_trace_id()
+
+        self.assertEqual(hello("a"), "trace-001")
+        spans = MetricsUtil.registry().spans("trace-001")
+        self.assertEqual(spans[0]['name'], 'hello')
+        MetricsUtil.enable_tracing(False)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'metrics.json')
+            MetricsUtil.dump_json(path)
+            with open(path, encoding='utf-8') as f:
+                self.assertIn('metrics', json.load(f))
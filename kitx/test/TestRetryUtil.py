@@ -0,0 +1,80 @@
+import asyncio
+from unittest import TestCase
+
+from kitx.RetryUtil import (RetryUtil, Endpoint, RetryPolicy, TokenBucket, CircuitBreaker,
+                            CircuitOpenError, is_rate_limit_error)
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class NetworkError(Exception):
+    pass
+
+
+class TestRetryUtil(TestCase):
+
+    def _endpoint(self, **kwargs):
+        return Endpoint('test', rate=1000, policy=RetryPolicy(max_retries=3, base_delay=0.001), **kwargs)
+
+    def test_retry_until_success(self):
+        calls = []
+
+        def flaky():
+            calls.append(1)
+            if len(calls) < 3:
+                raise NetworkError("timeout")
+            return "ok"
+
+        self.assertEqual(self._endpoint().call(flaky), "ok")
+        self.assertEqual(len(calls), 3)
+
+    def test_non_retryable_raises_immediately(self):
+        calls = []
+
+        def bad():
+            calls.append(1)
+            raise ValueError("bad symbol")
+
+        with self.assertRaises(ValueError):
+            self._endpoint().call(bad)
+        self.assertEqual(len(calls), 1)
+
+    def test_rate_limit_slows_bucket(self):
+        bucket = TokenBucket(rate=100)
+        bucket.on_rate_limited(retry_after=0.0)
+        self.assertEqual(bucket.rate, 50)
+        bucket.on_success()
+        self.assertEqual(bucket.rate, 52)
+        self.assertTrue(is_rate_limit_error(RateLimitExceeded("okx 50011")))
+
+    def test_circuit_opens(self):
+        ep = self._endpoint(failure_threshold=2, recovery_timeout=60)
+
+        def down():
+            raise NetworkError("503")
+
+        with self.assertRaises(CircuitOpenError):
+            ep.call(down)
+        self.assertEqual(ep.breaker.state, CircuitBreaker.OPEN)
+
+    def test_async_decorator(self):
+        calls = []
+
+        @RetryUtil.resilient("test.async", rate=1000, base_delay=0.001)
+        async def fetch(x):
+            calls.append(x)
+            if len(calls) < 2:
+                raise RateLimitExceeded("429 Too Many Requests")
+            return x * 2
+
+        self.assertEqual(asyncio.run(fetch(21)), 42)
+        self.assertEqual(len(calls), 2)
+
+    def test_rate_limit_not_matched_by_message(self):
+        self.assertFalse(is_rate_limit_error(ValueError("GET https://x/api?after=1704067429000 bad symbol")))
+        self.assertTrue(is_rate_limit_error(RateLimitExceeded("too many requests")))
+        err = ValueError("http error")
+        err.status = 429
+        self.assertTrue(is_rate_limit_error(err))
@@ -1,14 +1,233 @@
-# This is a sample Python script.
+"""
+cexlee 统一命令行入口
 
-# Press ⌃R to execute it or replace it with your code.
-# Press Double ⇧ to search everywhere for classes, files, tool windows, actions, and settings.
+    python main.py fetch --exchange okx --symbol ETH-USDT --timeframe 1h --start 2025-01-01
+    python main.py chart --symbol ETH-USDT --timeframe 5m
+    python main.py backtest --symbol ETH-USDT --timeframe 5m --fast 10 --slow 30
+    python main.py bot --model signal_net.pt --symbols ETH-USDT BTC-USDT
+    python main.py bench --scale 1 10
+    python main.py bench --startup
+    python main.py serve --port 8765
+    python main.py archive --older-than 90
+    python main.py exchanges
 
+模块顶层只导入标准库, ccxt/pandas/pyecharts/talib/torch 等在子命令执行时才导入,
+--help 和只读 .npy 缓存的命令不承担这些库的导入耗时
+"""
+import argparse
+import sys
+from typing import List, Optional
 
-def print_hi(name):
-    # Use a breakpoint in the code line below to debug your script.
-    print(f'Hi, {name}')  # Press ⌘F8 to toggle the breakpoint.
+
+def cmd_fetch(args) -> int:
+    if args.exchange == 'okx':
+        from dexx.okx_kline_fetcher import fetch_okx_kline_data as fetch
+    else:
+        from dexx.biance_kline_fetcher import fetch_binance_kline_data as fetch
+    df = fetch(args.symbol, args.timeframe, args.start, args.end, limit=args.limit, save_csv=not args.no_save)
+    print(f"共 {len(df)} 根K线")
+    return 0
+
+
+def cmd_chart(args) -> int:
+    from fintech.xchart.chart_kline import make_kline_v2
+    if args.csv:
+        path = make_kline_v2(csv_path=args.csv, output=args.output)
+    elif args.server:
+        # 从本地查询服务读取, 共享服务端的热缓存
+        from dexx.kline_server import KlineClient
+        host, _, port = args.server.rpartition(':')
+        with KlineClient(host or '127.0.0.1', int(port)) as client:
+            df = client.query_frame(args.exchange, args.symbol, args.timeframe)
+        path = make_kline_v2(df=df, output=args.output)
+    else:
+        from dexx import kline_store
+        df = kline_store.load_kline_frame(args.exchange, args.symbol, args.timeframe)
+        path = make_kline_v2(df=df, output=args.output)
+    print(f"图表已保存到: {path}")
+    return 0
+
+
+def cmd_backtest(args) -> int:
+    # 只依赖 numpy 和 .npy 缓存
+    from dexx import kline_store
+    from fintech.backtest import sma_cross_backtest
+    arr = kline_store.load_kline_array(args.exchange, args.symbol, args.timeframe)
+    result = sma_cross_backtest(arr[:, kline_store.COL['close']], args.fast, args.slow, args.fee,
+                                allow_short=args.short, timeframe=args.timeframe)
+    for key in ('total_return', 'volatility', 'sharpe', 'max_drawdown', 'turnover'):
+        print(f"{key:<14} {result[key]:>12.4f}")
+    return 0
+
+
+def cmd_bot(args) -> int:
+    # 对各交易对最新的特征窗口做一次批量推理, 未指定模型时使用随机初始化的参考模型试运行
+    import numpy as np
+    from mlx.kline_dataset import load_source_features
+    from mlx.signal_infer import SignalInferenceService, SignalNet
+
+    model = args.model or SignalNet()
+    service = SignalInferenceService(model, args.window, num_threads=args.threads)
+    try:
+        windows = {}
+        for symbol in args.symbols:
+            features, _ = load_source_features(args.exchange, symbol, args.timeframe)
+            windows[symbol] = np.asarray(features[-args.window:])
+        for signal in service.predict_batch(windows):
+            print(f"{signal.symbol:<14} score={signal.score:.4f} side={signal.side:+d}")
+    finally:
+        service.close()
+    return 0
+
+
+def cmd_serve(args) -> int:
+    from dexx.kline_server import run_server
+    run_server(args.host, args.port, args.cache_mb, args.metrics_port)
+    return 0
+
+
+def cmd_archive(args) -> int:
+    from dexx.kline_archive import archive_cold
+    for item in archive_cold(args.older_than, dry_run=args.dry_run):
+        if 'error' in item:
+            print(f"{item['source']}: 失败 {item['error']}")
+        else:
+            print(f"{item['source']}: {item['bytes']} -> {item.get('archive_bytes', '-')}")
+    return 0
+
+
+def cmd_exchanges(args) -> int:
+    from cexx.ccxt_main import list_exchanges
+    print(list_exchanges(async_support=args.use_async))
+    return 0
+
+
+# 冷启动基准的命令, 每次在新的解释器中执行
+STARTUP_COMMANDS = [
+    ['--help'],
+    ['backtest', '--help'],
+    ['backtest', '--symbol', 'ETH-USDT', '--timeframe', '1h'],
+]
+# 对照: 旧脚本在启动时一次性导入的库, 只统计已安装的
+EAGER_IMPORTS = ['ccxt', 'ccxt.async_support', 'pandas', 'pyecharts', 'talib']
+
+
+def measure_startup(repeat: int = 5) -> List[dict]:
+    """
+    测量各命令在新进程中的冷启动耗时(取最小值), 并与旧脚本的预先导入做对照
+    """
+    import importlib.util
+    import os
+    import subprocess
+    import time
+
+    def installed(name: str) -> bool:
+        try:
+            return importlib.util.find_spec(name) is not None
+        except ModuleNotFoundError:
+            return False
+
+    eager = [m for m in EAGER_IMPORTS if installed(m)]
+    here = os.path.abspath(__file__)
+    cases = [(' '.join(c), [sys.executable, here] + c) for c in STARTUP_COMMANDS]
+    if eager:
+        cases.append((f"import {', '.join(eager)}", [sys.executable, '-c', f"import {', '.join(eager)}"]))
+
+    results = []
+    for name, command in cases:
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True,
+                           cwd=os.path.dirname(here))
+            times.append(time.perf_counter() - start)
+        results.append({'name': name, 'min': min(times), 'max': max(times)})
+        print(f"{name:<50} {min(times) * 1000:>8.1f}ms")
+    return results
+
+
+def cmd_bench(args, extra: List[str]) -> int:
+    if args.startup:
+        measure_startup(args.startup_repeat)
+        return 0
+    from benchx.bench_suite import main as bench_main
+    return bench_main(extra)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='cexlee', description="cexlee 命令行")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    def add_source(p, symbol='ETH-USDT', timeframe='5m', exchanges=None):
+        p.add_argument('--exchange', default='okx', choices=exchanges)
+        p.add_argument('--symbol', default=symbol)
+        p.add_argument('--timeframe', default=timeframe)
+
+    p = sub.add_parser('fetch', help="从交易所拉取K线并保存到 data/")
+    # 只有 okx/binance 有拉取脚本, 其他命令读取本地数据, 交易所名称不限
+    add_source(p, timeframe='1h', exchanges=['okx', 'binance'])
+    p.add_argument('--start', required=True, help="开始日期 YYYY-MM-DD")
+    p.add_argument('--end', default=None, help="结束日期 YYYY-MM-DD, 默认到当前")
+    p.add_argument('--limit', type=int, default=1000)
+    p.add_argument('--no-save', action='store_true', help="不保存CSV")
+    p.set_defaults(func=cmd_fetch)
+
+    p = sub.add_parser('chart', help="渲染K线图")
+    add_source(p)
+    p.add_argument('--csv', default=None, help="直接指定CSV文件")
+    p.add_argument('--output', default='kline_chart.html')
+    p.add_argument('--server', default=None, help="从K线查询服务读取, host:port")
+    p.set_defaults(func=cmd_chart)
+
+    p = sub.add_parser('backtest', help="均线交叉回测")
+    add_source(p)
+    p.add_argument('--fast', type=int, default=10)
+    p.add_argument('--slow', type=int, default=30)
+    p.add_argument('--fee', type=float, default=0.001)
+    p.add_argument('--short', action='store_true', help="允许做空")
+    p.set_defaults(func=cmd_backtest)
+
+    p = sub.add_parser('bot', help="对最新K线窗口推理交易信号")
+    p.add_argument('--exchange', default='okx')
+    p.add_argument('--symbols', nargs='+', default=['ETH-USDT'])
+    p.add_argument('--timeframe', default='5m')
+    p.add_argument('--model', default=None, help="TorchScript 模型文件")
+    p.add_argument('--window', type=int, default=64)
+    p.add_argument('--threads', type=int, default=None)
+    p.set_defaults(func=cmd_bot)
+
+    p = sub.add_parser('bench', help="性能基准, 其余参数传给 benchx.bench_suite")
+    p.add_argument('--startup', action='store_true', help="只测量命令行冷启动耗时")
+    p.add_argument('--startup-repeat', type=int, default=5)
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser('serve', help="启动本地K线查询服务")
+    p.add_argument('--host', default='127.0.0.1')
+    p.add_argument('--port', type=int, default=8765)
+    p.add_argument('--cache-mb', type=int, default=512)
+    p.add_argument('--metrics-port', type=int, default=None)
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser('archive', help="把冷数据K线迁移到压缩归档")
+    p.add_argument('--older-than', type=int, default=90, help="结束日期早于多少天前")
+    p.add_argument('--dry-run', action='store_true')
+    p.set_defaults(func=cmd_archive)
+
+    p = sub.add_parser('exchanges', help="列出 ccxt 支持的交易所")
+    p.add_argument('--async', dest='use_async', action='store_true', help="列出 ccxt.async_support 的交易所")
+    p.set_defaults(func=cmd_exchanges)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if args.command == 'bench':
+        return cmd_bench(args, extra)
+    if extra:
+        parser.error(f"无法识别的参数: {' '.join(extra)}")
+    return args.func(args)
 
 
-# Press the green button in the gutter to run the script.
 if __name__ == '__main__':
-    print_hi('PyCharm')
+    sys.exit(main())
@@ -0,0 +1,218 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import torch
+from torch.utils.data import Dataset, DataLoader
+
+from dexx.kline_store import (COL, DATA_DIR, cache_path, is_cache_fresh, load_kline_array_from, load_kline_range,
+                              normalize_symbol, partition_version, save_npy)
+from fintech import indicators
+
+# 特征列, 均为无量纲或已标准化的值, 不同价位的交易对可以混合训练
+FEATURE_NAMES = ['log_ret', 'hl_range', 'oc_body', 'upper_wick', 'lower_wick',
+                 'vol_z', 'sma20_gap', 'sma60_gap', 'rsi14', 'atr14', 'ret_std20']
+# 特征的预热长度, 之前的行不作为样本
+WARMUP = 60
+# 特征版本, 修改 build_features 后递增使缓存失效
+FEATURE_VERSION = 2
+
+
+def build_features(arr: np.ndarray) -> np.ndarray:
+    """
+    由 N×6 K线数组计算 N×F float32 特征矩阵(列见 FEATURE_NAMES)
+    """
+    o, h, l, c, v = (arr[:, COL[k]] for k in ('open', 'high', 'low', 'close', 'volume'))
+    log_ret = indicators.log_return(c)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features = np.column_stack([
+            log_ret * 100,
+            (h - l) / c * 100,
+            (c - o) / o * 100,
+            (h - np.maximum(o, c)) / c * 100,
+            (np.minimum(o, c) - l) / c * 100,
+            indicators.zscore(np.log1p(v), 96),
+            (c / indicators.sma(c, 20) - 1) * 100,
+            (c / indicators.sma(c, 60) - 1) * 100,
+            indicators.rsi(c, 14) / 50 - 1,
+            indicators.atr(h, l, c, 14) / c * 100,
+            indicators.rolling_std(log_ret, 20) * 100,
+        ])
+    features = np.nan_to_num(features, nan=0.0, posinf=0.0, neginf=0.0)
+    return np.clip(features, -10, 10).astype(np.float32)
+
+
+def load_features(path: Union[str, Path]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    读取K线文件(CSV 或归档 .cxa)对应的 (特征矩阵, 收盘价); 特征按需计算并缓存为 .npy, 以源文件的修改时间判断是否过期
+    """
+    path = Path(path)
+    klines = load_kline_array_from(path)
+    cached = cache_path(path, f'.features_v{FEATURE_VERSION}')
+    if not is_cache_fresh(cached, path):
+        save_npy(cached, build_features(np.asarray(klines)))
+    return np.load(cached, mmap_mode='r'), klines[:, COL['close']]
+
+
+def load_source_features(exchange: str, symbol: str, timeframe: str,
+                         data_dir: Union[str, Path] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    读取 (exchange, symbol, timeframe) 全部分区(CSV 与归档)合并后的 (特征矩阵, K线数组)
+
+    合并结果与特征缓存为 .npy, 文件名含分区集合(文件名及修改时间)的摘要, 分区变化后重新计算并删除旧缓存
+    """
+    cache_dir = (Path(data_dir) if data_dir is not None else DATA_DIR) / '.cache'
+    version = partition_version(exchange, symbol, timeframe, data_dir)
+    digest = hashlib.sha1(repr(version).encode()).hexdigest()[:16]
+    prefix = f"{exchange}_{normalize_symbol(symbol)}_{timeframe}.merged"
+    klines_path = cache_dir / f"{prefix}_{digest}.npy"
+    features_path = cache_dir / f"{prefix}_{digest}.features_v{FEATURE_VERSION}.npy"
+    if not (klines_path.exists() and features_path.exists()):
+        klines = np.asarray(load_kline_range(exchange, symbol, timeframe, data_dir=data_dir), dtype=np.float64)
+        save_npy(klines_path, klines)
+        save_npy(features_path, build_features(klines))
+        for stale in cache_dir.glob(f"{prefix}_*.npy"):
+            if stale not in (klines_path, features_path):
+                stale.unlink(missing_ok=True)
+    return np.load(features_path, mmap_mode='r'), np.load(klines_path, mmap_mode='r')
+
+
+class KlineWindowDataset(Dataset):
+    """
+    K线滑动窗口数据集
+
+    每个样本为 (window, F) 特征窗口和预测 horizon 根K线后的标签. 窗口是内存映射特征矩阵上的
+    stride 视图, 只在组batch时复制一次; 标签在取样时按收盘价计算, 不预先生成
+    """
+
+    def __init__(self, sources: Sequence[Tuple[str, str, str]], window: int = 64, horizon: int = 12,
+                 stride: int = 1, label: str = 'direction', threshold: float = 0.0,
+                 start: Optional[int] = None, end: Optional[int] = None, data_dir: Union[str, Path] = None):
+        """
+        Args:
+            sources: [(exchange, symbol, timeframe), ...]
+            window: 窗口长度(K线根数)
+            horizon: 标签的预测步数
+            stride: 样本间隔
+            label: 'direction' 为涨跌二分类(0/1), 'return' 为 horizon 对数收益率(%)
+            threshold: direction 标签的收益率阈值(%)
+            start: 样本窗口结束时间下限(毫秒时间戳, 含)
+            end: 样本(含标签)时间上限(毫秒时间戳, 不含), 用于切分训练/验证集
+            data_dir: K线数据目录, 默认为项目 data/
+        """
+        if label not in ('direction', 'return'):
+            raise ValueError(f"不支持的标签类型: {label}")
+        # 每个数据源合并全部 CSV 与归档分区
+        self.sources = [tuple(src) for src in sources]
+        self.data_dir = data_dir
+        self.window = window
+        self.horizon = horizon
+        self.label = label
+        self.threshold = threshold
+        self._arrays = None
+
+        # 各数据源的样本起点(窗口结束位置), 全局索引通过 offsets 二分定位
+        self._starts = []
+        for src in self.sources:
+            ts = load_source_features(*src, data_dir=data_dir)[1][:, COL['timestamp']]
+            first = max(WARMUP, window - 1)
+            last = len(ts) - horizon
+            if start is not None:
+                first = max(first, int(np.searchsorted(ts, start, side='left')))
+            if end is not None:
+                # 标签所用的未来收盘价也必须在 end 之前
+                last = min(last, int(np.searchsorted(ts, end, side='left')) - horizon)
+            self._starts.append(np.arange(first, max(first, last), stride, dtype=np.int64))
+        self.offsets = np.cumsum([0] + [len(s) for s in self._starts])
+
+    def _open(self):
+        """
+        每个进程(DataLoader worker)首次取样时打开内存映射
+        """
+        if self._arrays is None:
+            arrays = []
+            for src in self.sources:
+                features, klines = load_source_features(*src, data_dir=self.data_dir)
+                close = klines[:, COL['close']]
+                windows = np.lib.stride_tricks.sliding_window_view(features, self.window, axis=0)
+                # (N, F, window) -> (N, window, F), 仍为视图
+                arrays.append((windows.transpose(0, 2, 1), close))
+            self._arrays = arrays
+        return self._arrays
+
+    def __getstate__(self):
+        # 多进程worker只传数据源和索引, 内存映射在worker中重新打开
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _labels(self, close: np.ndarray, ends: np.ndarray) -> np.ndarray:
+        ret = np.log(close[ends + self.horizon] / close[ends]) * 100
+        if self.label == 'direction':
+            return (ret > self.threshold).astype(np.int64)
+        return ret.astype(np.float32)
+
+    def __getitem__(self, index: int):
+        x, y = self.__getitems__([index])
+        return x[0], y[0]
+
+    def __getitems__(self, indices: Sequence[int]):
+        """
+        批量取样, DataLoader 会用整批索引调用, 每个数据源只做一次 fancy-index 复制
+        """
+        arrays = self._open()
+        indices = np.asarray(indices, dtype=np.int64)
+        src = np.searchsorted(self.offsets, indices, side='right') - 1
+        x = np.empty((len(indices), self.window, len(FEATURE_NAMES)), dtype=np.float32)
+        y = np.empty(len(indices), dtype=np.int64 if self.label == 'direction' else np.float32)
+        for s in np.unique(src):
+            mask = src == s
+            ends = self._starts[s][indices[mask] - self.offsets[s]]
+            windows, close = arrays[s]
+            x[mask] = windows[ends - self.window + 1]
+            y[mask] = self._labels(close, ends)
+        return torch.from_numpy(x), torch.from_numpy(y)
+
+
+def _batch_collate(batch):
+    # __getitems__ 已经返回整批张量
+    return batch
+
+
+def make_loader(dataset: KlineWindowDataset, batch_size: int = 256, shuffle: bool = True,
+                num_workers: Optional[int] = None, prefetch_factor: int = 4, drop_last: bool = False) -> DataLoader:
+    """
+    创建多worker预取的DataLoader
+
+    Args:
+        num_workers: worker数, 默认为 CPU 核数的一半
+        prefetch_factor: 每个worker预取的batch数
+    """
+    if num_workers is None:
+        num_workers = max(1, (os.cpu_count() or 2) // 2)
+    kwargs = dict(persistent_workers=True, prefetch_factor=prefetch_factor) if num_workers > 0 else {}
+    return DataLoader(dataset, batch_size=batch_size, shuffle=shuffle, num_workers=num_workers,
+                      collate_fn=_batch_collate, drop_last=drop_last, **kwargs)
+
+
+def train_val_datasets(sources: List[Tuple[str, str, str]], split_time: int, **kwargs):
+    """
+    按时间切分训练/验证集, 训练集的标签不越过切分点, 避免泄漏
+    """
+    train = KlineWindowDataset(sources, end=split_time, **kwargs)
+    val = KlineWindowDataset(sources, start=split_time, **kwargs)
+    return train, val
+
+
+if __name__ == '__main__':
+    dataset = KlineWindowDataset([('okx', 'ETH-USDT', '5m'), ('okx', 'ETH-USDT', '1h')], window=64, horizon=12)
+    loader = make_loader(dataset, batch_size=512, num_workers=2)
+    for i, (x, y) in enumerate(loader):
+        if i == 0:
+            print(f"样本数: {len(dataset)}, batch: {tuple(x.shape)}, 标签: {tuple(y.shape)}, 正样本比例: {y.float().mean():.3f}")
+    print(f"batch数: {i + 1}")
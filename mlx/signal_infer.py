@@ -0,0 +1,244 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+import torch
+from torch import nn
+
+from kitx.LogUtil import LogUtil
+from kitx.MetricsUtil import MetricsUtil
+from mlx.kline_dataset import FEATURE_NAMES
+
+logger = LogUtil.get_logger2("SignalInfer")
+
+_batch_seconds = MetricsUtil.histogram("inference_batch_seconds", "单次前向耗时")
+_batch_size = MetricsUtil.histogram("inference_batch_size", "单次前向的样本数",
+                                    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024))
+
+
+class Signal(NamedTuple):
+    symbol: str
+    timestamp: Optional[int]
+    score: float
+    # 1 做多, -1 做空, 0 观望
+    side: int
+
+
+class SignalNet(nn.Module):
+    """
+    参考模型: 1D卷积 + 全局池化, 输入 (B, window, F), 输出 (B,) 上涨logit
+    """
+
+    def __init__(self, n_features: int = len(FEATURE_NAMES), hidden: int = 32):
+        super().__init__()
+        self.conv = nn.Sequential(
+            nn.Conv1d(n_features, hidden, kernel_size=5, padding=2),
+            nn.ReLU(),
+            nn.Conv1d(hidden, hidden, kernel_size=5, padding=2),
+            nn.ReLU(),
+        )
+        self.head = nn.Linear(hidden * 2, 1)
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        h = self.conv(x.transpose(1, 2))
+        pooled = torch.cat([h.mean(dim=2), h[:, :, -1]], dim=1)
+        return self.head(pooled).squeeze(1)
+
+
+def export_model(model: nn.Module, path: Union[str, Path], window: int, n_features: int = len(FEATURE_NAMES),
+                 quantize: bool = True) -> Path:
+    """
+    导出为 TorchScript, quantize 时先对 Linear 做动态int8量化
+    """
+    model = model.eval()
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+    with torch.inference_mode():
+        scripted = torch.jit.trace(model, torch.zeros(1, window, n_features))
+    scripted = torch.jit.freeze(scripted)
+    path = Path(path)
+    scripted.save(str(path))
+    return path
+
+
+def load_model(model: Union[str, Path, nn.Module], num_threads: Optional[int] = None) -> nn.Module:
+    """
+    加载 TorchScript 文件或直接使用传入的模型, 只在启动时执行一次
+    """
+    if num_threads is not None:
+        torch.set_num_threads(num_threads)
+    if isinstance(model, (str, Path)):
+        model = torch.jit.load(str(model), map_location='cpu')
+    return model.eval()
+
+
+class SignalInferenceService:
+    """
+    CPU 批量推理服务
+
+    同一根K线收盘时各交易对的特征窗口通过 submit 提交, 服务在 max_wait_ms 内攒成一批,
+    写入预分配的输入张量后做一次前向, 再把信号返回给各调用方并推送给订阅者
+    """
+
+    def __init__(self, model: Union[str, Path, nn.Module], window: int, n_features: int = len(FEATURE_NAMES),
+                 max_batch: int = 512, max_wait_ms: float = 2.0, long_threshold: float = 0.55,
+                 short_threshold: float = 0.45, num_threads: Optional[int] = None):
+        """
+        Args:
+            model: TorchScript 文件路径或模型
+            window: 特征窗口长度
+            n_features: 特征数
+            max_batch: 单批最大样本数
+            max_wait_ms: 收到第一个请求后最多等待多少毫秒再推理
+            long_threshold: 上涨概率高于该值做多
+            short_threshold: 上涨概率低于该值做空
+            num_threads: torch 计算线程数
+        """
+        self.model = load_model(model, num_threads)
+        self.window = window
+        self.n_features = n_features
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.long_threshold = long_threshold
+        self.short_threshold = short_threshold
+        self._buffer = torch.zeros(max_batch, window, n_features)
+        # predict_batch(调用方线程)与批处理(推理线程)共用输入张量, 前向串行执行
+        self._forward_lock = threading.Lock()
+        self._subscribers: List[Callable[[List[Signal]], None]] = []
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        # 前向在单独线程执行(torch 计算时释放GIL), 事件循环保持响应
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='infer')
+
+    def subscribe(self, callback: Callable[[List[Signal]], None]):
+        """
+        订阅每批推理结果, 例如策略的信号处理函数
+        """
+        self._subscribers.append(callback)
+
+    def _to_signals(self, symbols: Sequence[str], timestamps: Sequence[Optional[int]],
+                    scores: np.ndarray) -> List[Signal]:
+        sides = np.where(scores > self.long_threshold, 1, np.where(scores < self.short_threshold, -1, 0))
+        return [Signal(s, t, float(p), int(d)) for s, t, p, d in zip(symbols, timestamps, scores, sides)]
+
+    def _forward(self, features: Sequence[np.ndarray]) -> np.ndarray:
+        """
+        对不超过 max_batch 的样本做一次前向, 返回上涨概率
+        """
+        n = len(features)
+        with self._forward_lock:
+            start = time.perf_counter()
+            batch = self._buffer[:n]
+            batch.copy_(torch.from_numpy(np.stack(features).astype(np.float32, copy=False)))
+            with torch.inference_mode():
+                out = self.model(batch)
+            if out.dim() == 2 and out.shape[1] == 2:
+                prob = torch.softmax(out, dim=1)[:, 1]
+            else:
+                prob = torch.sigmoid(out.reshape(n))
+            prob = prob.numpy().copy()
+        _batch_seconds.observe(time.perf_counter() - start)
+        _batch_size.observe(n)
+        return prob
+
+    def predict_batch(self, features: Dict[str, np.ndarray], timestamp: Optional[int] = None) -> List[Signal]:
+        """
+        同步接口: 一次性推理多个交易对, features 为 {symbol: (window, F) 数组}
+        """
+        symbols = list(features)
+        signals = []
+        for i in range(0, len(symbols), self.max_batch):
+            chunk = symbols[i:i + self.max_batch]
+            scores = self._forward([features[s] for s in chunk])
+            signals += self._to_signals(chunk, [timestamp] * len(chunk), scores)
+        self._publish(signals)
+        return signals
+
+    async def submit(self, symbol: str, features: np.ndarray, timestamp: Optional[int] = None) -> Signal:
+        """
+        异步接口: 提交单个交易对的特征窗口, 与同一时刻的其他请求合并推理
+
+        形状不是 (window, n_features) 时直接抛出 ValueError, 不进入批次, 不影响其他请求
+        """
+        features = np.asarray(features)
+        if features.shape != (self.window, self.n_features):
+            raise ValueError(f"{symbol} 特征窗口形状 {features.shape} 应为 {(self.window, self.n_features)}")
+        if self._worker is None or self._worker.done():
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._batch_loop())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((symbol, features, timestamp, future))
+        return await future
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(items) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            symbols, features, timestamps, futures = zip(*items)
+            try:
+                scores = await loop.run_in_executor(self._executor, self._forward, features)
+            except Exception as e:
+                logger.error(f"批量推理失败, 样本数: {len(items)}, 错误: {e}")
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            signals = self._to_signals(symbols, timestamps, scores)
+            for future, signal in zip(futures, signals):
+                if not future.done():
+                    future.set_result(signal)
+            self._publish(signals)
+
+    def _publish(self, signals: List[Signal]):
+        for callback in self._subscribers:
+            try:
+                callback(signals)
+            except Exception as e:
+                logger.error(f"信号回调失败: {e}")
+
+    async def aclose(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        self._executor.shutdown(wait=True)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    window = 64
+    with tempfile.TemporaryDirectory() as tmp:
+        path = export_model(SignalNet(), Path(tmp) / 'signal_net.pt', window)
+        service = SignalInferenceService(path, window, max_batch=512, num_threads=1)
+
+    symbols = [f"SYM{i}-USDT" for i in range(300)]
+    windows = {s: np.random.randn(window, len(FEATURE_NAMES)).astype(np.float32) for s in symbols}
+
+    async def bar_close():
+        start = time.perf_counter()
+        signals = await asyncio.gather(*(service.submit(s, windows[s]) for s in symbols))
+        print(f"{len(signals)} 个交易对推理耗时: {(time.perf_counter() - start) * 1000:.1f}ms, "
+              f"做多: {sum(s.side == 1 for s in signals)}, 做空: {sum(s.side == -1 for s in signals)}")
+        await service.aclose()
+
+    asyncio.run(bar_close())
@@ -0,0 +1,66 @@
+import tempfile
+from pathlib import Path
+from unittest import TestCase
+
+import numpy as np
+
+from dexx.kline_store import load_kline_array, COL
+from mlx.kline_dataset import (KlineWindowDataset, FEATURE_NAMES, train_val_datasets, load_features,
+                               load_source_features, build_features)
+from dexx import kline_store
+from dexx.kline_store import kline_path
+from dexx.synthetic_kline import SyntheticMarket
+
+SOURCE = ('okx', 'ETH-USDT', '1h')
+
+
+class TestKlineDataset(TestCase):
+
+    def test_window_and_label(self):
+        ds = KlineWindowDataset([SOURCE], window=32, horizon=4, label='return')
+        x, y = ds.__getitems__([0, len(ds) - 1])
+        self.assertEqual(tuple(x.shape), (2, 32, len(FEATURE_NAMES)))
+
+        features, klines = load_source_features(*SOURCE)
+        close = klines[:, COL['close']]
+        end = ds._starts[0][-1]
+        np.testing.assert_array_equal(x[1].numpy(), features[end - 31:end + 1])
+        self.assertAlmostEqual(float(y[1]), float(np.log(close[end + 4] / close[end]) * 100), places=4)
+
+    def test_split_has_no_label_leak(self):
+        ts = load_kline_array(*SOURCE)[:, COL['timestamp']]
+        split = int(ts[len(ts) // 2])
+        train, val = train_val_datasets([SOURCE], split, window=32, horizon=4)
+        self.assertLess(ts[train._starts[0][-1] + 4], split)
+        self.assertGreaterEqual(ts[val._starts[0][0]], split)
+
+    def test_features_from_archive_partition(self):
+        from dexx import kline_archive
+        with tempfile.TemporaryDirectory() as tmp:
+            arr = np.asarray(load_kline_array(*SOURCE))
+            csv = Path(tmp) / kline_path(*SOURCE).name
+            csv.write_bytes(kline_path(*SOURCE).read_bytes())
+            target = kline_archive.archive_kline_file(csv)
+            # 第二次读取命中缓存, 以归档文件本身判断缓存是否过期
+            for _ in range(2):
+                features, close = load_features(target)
+                np.testing.assert_allclose(close, arr[:, COL['close']], atol=1e-9)
+            self.assertEqual(features.shape, (len(arr), len(FEATURE_NAMES)))
+
+    def test_sources_merge_all_partitions(self):
+        klines = SyntheticMarket(['AAA-USDT'], timeframe='5m', seed=3).klines(3000)['AAA-USDT']
+        with tempfile.TemporaryDirectory() as tmp:
+            # 两个有重叠的分区, 合并后按时间戳去重
+            kline_store.write_kline(klines[:2000], 'syn', 'AAA-USDT', '5m', data_dir=tmp)
+            kline_store.write_kline(klines[1500:2600], 'syn', 'AAA-USDT', '5m', data_dir=tmp)
+            ds = KlineWindowDataset([('syn', 'AAA-USDT', '5m')], window=32, horizon=4, data_dir=tmp)
+            self.assertEqual(len(ds), 2600 - 60 - 4)
+            features, merged = load_source_features('syn', 'AAA-USDT', '5m', data_dir=tmp)
+            np.testing.assert_allclose(merged, klines[:2600], rtol=1e-12)
+            np.testing.assert_array_equal(features, build_features(np.asarray(merged)))
+
+            # 新增分区后缓存失效, 旧缓存文件被删除
+            kline_store.write_kline(klines[2600:], 'syn', 'AAA-USDT', '5m', data_dir=tmp)
+            _, merged = load_source_features('syn', 'AAA-USDT', '5m', data_dir=tmp)
+            self.assertEqual(len(merged), 3000)
+            self.assertEqual(len(list((Path(tmp) / '.cache').glob('syn_AAA-USDT_5m.merged_*'))), 2)
@@ -0,0 +1,59 @@
+import asyncio
+from unittest import TestCase
+
+import numpy as np
+import torch
+
+from mlx.kline_dataset import FEATURE_NAMES
+from mlx.signal_infer import SignalInferenceService, SignalNet
+
+
+class TestSignalInfer(TestCase):
+
+    def setUp(self):
+        torch.manual_seed(0)
+        self.window = 16
+        self.model = SignalNet()
+        self.windows = {f"S{i}": np.random.randn(self.window, len(FEATURE_NAMES)).astype(np.float32)
+                        for i in range(50)}
+
+    def test_micro_batch_matches_single(self):
+        service = SignalInferenceService(self.model, self.window, max_batch=32, max_wait_ms=20)
+        batches = []
+        service.subscribe(batches.append)
+
+        async def run():
+            result = await asyncio.gather(*(service.submit(s, w) for s, w in self.windows.items()))
+            await service.aclose()
+            return result
+
+        signals = asyncio.run(run())
+        self.assertEqual([s.symbol for s in signals], list(self.windows))
+        self.assertEqual([len(b) for b in batches], [32, 18])
+
+        with torch.inference_mode():
+            expected = torch.sigmoid(self.model(torch.from_numpy(self.windows['S7'][None]))).item()
+        self.assertAlmostEqual(signals[7].score, expected, places=5)
+
+    def test_predict_batch_sides(self):
+        service = SignalInferenceService(self.model, self.window, max_batch=8, long_threshold=0.5,
+                                         short_threshold=0.5)
+        signals = service.predict_batch(self.windows, timestamp=1)
+        service.close()
+        self.assertEqual(len(signals), 50)
+        for s in signals:
+            self.assertEqual(s.side, 1 if s.score > 0.5 else -1)
+
+    def test_bad_input_fails_only_its_request(self):
+        service = SignalInferenceService(self.model, self.window, max_batch=32, max_wait_ms=20)
+
+        async def run():
+            bad = np.zeros((self.window - 1, len(FEATURE_NAMES)), dtype=np.float32)
+            result = await asyncio.gather(service.submit('S0', self.windows['S0']), service.submit('BAD', bad),
+                                          service.submit('S1', self.windows['S1']), return_exceptions=True)
+            await service.aclose()
+            return result
+
+        good0, bad, good1 = asyncio.run(run())
+        self.assertIsInstance(bad, ValueError)
+        self.assertEqual((good0.symbol, good1.symbol), ('S0', 'S1'))